@@ -3,7 +3,7 @@
 Write-Host "Packaging Lambda function..." -ForegroundColor Cyan
 
 # Create deployment package
-Compress-Archive -Path lambda/admin_access_lambda.py -DestinationPath admin_access_lambda.zip -Force
+Compress-Archive -Path lambda/admin_access_lambda.py, lambda/aws_clients.py, lambda/retry_policy.py -DestinationPath admin_access_lambda.zip -Force
 
 Write-Host "Lambda package created: admin_access_lambda.zip" -ForegroundColor Green
 
@@ -1,22 +1,62 @@
 import json
-import boto3
+import hashlib
 import os
 import re
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from botocore.exceptions import ClientError
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb', region_name='us-east-2')
-iam_client = boto3.client('iam', region_name='us-east-2')
+import aws_clients
+import retry_policy
+
+# AWS clients (created on first use)
+dynamodb = aws_clients.lazy_resource('dynamodb', 'us-east-2')
+iam_client = aws_clients.lazy_client('iam', 'us-east-2')
 
 # Environment variables
 EMPLOYEES_TABLE = os.environ.get('EMPLOYEES_TABLE', 'Employees')
 AUDIT_LOG_TABLE = os.environ.get('AUDIT_LOG_TABLE', 'AuditLog')
+IDEMPOTENCY_TABLE = os.environ.get('IDEMPOTENCY_TABLE', 'IdempotencyKeys')
+
+# Idempotency records: replay window and how long an in-progress claim blocks retries
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', str(24 * 3600)))
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', '60'))
+
+# Manager policy resolution: warm-container cache TTL and persisted snapshot TTL
+POLICY_CACHE_TTL_SECONDS = int(os.environ.get('POLICY_CACHE_TTL_SECONDS', '300'))
+POLICY_SNAPSHOT_TTL_SECONDS = int(os.environ.get('POLICY_SNAPSHOT_TTL_SECONDS', '3600'))
+
+# Bulk onboarding limits. A request must finish within API Gateway's 29 s integration
+# timeout: a row takes one IAM role creation, its policy attachments and one transaction
+# (about 1-3 s), so 50 rows on 5 workers fit. Rows not started BULK_DEADLINE_SECONDS after
+# the request began are returned unprocessed for the client to resubmit.
+BULK_MAX_EMPLOYEES = int(os.environ.get('BULK_MAX_EMPLOYEES', '50'))
+BULK_MAX_WORKERS = int(os.environ.get('BULK_MAX_WORKERS', '5'))
+BULK_DEADLINE_SECONDS = float(os.environ.get('BULK_DEADLINE_SECONDS', '20'))
+
+# Concurrent IAM policy attach/detach: workers per role and a container-wide cap on
+# in-flight IAM policy calls (bulk rows share it) to stay under IAM rate limits
+IAM_POLICY_WORKERS = int(os.environ.get('IAM_POLICY_WORKERS', '8'))
+IAM_MAX_CONCURRENCY = int(os.environ.get('IAM_MAX_CONCURRENCY', '10'))
 
 # Get table references
-employees_table = dynamodb.Table(EMPLOYEES_TABLE)
-audit_log_table = dynamodb.Table(AUDIT_LOG_TABLE)
+employees_table = aws_clients.lazy_table(EMPLOYEES_TABLE, 'us-east-2')
+audit_log_table = aws_clients.lazy_table(AUDIT_LOG_TABLE, 'us-east-2')
+idempotency_table = aws_clients.lazy_table(IDEMPOTENCY_TABLE, 'us-east-2')
+
+# Resolved manager policy sets per (role ARN, policy generation), kept across warm invocations
+_policy_cache = {}
+_policy_cache_lock = threading.Lock()
+
+# Failure-path audit records waiting for flush_audit_trail
+_audit_buffer = []
+_audit_buffer_lock = threading.Lock()
+
+# Bounds concurrent IAM policy calls across all roles being provisioned in this container
+_iam_semaphore = threading.BoundedSemaphore(IAM_MAX_CONCURRENCY)
 
 # Custom exceptions
 class ValidationError(Exception):
@@ -25,6 +65,9 @@ class ValidationError(Exception):
 class ManagerNotFoundError(Exception):
     pass
 
+class EmployeeExistsError(Exception):
+    pass
+
 def validate_input(data):
     """
     Validates input data according to requirements 7.1-7.5
@@ -62,7 +105,8 @@ def verify_manager(manager_employee_id):
     """
     try:
         # Query DynamoDB for manager record
-        response = employees_table.get_item(
+        response = retry_policy.call(
+            'dynamodb', 'get_item', employees_table.get_item,
             Key={'employee_id': manager_employee_id}
         )
         
@@ -85,22 +129,145 @@ def verify_manager(manager_employee_id):
         print(f"DynamoDB error during manager verification: {str(e)}")
         raise Exception(f"Database error: {str(e)}")
 
-def get_manager_policies(role_arn):
+def list_role_policy_arns(role_name):
+    """
+    Lists every managed policy attached to a role, following IsTruncated/Marker pagination
+    """
+    def list_all():
+        policy_arns = []
+        paginator = iam_client.get_paginator('list_attached_role_policies')
+        for page in paginator.paginate(RoleName=role_name):
+            policy_arns.extend(policy['PolicyArn'] for policy in page.get('AttachedPolicies', []))
+        return policy_arns
+    
+    return retry_policy.call('iam', 'list_attached_role_policies', list_all)
+
+def policy_generation(manager):
+    """
+    Returns the policy generation on a manager's Employees item. invalidate_manager_policies
+    increments it, so every container's cached policy sets for the manager stop matching.
+    """
+    return int((manager or {}).get('policy_generation', 0))
+
+def get_cached_policies(role_arn, generation=0):
+    """
+    Returns the warm-container cached policy set for a role at this policy generation,
+    or None if missing/expired
+    """
+    with _policy_cache_lock:
+        entry = _policy_cache.get((role_arn, generation))
+        if entry and entry['expires_at'] > time.time():
+            return list(entry['policy_arns'])
+        _policy_cache.pop((role_arn, generation), None)
+    return None
+
+def cache_policies(role_arn, policy_arns, generation=0):
+    """
+    Stores a resolved policy set in the warm-container cache
+    """
+    with _policy_cache_lock:
+        # Entries of older generations can never match again
+        for key in [key for key in _policy_cache if key[0] == role_arn and key[1] != generation]:
+            _policy_cache.pop(key, None)
+        _policy_cache[(role_arn, generation)] = {
+            'policy_arns': list(policy_arns),
+            'expires_at': time.time() + POLICY_CACHE_TTL_SECONDS
+        }
+
+def get_policy_snapshot(manager, role_arn):
+    """
+    Returns the policy snapshot persisted on the manager's Employees item if it was
+    taken for the same role and is still fresh, otherwise None
+    """
+    if not manager or manager.get('policy_snapshot_role_arn') != role_arn:
+        return None
+    if 'policy_snapshot' not in manager:
+        return None
+    if time.time() - int(manager.get('policy_snapshot_at', 0)) > POLICY_SNAPSHOT_TTL_SECONDS:
+        return None
+    return list(manager['policy_snapshot'])
+
+def save_policy_snapshot(manager_employee_id, role_arn, policy_arns, generation=0):
+    """
+    Persists the resolved policy set on the manager's Employees item.
+    The write is conditional on the role and policy generation being unchanged, so a
+    snapshot never outlives a role change or invalidation that happened while it was
+    being resolved.
+    """
+    try:
+        retry_policy.call(
+            'dynamodb', 'update_item', employees_table.update_item,
+            Key={'employee_id': manager_employee_id},
+            UpdateExpression='SET policy_snapshot = :policies, policy_snapshot_role_arn = :role_arn, policy_snapshot_at = :now',
+            ConditionExpression='iam_role_arn = :role_arn AND '
+                                '(attribute_not_exists(policy_generation) OR policy_generation = :generation)',
+            ExpressionAttributeValues={
+                ':policies': policy_arns,
+                ':role_arn': role_arn,
+                ':generation': generation,
+                ':now': int(time.time())
+            }
+        )
+    except (ClientError, retry_policy.CircuitOpenError) as e:
+        print(f"Warning: Failed to persist policy snapshot for {manager_employee_id}: {str(e)}")
+
+def invalidate_manager_policies(manager_employee_id, role_arn=None):
+    """
+    Drops a manager's cached and persisted policy set. Call whenever the manager's
+    role or its attached policies change.
+    Removes the snapshot and increments the manager's policy generation; other containers
+    read the new generation with the manager's item on their next lookup and stop using
+    their cached policy sets.
+    """
+    with _policy_cache_lock:
+        for key in [key for key in _policy_cache if not role_arn or key[0] == role_arn]:
+            _policy_cache.pop(key, None)
+    
+    try:
+        response = retry_policy.call(
+            'dynamodb', 'update_item', employees_table.update_item,
+            Key={'employee_id': manager_employee_id},
+            UpdateExpression='REMOVE policy_snapshot, policy_snapshot_role_arn, policy_snapshot_at ADD policy_generation :one',
+            ConditionExpression='attribute_exists(employee_id)',
+            ExpressionAttributeValues={':one': 1},
+            ReturnValues='UPDATED_NEW'
+        )
+        generation = int(response['Attributes']['policy_generation'])
+        print(f"Policy snapshot invalidated for manager {manager_employee_id} (generation {generation})")
+        return generation
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            raise ManagerNotFoundError(f"Manager employee ID '{manager_employee_id}' not found in database")
+        raise Exception(f"Database error: {str(e)}")
+    except retry_policy.CircuitOpenError as e:
+        raise Exception(f"Database error: {str(e)}")
+
+def get_manager_policies(role_arn, manager=None):
     """
     Retrieves all IAM policies attached to the manager's role (requirement 2.1)
-    Returns list of policy ARNs to be cloned
+    Returns list of policy ARNs to be cloned.
+    Resolution order: warm-container cache, snapshot on the manager's item, then IAM.
+    Cached sets are only used at the policy generation on the manager's item.
     """
+    role_name = role_arn.split('/')[-1]
+    generation = policy_generation(manager)
+    
+    policy_arns = get_cached_policies(role_arn, generation)
+    if policy_arns is not None:
+        print(f"Using cached policies for role: {role_name} ({len(policy_arns)} policies)")
+        return policy_arns
+    
+    policy_arns = get_policy_snapshot(manager, role_arn)
+    if policy_arns is not None:
+        print(f"Using persisted policy snapshot for role: {role_name} ({len(policy_arns)} policies)")
+        cache_policies(role_arn, policy_arns, generation)
+        return policy_arns
+    
     try:
-        # Extract role name from ARN
-        role_name = role_arn.split('/')[-1]
-        
         print(f"Retrieving policies for role: {role_name}")
         
-        # List all attached policies
-        response = iam_client.list_attached_role_policies(RoleName=role_name)
-        
-        policies = response.get('AttachedPolicies', [])
-        policy_arns = [policy['PolicyArn'] for policy in policies]
+        # List all attached policies (all pages)
+        policy_arns = list_role_policy_arns(role_name)
         
         print(f"Found {len(policy_arns)} policies to clone:")
         for arn in policy_arns:
@@ -109,8 +276,6 @@ def get_manager_policies(role_arn):
         if not policy_arns:
             print("Warning: Manager role has no attached policies")
         
-        return policy_arns
-        
     except ClientError as e:
         error_code = e.response['Error']['Code']
         if error_code == 'NoSuchEntity':
@@ -120,14 +285,57 @@ def get_manager_policies(role_arn):
         else:
             print(f"IAM error retrieving policies: {str(e)}")
             raise Exception(f"Failed to retrieve manager policies: {str(e)}")
+    
+    cache_policies(role_arn, policy_arns, generation)
+    if manager and manager.get('employee_id'):
+        save_policy_snapshot(manager['employee_id'], role_arn, policy_arns, generation)
+    
+    return policy_arns
+
+def run_policy_operation(operation, role_name, policy_arn):
+    """
+    Runs one attach_role_policy / detach_role_policy call under the container-wide IAM cap.
+    Returns None on success or the error message.
+    """
+    with _iam_semaphore:
+        try:
+            retry_policy.call(
+                'iam', operation, getattr(iam_client, operation),
+                RoleName=role_name,
+                PolicyArn=policy_arn
+            )
+            return None
+        except (ClientError, retry_policy.CircuitOpenError) as e:
+            return str(e)
+
+def run_policy_operations(operation, role_name, policy_arns):
+    """
+    Attaches or detaches policies concurrently on a bounded pool.
+    Returns (succeeded policy ARNs, {policy_arn: error} for the failures).
+    """
+    policy_arns = list(policy_arns)
+    if not policy_arns:
+        return [], {}
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(IAM_POLICY_WORKERS, len(policy_arns)))) as executor:
+        errors = list(executor.map(lambda policy_arn: run_policy_operation(operation, role_name, policy_arn), policy_arns))
+    
+    succeeded = []
+    failures = {}
+    for policy_arn, error in zip(policy_arns, errors):
+        if error:
+            print(f"  ✗ {operation} failed: {policy_arn} ({error})")
+            failures[policy_arn] = error
+        else:
+            print(f"  ✓ {operation}: {policy_arn}")
+            succeeded.append(policy_arn)
+    return succeeded, failures
 
 def create_iam_role(employee_id, policy_arns):
     """
     Creates a new IAM role for the employee and attaches cloned policies
     (requirements 2.2-2.5, 6.2)
     """
-    import time
-    
     role_name = f"Employee-{employee_id}-Role"
     
     # Trust policy for the role (allows AWS services to assume the role)
@@ -145,53 +353,33 @@ def create_iam_role(employee_id, policy_arns):
     }
     
     try:
-        # Create the IAM role with retry logic
-        max_retries = 3
-        retry_delays = [1, 2, 4]  # Exponential backoff
+        # Create the IAM role (transient errors are retried by retry_policy)
+        try:
+            print(f"Creating IAM role: {role_name}")
+            
+            response = retry_policy.call(
+                'iam', 'create_role', iam_client.create_role,
+                RoleName=role_name,
+                AssumeRolePolicyDocument=json.dumps(trust_policy),
+                Description=f"IAM role for employee {employee_id}"
+            )
+            
+            role_arn = response['Role']['Arn']
+            print(f"IAM role created: {role_arn}")
+            
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'EntityAlreadyExists':
+                raise Exception(f"IAM role '{role_name}' already exists")
+            raise
         
-        for attempt in range(max_retries):
-            try:
-                print(f"Creating IAM role: {role_name} (attempt {attempt + 1}/{max_retries})")
-                
-                response = iam_client.create_role(
-                    RoleName=role_name,
-                    AssumeRolePolicyDocument=json.dumps(trust_policy),
-                    Description=f"IAM role for employee {employee_id}"
-                )
-                
-                role_arn = response['Role']['Arn']
-                print(f"IAM role created: {role_arn}")
-                break
-                
-            except ClientError as e:
-                if e.response['Error']['Code'] == 'EntityAlreadyExists':
-                    raise Exception(f"IAM role '{role_name}' already exists")
-                elif attempt < max_retries - 1:
-                    print(f"Retry after {retry_delays[attempt]}s due to: {str(e)}")
-                    time.sleep(retry_delays[attempt])
-                else:
-                    raise
-        
-        # Attach policies with retry logic
+        # Attach policies concurrently; on any failure undo only what was attached
         print(f"Attaching {len(policy_arns)} policies to role...")
+        attached, failures = run_policy_operations('attach_role_policy', role_name, policy_arns)
         
-        for policy_arn in policy_arns:
-            for attempt in range(max_retries):
-                try:
-                    iam_client.attach_role_policy(
-                        RoleName=role_name,
-                        PolicyArn=policy_arn
-                    )
-                    print(f"  ✓ Attached policy: {policy_arn}")
-                    break
-                    
-                except ClientError as e:
-                    if attempt < max_retries - 1:
-                        print(f"  Retry attaching policy after {retry_delays[attempt]}s")
-                        time.sleep(retry_delays[attempt])
-                    else:
-                        print(f"  ✗ Failed to attach policy: {policy_arn}")
-                        raise
+        if failures:
+            rollback_iam_role(role_name, attached)
+            details = '; '.join(f"{policy_arn}: {error}" for policy_arn, error in failures.items())
+            raise Exception(f"Failed to attach {len(failures)} of {len(policy_arns)} policies ({details})")
         
         print(f"Successfully created role with {len(policy_arns)} policies")
         return role_arn
@@ -201,129 +389,512 @@ def create_iam_role(employee_id, policy_arns):
         print(f"IAM error creating role: {error_code} - {str(e)}")
         raise Exception(f"Failed to create IAM role: {str(e)}")
 
-def store_employee_record(employee_data):
+def build_employee_record(employee_data):
+    """
+    Builds the Employees table item for a newly provisioned employee
+    """
+    timestamp = datetime.utcnow().isoformat() + 'Z'
+    return {
+        'employee_id': employee_data['employee_id'],
+        'employee_name': employee_data['employee_name'],
+        'manager_id': employee_data['manager_id'],
+        'iam_role_arn': employee_data['iam_role_arn'],
+        'iam_role_name': f"Employee-{employee_data['employee_id']}-Role",
+        'created_at': timestamp,
+        'updated_at': timestamp
+    }
+
+def build_audit_record(audit_data):
     """
-    Stores new employee record in DynamoDB (requirements 3.1-3.4)
+    Builds the AuditLog table item for a provisioning attempt
     """
-    import time
+    timestamp = datetime.utcnow().isoformat() + 'Z'
+    
+    audit_record = {
+        'request_id': audit_data['request_id'],
+        'timestamp': timestamp,
+        'manager_employee_id': audit_data.get('manager_id', ''),
+        'new_employee_id': audit_data.get('new_employee_id', ''),
+        'new_employee_name': audit_data.get('new_employee_name', ''),
+        'action': audit_data.get('action', 'PROVISION_ACCESS'),
+        'status': audit_data['status']
+    }
+    
+    # Add optional fields
+    for field in ['iam_role_arn', 'error_message', 'cloned_policies_count', 'batch_id']:
+        if field in audit_data:
+            audit_record[field] = audit_data[field]
+    
+    return audit_record
+
+def store_provisioned_employee(employee_data, audit_data):
+    """
+    Stores the new employee record and its SUCCESS audit entry in one
+    transact_write_items call (requirements 3.1-3.4, 4.1-4.5).
+    The employee row is only written if the employee does not exist yet;
+    either both rows are committed or neither is.
+    """
+    employee_record = build_employee_record(employee_data)
+    audit_record = build_audit_record(audit_data)
     
     try:
-        # Check if employee already exists
-        response = employees_table.get_item(
-            Key={'employee_id': employee_data['employee_id']}
+        retry_policy.call(
+            'dynamodb', 'transact_write_items', dynamodb.meta.client.transact_write_items,
+            TransactItems=[
+                {
+                    'Put': {
+                        'TableName': EMPLOYEES_TABLE,
+                        'Item': employee_record,
+                        'ConditionExpression': 'attribute_not_exists(employee_id)'
+                    }
+                },
+                {
+                    'Put': {
+                        'TableName': AUDIT_LOG_TABLE,
+                        'Item': audit_record
+                    }
+                }
+            ]
         )
-        
-        if 'Item' in response:
-            raise Exception(f"Employee ID '{employee_data['employee_id']}' already exists in database")
-        
-        # Prepare employee record
-        timestamp = datetime.utcnow().isoformat() + 'Z'
-        employee_record = {
-            'employee_id': employee_data['employee_id'],
-            'employee_name': employee_data['employee_name'],
-            'manager_id': employee_data['manager_id'],
-            'iam_role_arn': employee_data['iam_role_arn'],
-            'iam_role_name': f"Employee-{employee_data['employee_id']}-Role",
-            'created_at': timestamp,
-            'updated_at': timestamp
-        }
-        
-        # Store with retry logic
-        max_retries = 3
-        retry_delays = [1, 2, 4]
-        
-        for attempt in range(max_retries):
-            try:
-                employees_table.put_item(Item=employee_record)
-                print(f"Employee record stored: {employee_data['employee_id']}")
-                return employee_record
-                
-            except ClientError as e:
-                if attempt < max_retries - 1:
-                    print(f"Retry storing employee after {retry_delays[attempt]}s")
-                    time.sleep(retry_delays[attempt])
-                else:
-                    raise
+        print(f"Employee record stored: {employee_data['employee_id']}")
+        print(f"Audit log created: {audit_data['request_id']} - {audit_data['status']}")
+        return employee_record
         
     except ClientError as e:
+        if e.response['Error']['Code'] == 'TransactionCanceledException':
+            reasons = e.response.get('CancellationReasons', [])
+            if reasons and reasons[0].get('Code') == 'ConditionalCheckFailed':
+                raise EmployeeExistsError(f"Employee ID '{employee_data['employee_id']}' already exists in database")
         print(f"DynamoDB error storing employee: {str(e)}")
         raise Exception(f"Failed to store employee record: {str(e)}")
 
 def log_audit_trail(audit_data):
     """
-    Logs access provisioning activity to audit trail (requirements 4.1-4.5)
+    Buffers a failure-path audit record (requirements 4.1-4.5).
+    Buffered records are written in batches by flush_audit_trail before the handler returns.
+    """
+    with _audit_buffer_lock:
+        _audit_buffer.append(build_audit_record(audit_data))
+
+def flush_audit_trail():
+    """
+    Writes buffered audit records in one batch
     """
+    with _audit_buffer_lock:
+        records = list(_audit_buffer)
+        del _audit_buffer[:]
+    if not records:
+        return
+    
     try:
-        timestamp = datetime.utcnow().isoformat() + 'Z'
-        
-        audit_record = {
-            'request_id': audit_data['request_id'],
-            'timestamp': timestamp,
-            'manager_employee_id': audit_data.get('manager_id', ''),
-            'new_employee_id': audit_data.get('new_employee_id', ''),
-            'new_employee_name': audit_data.get('new_employee_name', ''),
-            'action': audit_data.get('action', 'PROVISION_ACCESS'),
-            'status': audit_data['status']
-        }
-        
-        # Add optional fields
-        if 'iam_role_arn' in audit_data:
-            audit_record['iam_role_arn'] = audit_data['iam_role_arn']
+        retry_policy.put_items(audit_log_table, records)
+        for audit_record in records:
+            print(f"Audit log created: {audit_record['request_id']} - {audit_record['status']}")
         
-        if 'error_message' in audit_data:
-            audit_record['error_message'] = audit_data['error_message']
-        
-        if 'cloned_policies_count' in audit_data:
-            audit_record['cloned_policies_count'] = audit_data['cloned_policies_count']
-        
-        # Store audit log
-        audit_log_table.put_item(Item=audit_record)
-        print(f"Audit log created: {audit_data['request_id']} - {audit_data['status']}")
-        
-    except ClientError as e:
-        # Don't fail the main operation if audit logging fails
+    except Exception as e:
+        # Don't fail the main operation if audit logging fails; keep the records in the function log
         print(f"Warning: Failed to log audit trail: {str(e)}")
+        for audit_record in records:
+            print(f"Unwritten audit record: {json.dumps(audit_record, default=str)}")
 
-def rollback_iam_role(role_name):
+def rollback_iam_role(role_name, attached_policy_arns=None):
     """
     Deletes IAM role and detaches policies (requirement 6.1)
-    Called when employee record storage fails after IAM role creation
+    Called when policy attachment or employee record storage fails after IAM role creation.
+    attached_policy_arns limits the detach to the policies known to be attached;
+    when omitted, the role's attached policies are listed first.
     """
     try:
         print(f"Rolling back IAM role: {role_name}")
         
-        # List and detach all policies
-        response = iam_client.list_attached_role_policies(RoleName=role_name)
-        policies = response.get('AttachedPolicies', [])
+        if attached_policy_arns is None:
+            attached_policy_arns = list_role_policy_arns(role_name)
         
-        for policy in policies:
-            iam_client.detach_role_policy(
-                RoleName=role_name,
-                PolicyArn=policy['PolicyArn']
-            )
-            print(f"  Detached policy: {policy['PolicyArn']}")
+        # Detach policies concurrently; the role cannot be deleted while any remain
+        _, failures = run_policy_operations('detach_role_policy', role_name, attached_policy_arns)
+        if failures:
+            print(f"Warning: Rollback left {len(failures)} policies attached to {role_name}; role not deleted")
+            return
         
         # Delete the role
-        iam_client.delete_role(RoleName=role_name)
+        retry_policy.call('iam', 'delete_role', iam_client.delete_role, RoleName=role_name)
         print(f"  Deleted role: {role_name}")
         
-    except ClientError as e:
+    except (ClientError, retry_policy.CircuitOpenError) as e:
         print(f"Warning: Rollback failed for role {role_name}: {str(e)}")
 
+def batch_get_employees(employee_ids):
+    """
+    Fetches Employees items for many ids with retry_policy.get_items.
+    Returns a dict of employee_id -> item.
+    """
+    keys = [{'employee_id': employee_id} for employee_id in dict.fromkeys(employee_ids)]
+    return {item['employee_id']: item for item in retry_policy.get_items(employees_table, keys)}
+
+def provision_bulk_row(row, policy_arns, batch_id):
+    """
+    Provisions one bulk row the way a single request is provisioned: the IAM role first,
+    then the employee record and its SUCCESS audit entry in one conditional transaction.
+    A row whose employee already exists (e.g. created concurrently) or cannot be stored
+    has its role rolled back.
+    """
+    try:
+        row['iam_role_arn'] = create_iam_role(row['new_employee_id'], policy_arns)
+    except Exception as e:
+        # create_iam_role already rolled back any partially attached role
+        row['error'] = str(e)
+        return row
+    
+    try:
+        employee_record = store_provisioned_employee({
+            'employee_id': row['new_employee_id'],
+            'employee_name': row['new_employee_name'],
+            'manager_id': row['manager_employee_id'],
+            'iam_role_arn': row['iam_role_arn']
+        }, {
+            'request_id': row['request_id'],
+            'batch_id': batch_id,
+            'manager_id': row['manager_employee_id'],
+            'new_employee_id': row['new_employee_id'],
+            'new_employee_name': row['new_employee_name'],
+            'action': 'BULK_PROVISION_ACCESS',
+            'status': 'SUCCESS',
+            'iam_role_arn': row['iam_role_arn'],
+            'cloned_policies_count': len(policy_arns)
+        })
+        row['cloned_policies'] = policy_arns
+        row['created_at'] = employee_record['created_at']
+    except Exception as db_error:
+        print(f"✗ Database storage failed for {row['new_employee_id']}: {str(db_error)}")
+        rollback_iam_role(f"Employee-{row['new_employee_id']}-Role", policy_arns)
+        row['error'] = str(db_error)
+    return row
+
+def handle_bulk_onboarding(data, request_id, headers):
+    """
+    Provisions many employees in one call. Manager lookups are deduplicated with
+    batch_get_item, each distinct manager's policies are fetched once and the rows are
+    provisioned on a bounded worker pool, each through the same conditional
+    employee + audit transaction as a single request.
+    Returns per-row results; rows that fail are rolled back individually.
+    Rows still waiting for a worker at BULK_DEADLINE_SECONDS are not started and are
+    reported as unprocessed.
+    """
+    started = time.time()
+    entries = data.get('employees')
+    if not isinstance(entries, list) or not entries:
+        raise ValidationError("employees must be a non-empty list")
+    if len(entries) > BULK_MAX_EMPLOYEES:
+        raise ValidationError(f"At most {BULK_MAX_EMPLOYEES} employees can be onboarded per request")
+    
+    print(f"Bulk onboarding: {len(entries)} employees")
+    
+    # Validate every row and reject duplicate employee ids within the batch
+    rows = []
+    seen_ids = set()
+    for index, entry in enumerate(entries):
+        entry = entry if isinstance(entry, dict) else {}
+        row = {
+            'index': index,
+            'request_id': str(uuid.uuid4()),
+            'manager_employee_id': entry.get('manager_employee_id', ''),
+            'new_employee_id': entry.get('new_employee_id', ''),
+            'new_employee_name': entry.get('new_employee_name', '')
+        }
+        try:
+            validate_input(entry)
+            if entry['new_employee_id'] in seen_ids:
+                raise ValidationError(f"Duplicate employee ID '{entry['new_employee_id']}' in request")
+            seen_ids.add(entry['new_employee_id'])
+        except ValidationError as e:
+            row['error'] = str(e)
+        rows.append(row)
+    
+    pending = [row for row in rows if 'error' not in row]
+    
+    # One batch lookup for every distinct manager and every new employee id
+    try:
+        existing = batch_get_employees(
+            [row['manager_employee_id'] for row in pending] + [row['new_employee_id'] for row in pending]
+        )
+    except ClientError as e:
+        print(f"DynamoDB error during bulk lookup: {str(e)}")
+        raise Exception(f"Database error: {str(e)}")
+    
+    # Resolve each distinct manager's policies once
+    manager_policies = {}
+    manager_errors = {}
+    for manager_id in dict.fromkeys(row['manager_employee_id'] for row in pending):
+        manager = existing.get(manager_id)
+        if not manager:
+            manager_errors[manager_id] = f"Manager employee ID '{manager_id}' not found in database"
+        elif not manager.get('iam_role_arn'):
+            manager_errors[manager_id] = f"Manager '{manager_id}' has no IAM role assigned"
+        else:
+            try:
+                manager_policies[manager_id] = get_manager_policies(manager['iam_role_arn'], manager)
+            except Exception as e:
+                manager_errors[manager_id] = str(e)
+    
+    # Employees that already exist are rejected before any IAM work; employees created
+    # after this lookup are caught by the conditional write in provision_bulk_row
+    for row in pending:
+        if row['manager_employee_id'] in manager_errors:
+            row['error'] = manager_errors[row['manager_employee_id']]
+        elif row['new_employee_id'] in existing:
+            row['error'] = f"Employee ID '{row['new_employee_id']}' already exists in database"
+    
+    # IAM role and conditional employee + audit transaction per row, on a bounded worker pool
+    pending = [row for row in pending if 'error' not in row]
+    def provision(row):
+        if time.time() - started > BULK_DEADLINE_SECONDS:
+            row['unprocessed'] = True
+            row['error'] = "Not started before the request deadline; resubmit this employee"
+            return row
+        return provision_bulk_row(row, manager_policies[row['manager_employee_id']], request_id)
+    
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(BULK_MAX_WORKERS, len(pending)))) as executor:
+            list(executor.map(provision, pending))
+    
+    # Failed rows are audited through the buffered failure trail (flushed by handle_request)
+    for row in rows:
+        if 'error' in row:
+            log_audit_trail({
+                'request_id': row['request_id'],
+                'batch_id': request_id,
+                'manager_id': row['manager_employee_id'],
+                'new_employee_id': row['new_employee_id'],
+                'new_employee_name': row['new_employee_name'],
+                'action': 'BULK_PROVISION_ACCESS',
+                'status': 'FAILED',
+                'error_message': row['error']
+            })
+    
+    results = []
+    for row in rows:
+        result = {
+            'index': row['index'],
+            'request_id': row['request_id'],
+            'new_employee_id': row['new_employee_id'],
+            'success': 'error' not in row
+        }
+        if 'error' in row:
+            result['error'] = row['error']
+            if row.get('unprocessed'):
+                result['unprocessed'] = True
+        else:
+            result['iam_role_arn'] = row['iam_role_arn']
+            result['cloned_policies'] = row['cloned_policies']
+            result['created_at'] = row['created_at']
+        results.append(result)
+    
+    succeeded = sum(1 for result in results if result['success'])
+    print(f"✓ Bulk onboarding finished: {succeeded}/{len(results)} succeeded")
+    
+    response_body = {
+        'success': succeeded == len(results),
+        'request_id': request_id,
+        'summary': {
+            'total': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'unprocessed': sum(1 for result in results if result.get('unprocessed'))
+        },
+        'results': results
+    }
+    
+    return {
+        'statusCode': 200 if succeeded == len(results) else 207,
+        'headers': headers,
+        'body': json.dumps(response_body)
+    }
+
+def get_idempotency_key(event):
+    """
+    Returns the client's idempotency key from the Idempotency-Key header or the
+    idempotency_key body field, or None
+    """
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    key = headers.get('idempotency-key')
+    if not key:
+        body = event.get('body')
+        if isinstance(body, str):
+            try:
+                body = json.loads(body)
+            except ValueError:
+                body = {}
+        if isinstance(body, dict):
+            key = body.get('idempotency_key')
+    
+    if key and not re.match(r'^[A-Za-z0-9_.:-]{1,128}$', str(key)):
+        raise ValidationError("Idempotency key must be 1-128 characters: letters, digits, '_', '.', ':' or '-'")
+    return key
+
+def hash_request(event):
+    """
+    Hashes the request body so a reused idempotency key with a different request is detected
+    """
+    body = event.get('body') or {}
+    if isinstance(body, str):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            pass
+    if isinstance(body, dict):
+        body = {key: value for key, value in body.items() if key != 'idempotency_key'}
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest()
+
+def claim_idempotency_key(key, request_hash):
+    """
+    Claims an idempotency key with a conditional write.
+    Returns None when claimed, otherwise the existing idempotency record.
+    An in-progress claim older than IDEMPOTENCY_LOCK_SECONDS can be taken over.
+    """
+    now = int(time.time())
+    try:
+        retry_policy.call(
+            'dynamodb', 'put_item', idempotency_table.put_item,
+            Item={
+                'idempotency_key': key,
+                'status': 'IN_PROGRESS',
+                'request_hash': request_hash,
+                'locked_until': now + IDEMPOTENCY_LOCK_SECONDS,
+                'expires_at': now + IDEMPOTENCY_TTL_SECONDS
+            },
+            ConditionExpression='attribute_not_exists(idempotency_key) OR (#status = :in_progress AND locked_until < :now)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':in_progress': 'IN_PROGRESS', ':now': now}
+        )
+        return None
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+    
+    response = retry_policy.call(
+        'dynamodb', 'get_item', idempotency_table.get_item,
+        Key={'idempotency_key': key},
+        ConsistentRead=True
+    )
+    return response.get('Item')
+
+def complete_idempotency_key(key, response):
+    """
+    Stores the first response for replay (best effort)
+    """
+    try:
+        retry_policy.call(
+            'dynamodb', 'update_item', idempotency_table.update_item,
+            Key={'idempotency_key': key},
+            UpdateExpression='SET #status = :completed, response_status = :status_code, response_body = :body REMOVE locked_until',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':completed': 'COMPLETED',
+                ':status_code': response['statusCode'],
+                ':body': response['body']
+            }
+        )
+    except (ClientError, retry_policy.CircuitOpenError) as e:
+        print(f"Warning: Failed to store idempotent response for {key}: {str(e)}")
+
+def release_idempotency_key(key):
+    """
+    Deletes an in-progress claim after a server error so the client can retry (best effort)
+    """
+    try:
+        retry_policy.call(
+            'dynamodb', 'delete_item', idempotency_table.delete_item,
+            Key={'idempotency_key': key},
+            ConditionExpression='#status = :in_progress',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':in_progress': 'IN_PROGRESS'}
+        )
+    except (ClientError, retry_policy.CircuitOpenError) as e:
+        print(f"Warning: Failed to release idempotency key {key}: {str(e)}")
+
+@aws_clients.measure_init('admin-access')
 def lambda_handler(event, context):
     """
-    Main Lambda handler for Admin Access Management
+    Main Lambda handler for Admin Access Management.
+    Requests carrying an idempotency key are executed once; retries with the same
+    key replay the stored response without touching IAM again.
     """
-    request_id = str(uuid.uuid4())
+    retry_policy.start_invocation(context)
     
     # Set CORS headers
     headers = {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
         'Access-Control-Allow-Methods': 'POST, OPTIONS',
-        'Access-Control-Allow-Headers': 'Content-Type'
+        'Access-Control-Allow-Headers': 'Content-Type, Idempotency-Key'
     }
     
+    try:
+        idempotency_key = get_idempotency_key(event)
+    except ValidationError as e:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'success': False, 'error': str(e)})
+        }
+    
+    if not idempotency_key:
+        return handle_request(event, headers)
+    
+    request_hash = hash_request(event)
+    try:
+        existing = claim_idempotency_key(idempotency_key, request_hash)
+    except Exception as e:
+        print(f"✗ Idempotency store error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'success': False, 'error': 'Internal server error'})
+        }
+    
+    if existing:
+        if existing.get('request_hash') != request_hash:
+            return {
+                'statusCode': 422,
+                'headers': headers,
+                'body': json.dumps({'success': False, 'error': 'Idempotency key was already used with a different request'})
+            }
+        if existing.get('status') == 'COMPLETED':
+            print(f"Replaying stored response for idempotency key {idempotency_key}")
+            return {
+                'statusCode': int(existing['response_status']),
+                'headers': dict(headers, **{'Idempotent-Replayed': 'true'}),
+                'body': existing['response_body']
+            }
+        return {
+            'statusCode': 409,
+            'headers': headers,
+            'body': json.dumps({'success': False, 'error': 'A request with this idempotency key is still in progress'})
+        }
+    
+    response = handle_request(event, headers)
+    if response['statusCode'] >= 500:
+        release_idempotency_key(idempotency_key)
+    else:
+        complete_idempotency_key(idempotency_key, response)
+    return response
+
+def handle_request(event, headers):
+    """
+    Processes one admin access request (single provision, bulk onboarding or policy invalidation)
+    and flushes the buffered failure audit records before returning
+    """
+    try:
+        return process_request(event, headers)
+    finally:
+        flush_audit_trail()
+
+def process_request(event, headers):
+    """
+    Routes and executes one admin access request
+    """
+    request_id = str(uuid.uuid4())
+    
     try:
         # Parse request body
         if isinstance(event.get('body'), str):
@@ -332,6 +903,29 @@ def lambda_handler(event, context):
             data = event.get('body', {})
         
         print(f"Request ID: {request_id}")
+        
+        # Bulk onboarding: {"employees": [{manager_employee_id, new_employee_id, new_employee_name}, ...]}
+        if 'employees' in data:
+            return handle_bulk_onboarding(data, request_id, headers)
+        
+        # Explicit policy invalidation after a manager's role or policies change
+        if data.get('action') == 'invalidate_manager_policies':
+            manager_employee_id = data.get('manager_employee_id', '')
+            if not re.match(r'^[A-Za-z0-9-]{1,50}$', manager_employee_id):
+                raise ValidationError("Manager employee ID must contain only alphanumeric characters and hyphens (max 50 chars)")
+            generation = invalidate_manager_policies(manager_employee_id)
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': json.dumps({
+                    'success': True,
+                    'message': 'Manager policy cache invalidated',
+                    'request_id': request_id,
+                    'manager_employee_id': manager_employee_id,
+                    'policy_generation': generation
+                })
+            }
+        
         print(f"Processing access request for new employee: {data.get('new_employee_id')}")
         
         # Validate input
@@ -343,40 +937,37 @@ def lambda_handler(event, context):
         print("✓ Manager verification passed")
         
         # Get manager's IAM policies
-        policy_arns = get_manager_policies(manager['iam_role_arn'])
+        policy_arns = get_manager_policies(manager['iam_role_arn'], manager)
         print(f"✓ Retrieved {len(policy_arns)} policies")
         
         # Create IAM role for new employee
         new_role_arn = create_iam_role(data['new_employee_id'], policy_arns)
         print("✓ IAM role created")
         
-        # Store employee record in DynamoDB
+        # Store employee record and its audit entry in one transaction
         try:
-            employee_record = store_employee_record({
+            employee_record = store_provisioned_employee({
                 'employee_id': data['new_employee_id'],
                 'employee_name': data['new_employee_name'],
                 'manager_id': data['manager_employee_id'],
                 'iam_role_arn': new_role_arn
+            }, {
+                'request_id': request_id,
+                'manager_id': data['manager_employee_id'],
+                'new_employee_id': data['new_employee_id'],
+                'new_employee_name': data['new_employee_name'],
+                'status': 'SUCCESS',
+                'iam_role_arn': new_role_arn,
+                'cloned_policies_count': len(policy_arns)
             })
-            print("✓ Employee record stored")
+            print("✓ Employee record and audit entry stored")
             
         except Exception as db_error:
             # Rollback IAM role if database storage fails
             print(f"✗ Database storage failed: {str(db_error)}")
-            rollback_iam_role(f"Employee-{data['new_employee_id']}-Role")
+            rollback_iam_role(f"Employee-{data['new_employee_id']}-Role", policy_arns)
             raise db_error
         
-        # Log successful provisioning to audit trail
-        log_audit_trail({
-            'request_id': request_id,
-            'manager_id': data['manager_employee_id'],
-            'new_employee_id': data['new_employee_id'],
-            'new_employee_name': data['new_employee_name'],
-            'status': 'SUCCESS',
-            'iam_role_arn': new_role_arn,
-            'cloned_policies_count': len(policy_arns)
-        })
-        
         # Return success response
         response_body = {
             'success': True,
@@ -443,6 +1034,30 @@ def lambda_handler(event, context):
             'body': json.dumps(error_body)
         }
     
+    except EmployeeExistsError as e:
+        print(f"✗ Employee conflict: {str(e)}")
+        
+        # Log failed attempt (the IAM role created for this request was rolled back)
+        log_audit_trail({
+            'request_id': request_id,
+            'manager_id': data.get('manager_employee_id', ''),
+            'new_employee_id': data.get('new_employee_id', ''),
+            'new_employee_name': data.get('new_employee_name', ''),
+            'status': 'FAILED',
+            'error_message': str(e)
+        })
+        
+        error_body = {
+            'success': False,
+            'error': str(e),
+            'request_id': request_id
+        }
+        return {
+            'statusCode': 409,
+            'headers': headers,
+            'body': json.dumps(error_body)
+        }
+    
     except Exception as e:
         print(f"✗ Unexpected error: {str(e)}")
         
@@ -0,0 +1,154 @@
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+# Windowed micro-batching for NDJSON alert streams.
+# Alerts are grouped by their timestamp into windows of ALERT_BATCH_WINDOW_SECONDS and
+# flushed when the window closes or the batch reaches ALERT_BATCH_MAX_SIZE. Alerts that
+# look critical (severity hint or urgent wording) skip the window: the urgent lane is
+# flushed as soon as one arrives, so urgent alerts are never held behind routine noise.
+BATCH_WINDOW_SECONDS = float(os.environ.get('ALERT_BATCH_WINDOW_SECONDS', '30'))
+BATCH_MAX_SIZE = int(os.environ.get('ALERT_BATCH_MAX_SIZE', '25'))
+# Bounds of the per-request window_seconds / max_batch_size overrides
+MAX_WINDOW_SECONDS = 3600
+MAX_BATCH_SIZE_LIMIT = 100
+
+URGENT_SEVERITIES = {'critical', 'emergency', 'fatal', 'p1', 'sev1', 'sev-1'}
+URGENT_WORDS = re.compile(
+    r'\b(down|outage|unreachable|offline|ransomware|breach|compromised|data loss|corrupt(?:ed|ion)?|'
+    r'exhausted|crash(?:ed)?|failed over|not responding)\b',
+    re.IGNORECASE
+)
+
+class InvalidStreamError(Exception):
+    pass
+
+def parse_ndjson(text):
+    """
+    Parses an NDJSON body into alerts; blank lines are skipped.
+    Raises InvalidStreamError naming the first line that is not a JSON object.
+    """
+    alerts = []
+    for number, line in enumerate(str(text or '').splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            alert = json.loads(line)
+        except ValueError as e:
+            raise InvalidStreamError(f"Line {number} is not valid JSON: {str(e)}")
+        if not isinstance(alert, dict):
+            raise InvalidStreamError(f"Line {number} is not a JSON object")
+        alerts.append(alert)
+    return alerts
+
+def parse_batch_options(params):
+    """
+    Reads the window_seconds and max_batch_size query parameters.
+    Returns (window_seconds, max_size), None for the ones not given.
+    Raises InvalidStreamError when a value is not a number in range.
+    """
+    window = params.get('window_seconds')
+    if window not in (None, ''):
+        try:
+            window = float(window)
+        except ValueError:
+            raise InvalidStreamError("window_seconds must be a number")
+        if not 0 <= window <= MAX_WINDOW_SECONDS:
+            raise InvalidStreamError(f"window_seconds must be between 0 and {MAX_WINDOW_SECONDS}")
+    else:
+        window = None
+
+    max_size = params.get('max_batch_size')
+    if max_size not in (None, ''):
+        try:
+            max_size = int(max_size)
+        except ValueError:
+            raise InvalidStreamError("max_batch_size must be an integer")
+        if not 1 <= max_size <= MAX_BATCH_SIZE_LIMIT:
+            raise InvalidStreamError(f"max_batch_size must be between 1 and {MAX_BATCH_SIZE_LIMIT}")
+    else:
+        max_size = None
+    return window, max_size
+
+def alert_time(alert, default):
+    """
+    Returns the alert's timestamp as unix seconds (ISO 8601 or epoch), or default
+    """
+    value = alert.get('timestamp')
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value) / 1000.0 if value > 1e12 else float(value)
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+        except ValueError:
+            pass
+    return default
+
+def is_urgent(alert):
+    """
+    True for critical-looking alerts: a critical severity hint or urgent wording in the message
+    """
+    if str(alert.get('severity', '')).strip().lower() in URGENT_SEVERITIES:
+        return True
+    return bool(URGENT_WORDS.search(str(alert.get('message', ''))))
+
+class AlertMicroBatcher:
+    """
+    Groups a stream of alerts into batches. add() returns the batches its alert closed,
+    flush() returns what is left at the end of the stream. Each batch is
+    {'alerts': [...], 'urgent': bool, 'reason': 'urgent'|'size'|'window'|'end'}.
+    """
+    def __init__(self, window_seconds=None, max_size=None):
+        self.window_seconds = BATCH_WINDOW_SECONDS if window_seconds is None else window_seconds
+        self.max_size = max(1, max_size or BATCH_MAX_SIZE)
+        self.pending = []
+        self.window_start = None
+
+    def add(self, alert, now=None):
+        now = time.time() if now is None else now
+        if is_urgent(alert):
+            # Urgent alerts flush at once, ahead of the routine window
+            return [{'alerts': [alert], 'urgent': True, 'reason': 'urgent'}]
+
+        flushed = []
+        timestamp = alert_time(alert, now)
+        if self.pending and timestamp >= self.window_start + self.window_seconds:
+            flushed.append(self.take('window'))
+        if not self.pending:
+            self.window_start = timestamp
+        self.pending.append(alert)
+        if len(self.pending) >= self.max_size:
+            flushed.append(self.take('size'))
+        return flushed
+
+    def take(self, reason):
+        batch = {'alerts': self.pending, 'urgent': False, 'reason': reason}
+        self.pending = []
+        self.window_start = None
+        return batch
+
+    def flush(self):
+        return [self.take('end')] if self.pending else []
+
+def batch_alerts(alerts, window_seconds=None, max_size=None):
+    """
+    Splits a whole alert stream (already received) into micro-batches, urgent batches first.
+    Urgent alerts are all available at once here, so they are combined up to the maximum
+    batch size instead of costing one model call each.
+    """
+    batcher = AlertMicroBatcher(window_seconds, max_size)
+    urgent = []
+    routine = []
+    for alert in alerts:
+        for batch in batcher.add(alert):
+            if not batch['urgent']:
+                routine.append(batch)
+            elif urgent and len(urgent[-1]['alerts']) < batcher.max_size:
+                urgent[-1]['alerts'].extend(batch['alerts'])
+            else:
+                urgent.append(batch)
+    routine.extend(batcher.flush())
+    return urgent + routine
@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import alert_batcher
+import bedrock_cache
+import retry_policy
+
+# Cross-request alert suppression for alert_triage_lambda.
+# Flapping alerts (the same fingerprint arriving every few minutes) reuse the triage of
+# their first arrival instead of going back to the model. The state per fingerprint holds
+# that triage, the severity signal it was made for and the occurrence count, in an
+# in-process LRU backed by the Bedrock cache table (items prefixed 'alert#', TTL on
+# expires_at). The window slides with every repeat, up to a maximum age after which the
+# alert is triaged again; a changed severity signal re-triages at once.
+SUPPRESSION_WINDOW_SECONDS = int(os.environ.get('ALERT_SUPPRESSION_WINDOW_SECONDS', '900'))
+SUPPRESSION_MAX_AGE_SECONDS = int(os.environ.get('ALERT_SUPPRESSION_MAX_AGE_SECONDS', '3600'))
+MAX_MEMORY_ENTRIES = int(os.environ.get('ALERT_STATE_MAX_ENTRIES', '5000'))
+# Concurrent occurrence updates when a request repeats many suppressed alerts
+UPDATE_WORKERS = int(os.environ.get('ALERT_STATE_UPDATE_WORKERS', '8'))
+KEY_PREFIX = 'alert#'
+
+_states = OrderedDict()
+_states_lock = threading.Lock()
+
+def state_key(fingerprint):
+    """
+    Returns the cache table key of a fingerprint's state item
+    """
+    return KEY_PREFIX + fingerprint
+
+def severity_signal(alert):
+    """
+    Returns the severity signal a triage is valid for: the alert's severity and whether
+    it looks urgent (e.g. a message turning from "degraded" into "down")
+    """
+    severity = str(alert.get('severity') or '').strip().lower()
+    return f"{severity or 'unset'}|{'urgent' if alert_batcher.is_urgent(alert) else 'routine'}"
+
+def is_reusable(state, signal, now):
+    """
+    True while a state's triage can stand in for a repeat with this signal
+    """
+    return (state['signal'] == signal
+            and now - state['last_seen'] <= SUPPRESSION_WINDOW_SECONDS
+            and now - state['triaged_at'] <= SUPPRESSION_MAX_AGE_SECONDS)
+
+def memory_put(fingerprint, state):
+    """
+    Stores a state in the in-process LRU
+    """
+    with _states_lock:
+        _states[fingerprint] = state
+        _states.move_to_end(fingerprint)
+        while len(_states) > MAX_MEMORY_ENTRIES:
+            _states.popitem(last=False)
+
+def read_states(fingerprints):
+    """
+    Reads state items with retry_policy.get_items. Read errors count as misses.
+    """
+    try:
+        items = retry_policy.get_items(bedrock_cache.cache_table, [{'cache_key': state_key(fingerprint)} for fingerprint in fingerprints])
+    except Exception as e:
+        print(f"Alert state read error: {str(e)}")
+        return {}
+    
+    return {item['fingerprint']: {
+        'signal': item['signal'],
+        'triage': json.loads(item['triage']),
+        'occurrences': int(item.get('occurrences', 1)),
+        'triaged_at': int(item['triaged_at']),
+        'last_seen': int(item['last_seen'])
+    } for item in items}
+
+def find_reusable(signals, now=None):
+    """
+    Looks up the states of {fingerprint: severity signal}, in memory first and then in
+    DynamoDB (where other containers record their repeats). Returns {fingerprint: state}
+    for the fingerprints whose previous triage can be reused.
+    """
+    now = int(now or time.time())
+    reusable = {}
+    missing = []
+    with _states_lock:
+        for fingerprint, signal in signals.items():
+            state = _states.get(fingerprint)
+            if state and is_reusable(state, signal, now):
+                reusable[fingerprint] = state
+            else:
+                missing.append(fingerprint)
+
+    if missing:
+        for fingerprint, state in read_states(missing).items():
+            memory_put(fingerprint, state)
+            if is_reusable(state, signals[fingerprint], now):
+                reusable[fingerprint] = state
+    return reusable
+
+def record_repeat(fingerprint, count, now=None):
+    """
+    Adds count occurrences to a reused state and slides its window.
+    Returns the total occurrence count.
+    """
+    now = int(now or time.time())
+    with _states_lock:
+        state = dict(_states.get(fingerprint) or {})
+    try:
+        response = retry_policy.call(
+            'dynamodb', 'update_item', bedrock_cache.cache_table.update_item,
+            Key={'cache_key': state_key(fingerprint)},
+            UpdateExpression='ADD occurrences :count SET last_seen = :now, expires_at = :expires_at',
+            ConditionExpression='attribute_exists(cache_key)',
+            ExpressionAttributeValues={':count': count, ':now': now, ':expires_at': now + SUPPRESSION_WINDOW_SECONDS},
+            ReturnValues='UPDATED_NEW'
+        )
+        occurrences = int(response['Attributes']['occurrences'])
+    except Exception as e:
+        print(f"Alert state update error for {fingerprint}: {str(e)}")
+        occurrences = state.get('occurrences', 0) + count
+
+    if state:
+        state.update({'occurrences': occurrences, 'last_seen': now})
+        memory_put(fingerprint, state)
+    return occurrences
+
+def record_repeats(counts, now=None):
+    """
+    Runs record_repeat for {fingerprint: count} concurrently.
+    Returns {fingerprint: total occurrence count}.
+    """
+    now = int(now or time.time())
+    if not counts:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(UPDATE_WORKERS, len(counts)))) as executor:
+        totals = executor.map(lambda fingerprint: record_repeat(fingerprint, counts[fingerprint], now), counts)
+        return dict(zip(counts, totals))
+
+def save_triage(fingerprint, signal, triage, count, now=None):
+    """
+    Stores a fresh triage for a fingerprint, restarting its window and occurrence count
+    """
+    now = int(now or time.time())
+    state = {'signal': signal, 'triage': triage, 'occurrences': count, 'triaged_at': now, 'last_seen': now}
+    memory_put(fingerprint, state)
+    try:
+        bedrock_cache.cache_table.put_item(
+            Item={
+                'cache_key': state_key(fingerprint),
+                'module': 'alert-triage',
+                'fingerprint': fingerprint,
+                'signal': signal,
+                'triage': json.dumps(triage),
+                'occurrences': count,
+                'triaged_at': now,
+                'last_seen': now,
+                'expires_at': now + SUPPRESSION_WINDOW_SECONDS
+            }
+        )
+    except Exception as e:
+        print(f"Alert state write error for {fingerprint}: {str(e)}")
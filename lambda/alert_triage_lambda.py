@@ -1,18 +1,507 @@
 import json
-import boto3
+import os
+import base64
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+import hashlib
+import re
 import time
 import uuid
 
-bedrock = boto3.client('bedrock-runtime', region_name='us-east-1')
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-table = dynamodb.Table('msp-agent-sessions')
+import alert_batcher
+import alert_state
+import aws_clients
+import bedrock_cache
+import model_gateway
+import model_output
+import model_router
+import prompt_builder
+import retry_policy
+import session_logger
 
+bedrock = aws_clients.lazy_client('bedrock-runtime', 'us-east-1')
+
+# Parallel triage settings
+TRIAGE_CHUNK_SIZE = int(os.environ.get('TRIAGE_CHUNK_SIZE', '25'))
+TRIAGE_MAX_WORKERS = int(os.environ.get('TRIAGE_MAX_WORKERS', '4'))
+MAX_CHUNK_SIZE = 100
+
+SEVERITY_RANK = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+def normalize_alert_text(value, mask_digits=False):
+    """
+    Normalizes alert text for fingerprinting: lowercase, whitespace collapsed and,
+    for messages, digits masked so "CPU 95% for 10 minutes" and "CPU 97% for 12 minutes"
+    produce the same text
+    """
+    text = str(value or '').lower()
+    if mask_digits:
+        text = re.sub(r'\d+', '#', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+def get_alert_id(alert, index):
+    """
+    Returns the alert's id, falling back to a positional id for alerts without one
+    """
+    return str(alert.get('id') or alert.get('alert_id') or f"alert-{index + 1}")
+
+def fingerprint_alert(alert):
+    """
+    Fingerprints an alert by normalized source, message and metadata.server
+    """
+    metadata = alert.get('metadata') or {}
+    server = metadata.get('server', '') if isinstance(metadata, dict) else ''
+    key = '|'.join([
+        normalize_alert_text(alert.get('source')),
+        normalize_alert_text(alert.get('message'), mask_digits=True),
+        normalize_alert_text(server)
+    ])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+def cluster_alerts(alerts):
+    """
+    Collapses duplicate alerts into clusters keyed by fingerprint.
+    Clusters keep first-arrival order, so the result is deterministic for a given input.
+    """
+    clusters = {}
+    for index, alert in enumerate(alerts):
+        fingerprint = fingerprint_alert(alert)
+        alert_id = get_alert_id(alert, index)
+        timestamp = alert.get('timestamp')
+        
+        if fingerprint not in clusters:
+            clusters[fingerprint] = {
+                'cluster_id': f"cluster-{len(clusters) + 1}",
+                'fingerprint': fingerprint,
+                'representative_id': alert_id,
+                'representative': alert,
+                'member_ids': [],
+                'count': 0,
+                'first_seen': timestamp,
+                'last_seen': timestamp
+            }
+        
+        cluster = clusters[fingerprint]
+        cluster['member_ids'].append(alert_id)
+        cluster['count'] += 1
+        if timestamp:
+            if not cluster['first_seen'] or timestamp < cluster['first_seen']:
+                cluster['first_seen'] = timestamp
+            if not cluster['last_seen'] or timestamp > cluster['last_seen']:
+                cluster['last_seen'] = timestamp
+    
+    return list(clusters.values())
+
+def build_representative_alerts(clusters):
+    """
+    Builds the alert list sent to the model: one representative per cluster,
+    annotated with occurrence count and time range when it stands for duplicates
+    """
+    representatives = []
+    for cluster in clusters:
+        alert = dict(cluster['representative'])
+        alert['id'] = cluster['representative_id']
+        if cluster['count'] > 1:
+            alert['occurrences'] = cluster['count']
+            alert['first_seen'] = cluster['first_seen']
+            alert['last_seen'] = cluster['last_seen']
+        representatives.append(alert)
+    return representatives
+
+def expand_prioritized_alerts(analysis, clusters):
+    """
+    Copies each prioritized cluster representative back onto every member alert
+    """
+    clusters_by_id = {cluster['representative_id']: cluster for cluster in clusters}
+    expanded = []
+    
+    for entry in analysis.get('prioritized_alerts', []):
+        cluster = clusters_by_id.get(str(entry.get('alert_id')))
+        if not cluster:
+            expanded.append(entry)
+            continue
+        
+        for member_id in cluster['member_ids']:
+            member_entry = dict(entry)
+            member_entry['alert_id'] = member_id
+            member_entry['cluster_id'] = cluster['cluster_id']
+            member_entry['occurrences'] = cluster['count']
+            expanded.append(member_entry)
+    
+    analysis['prioritized_alerts'] = expanded
+    analysis['total_alerts'] = sum(cluster['count'] for cluster in clusters)
+    return analysis
+
+def parse_model_response(response_body):
+    """
+    Extracts and validates the JSON analysis from a Bedrock response body
+    (reasoning blocks, fences and surrounding prose are ignored)
+    """
+    return model_output.extract_json(response_body, 'alert-triage')
+
+def summarize_overflow_alerts(alerts):
+    """
+    Summarizes alerts that did not fit the prompt budget: counts per source and their ids
+    """
+    sources = {}
+    for alert in alerts:
+        source = str(alert.get('source', 'unknown'))
+        sources[source] = sources.get(source, 0) + 1
+    return {
+        'omitted_alerts': len(alerts),
+        'by_source': dict(sorted(sources.items(), key=lambda pair: -pair[1])[:10]),
+        'alert_ids': [str(alert.get('id')) for alert in alerts[:50]]
+    }
+
+def triage_alerts(alerts, bypass=False):
+    """
+    Sends one batch of alerts to Bedrock and returns the parsed analysis,
+    token usage, cache report, prompt report and routing decision
+    """
+    alerts_text, prompt_stats = prompt_builder.compact_items('alert-triage', alerts, summarize=summarize_overflow_alerts)
+    critical = any(str(alert.get('severity', '')).lower() == 'critical' for alert in alerts)
+    decision = model_router.route('alert-triage', prompt_stats['input_tokens'], len(alerts), critical)
+    
+    # Construct prompt for Claude
+    prompt = f"""You are an expert MSP technician. Prioritize these system alerts.
+Alerts with "occurrences" stand for that many duplicates between "first_seen" and "last_seen".
+
+Alerts:
+{alerts_text}
+
+Respond ONLY with valid JSON in this format:
+{{"total_alerts":<number>,"prioritized_alerts":[{{"alert_id":"<id>","severity":"Critical|High|Medium|Low","priority_score":<1-100>,"business_impact":"<description>","recommended_action":"<action>","estimated_resolution_time":"<time>","dependencies":[]}}],"summary":"<overall summary>"}}"""
+    prompt_stats = prompt_builder.finish_stats(prompt_stats, prompt, decision['max_tokens'])
+
+    # Call Bedrock with the routed model (through the model gateway: response cache + request coalescing)
+    started = time.time()
+    response_body, cache_info = model_gateway.invoke_model(
+        bedrock,
+        decision['model_id'],
+        model_router.request_params(decision, prompt),
+        module='alert-triage',
+        bypass=bypass,
+        validate=parse_model_response
+    )
+    decision = model_router.record(decision, started, cache_info, response_body.get('usage', {}))
+    print(f"Bedrock response ({cache_info['status']}): {json.dumps(response_body)}")
+    
+    analysis = parse_model_response(response_body)
+    
+    return analysis, response_body.get('usage', {}), cache_info, prompt_stats, decision
+
+def parse_chunk_size(value):
+    """
+    Returns the chunk_size a request asked for, or TRIAGE_CHUNK_SIZE when not given.
+    Raises ValueError when it is not an integer between 1 and MAX_CHUNK_SIZE.
+    """
+    if value in (None, ''):
+        return TRIAGE_CHUNK_SIZE
+    try:
+        if isinstance(value, bool) or float(value) != int(float(value)):
+            raise ValueError
+        chunk_size = int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("chunk_size must be an integer")
+    if not 1 <= chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+    return chunk_size
+
+def chunk_alerts(alerts, chunk_size):
+    """
+    Splits the alert list into consecutive chunks of at most chunk_size alerts, each
+    small enough for the prompt budget, so every alert is prioritized
+    """
+    chunk_size = max(1, chunk_size)
+    chunks = []
+    for i in range(0, len(alerts), chunk_size):
+        chunks.extend(prompt_builder.split_to_budget('alert-triage', alerts[i:i + chunk_size]))
+    return chunks
+
+def sort_prioritized(prioritized, input_order):
+    """
+    Orders prioritized alerts by priority_score, then severity, then input order
+    """
+    def sort_key(entry):
+        try:
+            score = float(entry.get('priority_score', 0))
+        except (TypeError, ValueError):
+            score = 0
+        severity = SEVERITY_RANK.get(str(entry.get('severity', '')).lower(), len(SEVERITY_RANK))
+        position = input_order.get(str(entry.get('alert_id')), len(input_order))
+        return (-score, severity, position, str(entry.get('alert_id')))
+    
+    prioritized.sort(key=sort_key)
+    return prioritized
+
+def merge_chunk_results(alerts, chunk_results):
+    """
+    Merges per-chunk analyses into one analysis (prompt and routing reports are merged by the caller).
+    prioritized_alerts are ordered by priority_score, then severity, then input order,
+    so the merged list does not depend on which chunk finished first.
+    """
+    input_order = {get_alert_id(alert, index): index for index, alert in enumerate(alerts)}
+    prioritized = []
+    summaries = []
+    usage = {}
+    cache_hits = 0
+    
+    for chunk_index, (analysis, chunk_usage, cache_info, _, _) in enumerate(chunk_results):
+        if cache_info['status'] == 'hit':
+            cache_hits += 1
+        prioritized.extend(analysis.get('prioritized_alerts', []))
+        if analysis.get('summary'):
+            summaries.append(analysis['summary'])
+        for key, value in chunk_usage.items():
+            if isinstance(value, (int, float)):
+                usage[key] = usage.get(key, 0) + value
+    
+    sort_prioritized(prioritized, input_order)
+    
+    if len(summaries) > 1:
+        summary = ' '.join(f"[Batch {index + 1}/{len(summaries)}] {text}" for index, text in enumerate(summaries))
+    else:
+        summary = summaries[0] if summaries else ''
+    
+    merged = {
+        'total_alerts': len(alerts),
+        'prioritized_alerts': prioritized,
+        'summary': summary
+    }
+    cache_info = {
+        'status': 'hit' if cache_hits == len(chunk_results) else ('partial' if cache_hits else 'miss'),
+        'hits': cache_hits,
+        'misses': len(chunk_results) - cache_hits
+    }
+    return merged, usage, cache_info
+
+def triage_in_chunks(alerts, chunk_size=None, max_workers=None, bypass=False):
+    """
+    Triages alerts in size-bounded chunks on a bounded thread pool and merges the results
+    """
+    chunks = chunk_alerts(alerts, chunk_size or TRIAGE_CHUNK_SIZE)
+    workers = max(1, min(max_workers or TRIAGE_MAX_WORKERS, len(chunks)))
+    print(f"Parallel triage: {len(alerts)} alerts in {len(chunks)} chunks on {workers} workers")
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # map() returns results in chunk order regardless of completion order
+        chunk_results = list(executor.map(lambda chunk: triage_alerts(chunk, bypass), chunks))
+    
+    merged, usage, cache_info = merge_chunk_results(alerts, chunk_results)
+    return (merged, usage, cache_info,
+            prompt_builder.merge_stats([result[3] for result in chunk_results]),
+            model_router.merge_decisions([result[4] for result in chunk_results]))
+
+def suppress_repeats(clusters, bypass=False):
+    """
+    Splits clusters into repeats whose previous triage is still valid (same severity
+    signal, suppression window not expired) and clusters that need the model.
+    Repeats get their occurrence counts added to the alert state, concurrently.
+    Returns (entries reused for the repeats, clusters to triage, severity signals).
+    """
+    signals = {cluster['fingerprint']: alert_state.severity_signal(cluster['representative']) for cluster in clusters}
+    reusable = {} if bypass else alert_state.find_reusable(signals)
+    
+    repeats = [cluster for cluster in clusters if cluster['fingerprint'] in reusable]
+    pending = [cluster for cluster in clusters if cluster['fingerprint'] not in reusable]
+    occurrences = alert_state.record_repeats({cluster['fingerprint']: cluster['count'] for cluster in repeats})
+    
+    reused = []
+    for cluster in repeats:
+        state = reusable[cluster['fingerprint']]
+        entry = dict(state['triage'])
+        entry['alert_id'] = cluster['representative_id']
+        entry['suppressed'] = True
+        entry['window_occurrences'] = occurrences[cluster['fingerprint']]
+        entry['triaged_at'] = datetime.utcfromtimestamp(state['triaged_at']).isoformat() + 'Z'
+        reused.append(entry)
+    return reused, pending, signals
+
+def remember_triage(analysis, clusters, signals):
+    """
+    Stores the fresh triage of each cluster as its alert state
+    """
+    entries = {str(entry.get('alert_id')): entry for entry in analysis.get('prioritized_alerts', [])}
+    for cluster in clusters:
+        entry = entries.get(cluster['representative_id'])
+        if entry:
+            triage = {key: value for key, value in entry.items() if key != 'alert_id'}
+            alert_state.save_triage(cluster['fingerprint'], signals[cluster['fingerprint']], triage, cluster['count'])
+
+def run_triage(alerts, bypass=False, chunk_size=None, parallel=False):
+    """
+    Triages a list of alerts: duplicates are collapsed into clusters, repeats of alerts
+    triaged within the suppression window reuse that triage, the remaining representatives
+    are triaged (in parallel chunks when requested or too large for one response or
+    prompt budget) and the
+    results are expanded back onto every member alert.
+    Returns (analysis, usage, cache report, prompt report, routing, clusters, chunk count,
+    suppression report).
+    """
+    # Pre-triage: collapse duplicate alerts so only cluster representatives reach the model
+    clusters = cluster_alerts(alerts)
+    print(f"Pre-triage: {len(alerts)} alerts collapsed into {len(clusters)} clusters")
+    
+    # Cross-request suppression: repeats with an unchanged severity signal skip the model
+    reused, pending, signals = suppress_repeats(clusters, bypass)
+    suppression = {
+        'suppressed_clusters': len(reused),
+        'triaged_clusters': len(pending),
+        'window_seconds': alert_state.SUPPRESSION_WINDOW_SECONDS
+    }
+    if reused:
+        print(f"Suppression: {len(reused)} clusters reuse their previous triage")
+    
+    model_alerts = build_representative_alerts(pending)
+    chunk_size = chunk_size or TRIAGE_CHUNK_SIZE
+    chunk_count = len(chunk_alerts(model_alerts, chunk_size))
+    if not model_alerts:
+        analysis = {'prioritized_alerts': [], 'summary': f"All {len(clusters)} alert groups repeat alerts already triaged within the suppression window."}
+        usage, cache_info, prompt_stats, routing = {}, {'status': 'suppressed'}, {}, model_router.merge_decisions([])
+        chunk_count = 0
+    # Fan out across chunks when requested or when the batch is too large for one response
+    elif parallel or chunk_count > 1:
+        analysis, usage, cache_info, prompt_stats, routing = triage_in_chunks(model_alerts, chunk_size, bypass=bypass)
+    else:
+        analysis, usage, cache_info, prompt_stats, routing = triage_alerts(model_alerts, bypass)
+    
+    if model_alerts:
+        remember_triage(analysis, pending, signals)
+    if reused:
+        input_order = {cluster['representative_id']: index for index, cluster in enumerate(clusters)}
+        analysis['prioritized_alerts'] = sort_prioritized(analysis.get('prioritized_alerts', []) + reused, input_order)
+    
+    # Expand cluster results back onto every member alert
+    analysis = expand_prioritized_alerts(analysis, clusters)
+    return analysis, usage, cache_info, prompt_stats, routing, clusters, chunk_count, suppression
+
+def is_ndjson_request(event):
+    """
+    Returns True when the request body is an NDJSON alert stream
+    """
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    params = event.get('queryStringParameters') or {}
+    return NDJSON_CONTENT_TYPE in str(headers.get('content-type', '')) or params.get('mode') == 'ndjson'
+
+def read_ingest_request(event):
+    """
+    Reads an NDJSON ingest request: returns (alerts, window_seconds, max_batch_size, bypass).
+    Raises alert_batcher.InvalidStreamError for invalid options, lines or an empty stream.
+    """
+    params = event.get('queryStringParameters') or {}
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8')
+    
+    window, max_size = alert_batcher.parse_batch_options(params)
+    alerts = alert_batcher.parse_ndjson(body)
+    if not alerts:
+        raise alert_batcher.InvalidStreamError('No alerts provided')
+    return alerts, window, max_size, str(params.get('cache', '')).lower() == 'bypass'
+
+def ingest_events(alerts, window, max_size, bypass, started):
+    """
+    Micro-batches alerts by time window, batch size and severity hint and triages the
+    batches in parallel, urgent batches first. Yields one 'batch' event per batch as it
+    completes, then a 'complete' event.
+    """
+    batches = alert_batcher.batch_alerts(alerts, window, max_size)
+    print(f"NDJSON ingest: {len(alerts)} alerts in {len(batches)} batches "
+          f"({sum(1 for batch in batches if batch['urgent'])} urgent)")
+    
+    failed = 0
+    usage = {}
+    workers = max(1, min(TRIAGE_MAX_WORKERS, len(batches)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Submitted in order, so urgent batches get the first workers
+        futures = {executor.submit(run_triage, batch['alerts'], bypass): number
+                   for number, batch in enumerate(batches, 1)}
+        for future in as_completed(futures):
+            number = futures[future]
+            batch = batches[number - 1]
+            line = {
+                'event': 'batch',
+                'batch': number,
+                'reason': batch['reason'],
+                'urgent': batch['urgent'],
+                'alerts': len(batch['alerts']),
+                'elapsed_ms': int((time.time() - started) * 1000)
+            }
+            try:
+                analysis, batch_usage, cache_info, _, routing, _, _, suppression = future.result()
+                line.update({'analysis': analysis, 'cache': cache_info, 'routing': routing, 'suppression': suppression})
+                usage = model_output.add_usage(usage, batch_usage)
+            except Exception as e:
+                failed += 1
+                print(f"NDJSON batch {number} failed: {str(e)}")
+                line['error'] = str(e)
+            yield line
+    
+    session_id = str(uuid.uuid4())
+    session_logger.log_session(
+        'alert-triage',
+        'success' if not failed else 'error',
+        session_id=session_id,
+        timestamp=int(time.time()),
+        payloads={'request': alerts},
+        processing_time=usage.get('output_tokens', 0),
+        extra={'ingest_batches': len(batches), 'failed_batches': failed}
+    )
+    
+    yield {
+        'event': 'complete',
+        'session_id': session_id,
+        'alerts': len(alerts),
+        'batches': len(batches),
+        'failed_batches': failed,
+        'processing_time': usage,
+        'elapsed_ms': int((time.time() - started) * 1000)
+    }
+
+def ingest_ndjson(event, context):
+    """
+    Ingests an NDJSON alert stream (one alert per line). The response is NDJSON as well:
+    one 'batch' line per batch in completion order, then a 'complete' line.
+    API Gateway REST buffers proxy responses, so the lines arrive together here;
+    remediation_stream_server (POST /alerts) sends each batch line as soon as it completes.
+    """
+    started = time.time()
+    try:
+        alerts, window, max_size, bypass = read_ingest_request(event)
+    except alert_batcher.InvalidStreamError as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e)})
+        }
+    
+    lines = [json.dumps(line) for line in ingest_events(alerts, window, max_size, bypass, started)]
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': NDJSON_CONTENT_TYPE,
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': '\n'.join(lines) + '\n'
+    }
+
+@aws_clients.measure_init('alert-triage')
+@session_logger.flush_after
 def lambda_handler(event, context):
     """
     Alert Triage Lambda - Analyzes and prioritizes alerts using Claude 3.5
     """
+    retry_policy.start_invocation(context)
     try:
+        # NDJSON alert streams are micro-batched and answered with one result line per batch
+        if is_ndjson_request(event):
+            return ingest_ndjson(event, context)
+        
         # Parse input
         body = json.loads(event.get('body', '{}'))
         alerts = body.get('alerts', [])
@@ -24,85 +513,37 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'No alerts provided'})
             }
         
-        # Construct prompt for Claude
-        prompt = f"""You are an expert MSP technician analyzing system alerts. Analyze the following alerts and provide a prioritized response.
-
-Alerts to analyze:
-{json.dumps(alerts, indent=2)}
-
-Provide your analysis in the following JSON format:
-{{
-  "total_alerts": <number>,
-  "prioritized_alerts": [
-    {{
-      "alert_id": "<id>",
-      "severity": "Critical|High|Medium|Low",
-      "priority_score": <1-100>,
-      "business_impact": "<description>",
-      "recommended_action": "<action>",
-      "estimated_resolution_time": "<time>",
-      "dependencies": []
-    }}
-  ],
-  "summary": "<overall summary>"
-}}
-
-Respond ONLY with valid JSON, no additional text."""
-
-        # Call Bedrock with Qwen
-        response = bedrock.invoke_model(
-            modelId='qwen.qwen3-32b-v1:0',
-            body=json.dumps({
-                'max_tokens': 2000,
-                'temperature': 0.7,
-                'top_p': 0.9,
-                'messages': [{
-                    'role': 'user',
-                    'content': prompt
-                }]
-            })
-        )
-        
-        # Parse response (Qwen format)
-        response_body = json.loads(response['body'].read())
-        print(f"Bedrock response: {json.dumps(response_body)}")
-        
-        # Try different response formats
-        if 'choices' in response_body:
-            ai_response = response_body['choices'][0]['message']['content']
-        elif 'output' in response_body:
-            ai_response = response_body['output']['text']
-        elif 'content' in response_body:
-            ai_response = response_body['content'][0]['text']
-        else:
-            ai_response = str(response_body)
-        
-        # Strip markdown code blocks if present
-        if ai_response.startswith('```json'):
-            ai_response = ai_response.replace('```json', '').replace('```', '').strip()
-        elif ai_response.startswith('```'):
-            ai_response = ai_response.replace('```', '').strip()
+        try:
+            chunk_size = parse_chunk_size(body.get('chunk_size'))
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': str(e)})
+            }
         
-        # Extract JSON from response
-        analysis = json.loads(ai_response)
+        analysis, usage, cache_info, prompt_stats, routing, clusters, chunk_count, suppression = run_triage(
+            alerts,
+            bypass=bedrock_cache.is_bypass_requested(body),
+            chunk_size=chunk_size,
+            parallel=body.get('mode') == 'parallel'
+        )
         
-        # Log to DynamoDB
+        # Buffer the session log; it is handed to the session log queue when the handler returns
         session_id = str(uuid.uuid4())
         timestamp = int(time.time())
-        try:
-            table.put_item(
-                Item={
-                    'session_id': session_id,
-                    'timestamp': timestamp,
-                    'module': 'alert-triage',
-                    'request': json.dumps(alerts),
-                    'response': json.dumps(analysis),
-                    'processing_time': response_body.get('usage', {}).get('output_tokens', 0),
-                    'status': 'success'
-                }
-            )
-        except Exception as db_error:
-            print(f"DynamoDB logging error: {str(db_error)}")
+        session_logger.log_session(
+            'alert-triage',
+            'success',
+            session_id=session_id,
+            timestamp=timestamp,
+            payloads={'request': alerts, 'response': analysis},
+            processing_time=usage.get('output_tokens', 0),
+            extra={'prompt_stats': prompt_stats, 'model_id': routing.get('model_id') or ','.join(sorted(routing['models']))}
+        )
         
         return {
             'statusCode': 200,
@@ -113,12 +554,23 @@ Respond ONLY with valid JSON, no additional text."""
             'body': json.dumps({
                 'session_id': session_id,
                 'analysis': analysis,
-                'processing_time': response_body.get('usage', {})
+                'pre_triage': {
+                    'input_alerts': len(alerts),
+                    'clusters': len(clusters),
+                    'duplicates_collapsed': len(alerts) - len(clusters)
+                },
+                'suppression': suppression,
+                'chunks': chunk_count,
+                'cache': cache_info,
+                'prompt': prompt_stats,
+                'routing': routing,
+                'processing_time': usage
             })
         }
         
     except Exception as e:
         print(f"Error: {str(e)}")
+        session_logger.log_session('alert-triage', 'error', extra={'error_message': str(e)})
         return {
             'statusCode': 500,
             'headers': {
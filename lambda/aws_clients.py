@@ -0,0 +1,173 @@
+import functools
+import json
+import os
+import threading
+import time
+
+# Recorded when the first handler module imports this one, i.e. at the start of the init phase
+INIT_STARTED = time.time()
+
+import boto3
+from botocore.config import Config
+
+# Shared AWS client factory for all lambdas.
+# Clients and resources are created on first use (not at import time), memoized per
+# (service, region) and built from one boto3 session, so botocore loads each service
+# model once and code paths that never touch a service never pay for it.
+#
+# Retries stay with retry_policy; botocore is limited to a single extra attempt so the
+# two layers do not multiply, while adaptive mode adds client-side rate limiting.
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '25'))
+CONNECT_TIMEOUT = float(os.environ.get('AWS_CONNECT_TIMEOUT', '2'))
+READ_TIMEOUT = float(os.environ.get('AWS_READ_TIMEOUT', '10'))
+# Model calls can run for a long time before the first byte
+BEDROCK_READ_TIMEOUT = float(os.environ.get('BEDROCK_READ_TIMEOUT', '120'))
+SDK_MAX_ATTEMPTS = int(os.environ.get('AWS_SDK_MAX_ATTEMPTS', '2'))
+
+METRICS_NAMESPACE = 'MSPAgents'
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    connect_timeout=CONNECT_TIMEOUT,
+    read_timeout=READ_TIMEOUT,
+    tcp_keepalive=True,
+    retries={'mode': 'adaptive', 'total_max_attempts': SDK_MAX_ATTEMPTS}
+)
+
+# Per-service overrides merged into CLIENT_CONFIG
+SERVICE_CONFIG = {
+    'bedrock-runtime': Config(read_timeout=BEDROCK_READ_TIMEOUT)
+}
+
+_session = None
+_clients = {}
+_lock = threading.Lock()
+# Milliseconds spent creating each client/resource in this container
+_create_ms = {}
+_cold_start = True
+
+def get_session():
+    """
+    Returns the boto3 session shared by every client in this container
+    """
+    global _session
+    if _session is None:
+        _session = boto3.session.Session()
+    return _session
+
+def get_config(service):
+    """
+    Returns the tuned botocore Config for a service
+    """
+    if service in SERVICE_CONFIG:
+        return CLIENT_CONFIG.merge(SERVICE_CONFIG[service])
+    return CLIENT_CONFIG
+
+def create(kind, service, region):
+    """
+    Creates (once) and returns a client or resource for (service, region)
+    """
+    key = (kind, service, region)
+    if key in _clients:
+        return _clients[key]
+
+    with _lock:
+        if key not in _clients:
+            started = time.time()
+            session = get_session()
+            factory = session.client if kind == 'client' else session.resource
+            _clients[key] = factory(service, region_name=region, config=get_config(service))
+            _create_ms[f"{kind}:{service}:{region}"] = int((time.time() - started) * 1000)
+        return _clients[key]
+
+def client(service, region):
+    """
+    Returns the shared low-level client for a service and region
+    """
+    return create('client', service, region)
+
+def resource(service, region):
+    """
+    Returns the shared resource for a service and region
+    """
+    return create('resource', service, region)
+
+class LazyClient:
+    """
+    Stand-in for a module-level client, resource or DynamoDB table that is
+    only created when one of its attributes is first used
+    """
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+
+    def _resolve(self):
+        if self._target is None:
+            self._target = self._factory()
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+def lazy_client(service, region):
+    """
+    Returns a lazily created client, e.g. bedrock = lazy_client('bedrock-runtime', 'us-east-1')
+    """
+    return LazyClient(lambda: client(service, region))
+
+def lazy_resource(service, region):
+    """
+    Returns a lazily created resource
+    """
+    return LazyClient(lambda: resource(service, region))
+
+def lazy_table(table_name, region):
+    """
+    Returns a lazily created DynamoDB Table on the shared dynamodb resource
+    """
+    return LazyClient(lambda: resource('dynamodb', region).Table(table_name))
+
+def emit_init_metrics(handler_name, init_ms, first_request_ms):
+    """
+    Logs cold-start timings as CloudWatch embedded-format metrics
+    """
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Handler']],
+                'Metrics': [
+                    {'Name': 'InitDuration', 'Unit': 'Milliseconds'},
+                    {'Name': 'FirstRequestDuration', 'Unit': 'Milliseconds'}
+                ]
+            }]
+        },
+        'Handler': handler_name,
+        'InitDuration': init_ms,
+        'FirstRequestDuration': first_request_ms,
+        'ClientCreateMs': dict(_create_ms)
+    }))
+
+def measure_init(handler_name):
+    """
+    Decorates a lambda_handler to report, on the container's first invocation, the
+    init time (module imports up to the first call), the first request's duration
+    and the time spent creating each AWS client
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            global _cold_start
+            if not _cold_start:
+                return handler(event, context)
+
+            _cold_start = False
+            started = time.time()
+            init_ms = int((started - INIT_STARTED) * 1000)
+            try:
+                return handler(event, context)
+            finally:
+                emit_init_metrics(handler_name, init_ms, int((time.time() - started) * 1000))
+        return wrapper
+    return decorator
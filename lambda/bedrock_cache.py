@@ -0,0 +1,160 @@
+import json
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import aws_clients
+
+# Shared Bedrock response cache used by the AI lambdas (through model_gateway).
+# Tier 1 is an in-process LRU that survives across warm invocations,
+# tier 2 is a DynamoDB table with a TTL attribute (expires_at).
+CACHE_TABLE = os.environ.get('BEDROCK_CACHE_TABLE', 'msp-bedrock-cache')
+CACHE_MAX_ENTRIES = int(os.environ.get('BEDROCK_CACHE_MAX_ENTRIES', '256'))
+
+# Default TTL per module in seconds, overridable with BEDROCK_CACHE_TTL_<MODULE>
+# (e.g. BEDROCK_CACHE_TTL_ALERT_TRIAGE=600)
+DEFAULT_TTL_SECONDS = {
+    'alert-triage': 300,
+    'patch-assessment': 86400,
+    'remediation-script': 3600
+}
+
+cache_table = aws_clients.lazy_table(CACHE_TABLE, 'us-east-1')
+
+_memory_cache = OrderedDict()
+_memory_lock = threading.Lock()
+
+def get_ttl_seconds(module):
+    """
+    Returns the cache TTL for a module
+    """
+    env_name = 'BEDROCK_CACHE_TTL_' + module.upper().replace('-', '_')
+    return int(os.environ.get(env_name, DEFAULT_TTL_SECONDS.get(module, 300)))
+
+def normalize_prompt(prompt):
+    """
+    Normalizes prompt text so whitespace-only differences hit the same cache entry
+    """
+    lines = [line.rstrip() for line in str(prompt).strip().splitlines()]
+    return '\n'.join(lines)
+
+def make_cache_key(model_id, request_params):
+    """
+    Builds the content address for a model request: a hash of the model id,
+    the generation parameters and the normalized prompt messages
+    """
+    params = dict(request_params)
+    messages = [
+        {'role': message.get('role'), 'content': normalize_prompt(message.get('content', ''))}
+        for message in params.pop('messages', [])
+    ]
+    key_source = json.dumps({
+        'model_id': model_id,
+        'params': params,
+        'messages': messages
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+def memory_get(cache_key):
+    """
+    Looks up a key in the in-process LRU, dropping it if expired
+    """
+    with _memory_lock:
+        entry = _memory_cache.get(cache_key)
+        if not entry:
+            return None
+        if entry['expires_at'] <= time.time():
+            del _memory_cache[cache_key]
+            return None
+        _memory_cache.move_to_end(cache_key)
+        return entry['response_body']
+
+def memory_put(cache_key, response_body, expires_at):
+    """
+    Stores a response in the in-process LRU, evicting the least recently used entries
+    """
+    with _memory_lock:
+        _memory_cache[cache_key] = {'response_body': response_body, 'expires_at': expires_at}
+        _memory_cache.move_to_end(cache_key)
+        while len(_memory_cache) > CACHE_MAX_ENTRIES:
+            _memory_cache.popitem(last=False)
+
+def dynamodb_get(cache_key, min_created_at=None):
+    """
+    Looks up a key in the DynamoDB tier. Returns (response_body, expires_at) or None.
+    DynamoDB deletes expired items lazily, so expires_at is checked here as well.
+    min_created_at ignores entries stored before that unix time.
+    """
+    try:
+        response = cache_table.get_item(Key={'cache_key': cache_key})
+    except Exception as e:
+        print(f"Cache read error: {str(e)}")
+        return None
+
+    item = response.get('Item')
+    if not item or int(item.get('expires_at', 0)) <= time.time():
+        return None
+    if min_created_at and int(item.get('created_at', 0)) < min_created_at:
+        return None
+    return json.loads(item['response_body']), int(item['expires_at'])
+
+def dynamodb_put(cache_key, response_body, module, model_id, expires_at):
+    """
+    Writes a response to the DynamoDB tier (best effort)
+    """
+    try:
+        cache_table.put_item(
+            Item={
+                'cache_key': cache_key,
+                'module': module,
+                'model_id': model_id,
+                'response_body': json.dumps(response_body),
+                'created_at': int(time.time()),
+                'expires_at': expires_at
+            }
+        )
+    except Exception as e:
+        print(f"Cache write error: {str(e)}")
+
+def cache_lookup(cache_key):
+    """
+    Looks up a cache key in both tiers. Returns (response_body, tier) or None.
+    """
+    response_body = memory_get(cache_key)
+    if response_body is not None:
+        return response_body, 'memory'
+
+    cached = dynamodb_get(cache_key)
+    if cached:
+        response_body, expires_at = cached
+        memory_put(cache_key, response_body, expires_at)
+        return response_body, 'dynamodb'
+
+    return None
+
+def cache_store(cache_key, response_body, module, model_id):
+    """
+    Stores a response in both tiers with the module's TTL
+    """
+    expires_at = int(time.time()) + get_ttl_seconds(module)
+    memory_put(cache_key, response_body, expires_at)
+    dynamodb_put(cache_key, response_body, module, model_id, expires_at)
+
+def cache_result(status, tier, cache_key, started):
+    """
+    Builds the cache report included in handler responses
+    """
+    return {
+        'status': status,
+        'tier': tier,
+        'key': cache_key[:16],
+        'lookup_ms': int((time.time() - started) * 1000) if status in ('hit', 'coalesced') else None
+    }
+
+def is_bypass_requested(body):
+    """
+    Returns True when the request body carries "cache": "bypass"
+    """
+    return str(body.get('cache', '')).lower() == 'bypass'
@@ -0,0 +1,58 @@
+import json
+
+import aws_clients
+import job_queue
+
+def json_response(status_code, body):
+    """
+    Builds an API Gateway proxy response with a JSON body
+    """
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(body)
+    }
+
+@aws_clients.measure_init('job-api')
+def lambda_handler(event, context):
+    """
+    Job API Lambda - Submits AI agent requests as asynchronous jobs and reports their status.
+
+    POST /jobs                  {"module": "alert-triage", "payload": {...}}  -> 202 with the job_id
+    GET  /jobs/{job_id}         (or ?job_id=...)  -> status, progress and, once finished, the result
+    """
+    try:
+        if event.get('httpMethod') == 'GET':
+            params = event.get('queryStringParameters') or {}
+            job_id = (event.get('pathParameters') or {}).get('job_id') or params.get('job_id')
+            if not job_id:
+                return json_response(400, {'error': 'No job_id provided'})
+
+            job = job_queue.get_job(job_id, params.get('include') != 'status')
+            if not job:
+                return json_response(404, {'error': 'Job not found'})
+            return json_response(200, job)
+
+        # Submit
+        body = json.loads(event.get('body') or '{}')
+        module = body.get('module')
+        payload = body.get('payload')
+
+        if module not in job_queue.MODULES:
+            return json_response(400, {'error': f"module must be one of: {', '.join(job_queue.MODULES)}"})
+        if not isinstance(payload, dict) or not payload:
+            return json_response(400, {'error': 'No payload provided'})
+
+        job = job_queue.submit_job(module, payload)
+        job['status_url'] = f"/jobs/{job['job_id']}"
+        return json_response(202, job)
+
+    except json.JSONDecodeError:
+        return json_response(400, {'error': 'Invalid JSON body'})
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return json_response(500, {'error': str(e)})
@@ -0,0 +1,284 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from botocore.exceptions import ClientError
+
+import aws_clients
+import session_payloads
+
+# Asynchronous jobs for model calls that can outlive API Gateway's 29 s integration limit.
+# A job record holds the module, the request payload, the status and finally the module
+# handler's response; the job id travels through a queue to job_worker_lambda.
+#
+# JOB_BACKEND selects where records and queue messages live:
+#   aws     - DynamoDB table JOBS_TABLE and the SQS queue JOB_QUEUE_URL
+#   memory  - an in-process dict and queue with a background worker thread (local testing)
+# Payloads and results are stored like session payloads (compressed, offloaded when large).
+JOB_BACKEND = os.environ.get('JOB_BACKEND', 'aws')
+JOBS_TABLE = os.environ.get('JOBS_TABLE', 'msp-agent-jobs')
+JOB_QUEUE_URL = os.environ.get('JOB_QUEUE_URL', '')
+# The queue lives in the lambdas' region so it can trigger job_worker_lambda
+JOB_QUEUE_REGION = os.environ.get('JOB_QUEUE_REGION', 'us-east-2')
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', str(7 * 24 * 3600)))
+# A RUNNING job whose worker has not finished within the lease is picked up again
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '900'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '3'))
+# Invocation time the in-process worker gives each job (the job-worker lambda's timeout)
+JOB_LOCAL_TIMEOUT_SECONDS = int(os.environ.get('JOB_LOCAL_TIMEOUT_SECONDS', '900'))
+
+MODULES = ['alert-triage', 'patch-assessment', 'remediation-script']
+
+QUEUED = 'QUEUED'
+RUNNING = 'RUNNING'
+SUCCEEDED = 'SUCCEEDED'
+FAILED = 'FAILED'
+
+jobs_table = aws_clients.lazy_table(JOBS_TABLE, 'us-east-1')
+sqs = aws_clients.lazy_client('sqs', JOB_QUEUE_REGION)
+
+class JobNotClaimedError(Exception):
+    pass
+
+class DynamoJobStore:
+    """
+    Job records in DynamoDB; state changes are conditional updates
+    """
+    def put(self, item):
+        jobs_table.put_item(Item=item, ConditionExpression='attribute_not_exists(job_id)')
+
+    def get(self, job_id):
+        return jobs_table.get_item(Key={'job_id': job_id}, ConsistentRead=True).get('Item')
+
+    def claim(self, job_id, now):
+        try:
+            response = jobs_table.update_item(
+                Key={'job_id': job_id},
+                UpdateExpression='SET #status = :running, stage = :stage, started_at = :now, updated_at = :now, '
+                                 'lease_until = :lease_until ADD attempts :one',
+                ConditionExpression='#status = :queued OR (#status = :running AND lease_until < :now)',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':running': RUNNING, ':queued': QUEUED, ':stage': 'running', ':now': now,
+                    ':lease_until': now + JOB_LEASE_SECONDS, ':one': 1
+                },
+                ReturnValues='ALL_NEW'
+            )
+            return response['Attributes']
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return None
+            raise
+
+    def update(self, job_id, attributes):
+        names = {f"#a{index}": name for index, name in enumerate(attributes)}
+        values = {f":v{index}": value for index, value in enumerate(attributes.values())}
+        jobs_table.update_item(
+            Key={'job_id': job_id},
+            UpdateExpression='SET ' + ', '.join(f"#a{index} = :v{index}" for index in range(len(attributes))),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+
+class MemoryJobStore:
+    """
+    In-process stand-in for the jobs table
+    """
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def put(self, item):
+        with self.lock:
+            if item['job_id'] in self.items:
+                raise ValueError(f"Job {item['job_id']} already exists")
+            self.items[item['job_id']] = dict(item)
+
+    def get(self, job_id):
+        with self.lock:
+            item = self.items.get(job_id)
+            return dict(item) if item else None
+
+    def claim(self, job_id, now):
+        with self.lock:
+            item = self.items.get(job_id)
+            if not item:
+                return None
+            if not (item['status'] == QUEUED or (item['status'] == RUNNING and item.get('lease_until', 0) < now)):
+                return None
+            item.update({'status': RUNNING, 'stage': 'running', 'started_at': now, 'updated_at': now,
+                         'lease_until': now + JOB_LEASE_SECONDS, 'attempts': item.get('attempts', 0) + 1})
+            return dict(item)
+
+    def update(self, job_id, attributes):
+        with self.lock:
+            self.items[job_id].update(attributes)
+
+class SqsJobQueue:
+    """
+    Sends job ids to the SQS queue consumed by job_worker_lambda
+    """
+    def send(self, job_id, delay_seconds=0):
+        sqs.send_message(QueueUrl=JOB_QUEUE_URL, MessageBody=json.dumps({'job_id': job_id}),
+                         DelaySeconds=delay_seconds)
+
+class LocalContext:
+    """
+    Lambda context for jobs run by the in-process worker, so retry and log-drain
+    deadlines behave as they do in the job-worker lambda
+    """
+    def __init__(self, timeout_seconds, request_id=None):
+        self.deadline = time.time() + timeout_seconds
+        self.aws_request_id = request_id
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self.deadline - time.time()) * 1000), 0)
+
+class MemoryJobQueue:
+    """
+    In-process stand-in for SQS: a queue drained by a daemon thread that hands each
+    message to the worker as a one-record SQS event
+    """
+    def __init__(self):
+        self.messages = queue.Queue()
+        self.worker = None
+        self.lock = threading.Lock()
+
+    def send(self, job_id, delay_seconds=0):
+        self.messages.put({'job_id': job_id})
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, name='job-worker', daemon=True)
+                self.worker.start()
+
+    def run(self):
+        # Imported here: the worker imports every module handler
+        import job_worker_lambda
+        while True:
+            message = self.messages.get()
+            try:
+                job_worker_lambda.lambda_handler({'Records': [{'messageId': message['job_id'], 'body': json.dumps(message)}]},
+                                                 LocalContext(JOB_LOCAL_TIMEOUT_SECONDS, message['job_id']))
+            except Exception as e:
+                print(f"Local job worker error: {str(e)}")
+            finally:
+                self.messages.task_done()
+
+    def wait(self):
+        """
+        Blocks until every queued job has been processed (tests)
+        """
+        self.messages.join()
+
+_store = None
+_queue = None
+
+def get_store():
+    """
+    Returns the job store for JOB_BACKEND
+    """
+    global _store
+    if _store is None:
+        _store = MemoryJobStore() if JOB_BACKEND == 'memory' else DynamoJobStore()
+    return _store
+
+def get_queue():
+    """
+    Returns the job queue for JOB_BACKEND
+    """
+    global _queue
+    if _queue is None:
+        _queue = MemoryJobQueue() if JOB_BACKEND == 'memory' else SqsJobQueue()
+    return _queue
+
+def submit_job(module, payload):
+    """
+    Writes a QUEUED job record and queues it. Returns the job record (without payloads).
+    """
+    if module not in MODULES:
+        raise ValueError(f"Unknown module: {module}")
+
+    job_id = str(uuid.uuid4())
+    now = int(time.time())
+    item = {
+        'job_id': job_id,
+        'module': module,
+        'status': QUEUED,
+        'stage': 'queued',
+        'attempts': 0,
+        'created_at': now,
+        'updated_at': now,
+        'expires_at': now + JOB_TTL_SECONDS
+    }
+    item.update(session_payloads.encode_payload(job_id, 'payload', payload))
+    get_store().put(item)
+    get_queue().send(job_id)
+    print(f"Job {job_id} queued for {module}")
+    return {key: item[key] for key in ('job_id', 'module', 'status', 'stage', 'created_at')}
+
+def get_job(job_id, include_result=True):
+    """
+    Returns the job status (and, once finished, the module's response), or None
+    """
+    item = get_store().get(job_id)
+    if not item:
+        return None
+
+    job = {
+        'job_id': item['job_id'],
+        'module': item['module'],
+        'status': item['status'],
+        'stage': item.get('stage'),
+        'attempts': int(item.get('attempts', 0)),
+        'created_at': int(item['created_at']),
+        'updated_at': int(item.get('updated_at', item['created_at']))
+    }
+    for field in ('started_at', 'finished_at', 'status_code'):
+        if field in item:
+            job[field] = int(item[field])
+    if item.get('error'):
+        job['error'] = item['error']
+    end = job.get('finished_at', int(time.time()))
+    job['elapsed_seconds'] = end - job['created_at']
+
+    if include_result and item['status'] in (SUCCEEDED, FAILED):
+        job['result'] = session_payloads.load_payload(item, 'result')
+    return job
+
+def claim_job(job_id):
+    """
+    Moves a job to RUNNING for this worker and returns (module, payload, attempts).
+    Raises JobNotClaimedError when the job is unknown, finished or running elsewhere.
+    """
+    item = get_store().claim(job_id, int(time.time()))
+    if not item:
+        raise JobNotClaimedError(f"Job {job_id} is not claimable")
+    return item['module'], session_payloads.load_payload(item, 'payload'), int(item['attempts'])
+
+def finish_job(job_id, status, status_code, result, error=None):
+    """
+    Stores the module's response and the final status
+    """
+    now = int(time.time())
+    attributes = {
+        'status': status,
+        'stage': 'done',
+        'status_code': status_code,
+        'finished_at': now,
+        'updated_at': now
+    }
+    # Clears the error of a failed earlier attempt on success
+    attributes['error'] = error
+    attributes.update(session_payloads.encode_payload(job_id, 'result', result))
+    get_store().update(job_id, attributes)
+
+def requeue_job(job_id, attempts, error):
+    """
+    Puts a job whose attempt failed with a retryable error back to QUEUED and queues
+    it again, delayed 30 s per attempt so far
+    """
+    get_store().update(job_id, {'status': QUEUED, 'stage': 'retrying', 'error': error,
+                                'lease_until': 0, 'updated_at': int(time.time())})
+    get_queue().send(job_id, delay_seconds=min(30 * attempts, 900))
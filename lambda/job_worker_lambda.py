@@ -0,0 +1,76 @@
+import importlib
+import json
+
+import aws_clients
+import job_queue
+
+# Module handler that runs each job: the existing synchronous lambda_handler
+HANDLER_MODULES = {
+    'alert-triage': 'alert_triage_lambda',
+    'patch-assessment': 'patch_assessment_lambda',
+    'remediation-script': 'remediation_script_lambda'
+}
+
+def get_handler(module):
+    """
+    Imports a module's lambda_handler on first use
+    """
+    return importlib.import_module(HANDLER_MODULES[module]).lambda_handler
+
+def run_job(job_id, context):
+    """
+    Claims one job, runs the module's lambda_handler on its payload and stores the response.
+    5xx responses are retried up to JOB_MAX_ATTEMPTS; 4xx responses fail the job at once.
+    """
+    try:
+        module, payload, attempts = job_queue.claim_job(job_id)
+    except job_queue.JobNotClaimedError as e:
+        # Duplicate delivery or a job another worker is running
+        print(str(e))
+        return
+
+    print(f"Running job {job_id} ({module}), attempt {attempts}")
+    payload = dict(payload or {})
+    # Async results are always stored as one JSON document
+    payload.pop('response_mode', None)
+    event = {
+        'body': json.dumps(payload),
+        'headers': {'Accept': 'application/json'}
+    }
+
+    try:
+        response = get_handler(module)(event, context)
+        status_code = int(response.get('statusCode', 500))
+        result = json.loads(response.get('body') or '{}')
+    except Exception as e:
+        status_code = 500
+        result = {'error': str(e)}
+
+    if status_code < 300:
+        job_queue.finish_job(job_id, job_queue.SUCCEEDED, status_code, result)
+        print(f"Job {job_id} succeeded")
+        return
+
+    error = str(result.get('error', f"HTTP {status_code}")) if isinstance(result, dict) else f"HTTP {status_code}"
+    if status_code >= 500 and attempts < job_queue.JOB_MAX_ATTEMPTS:
+        print(f"Job {job_id} attempt {attempts} failed, retrying: {error}")
+        job_queue.requeue_job(job_id, attempts, error)
+        return
+
+    job_queue.finish_job(job_id, job_queue.FAILED, status_code, result, error)
+    print(f"Job {job_id} failed: {error}")
+
+@aws_clients.measure_init('job-worker')
+def lambda_handler(event, context):
+    """
+    Job Worker Lambda - Processes queued jobs from SQS (or the in-process queue).
+    Returns the SQS partial batch response: records that could not be processed are retried.
+    """
+    failures = []
+    for record in event.get('Records', []):
+        try:
+            run_job(json.loads(record['body'])['job_id'], context)
+        except Exception as e:
+            print(f"Job worker error for message {record.get('messageId')}: {str(e)}")
+            failures.append({'itemIdentifier': record.get('messageId')})
+    return {'batchItemFailures': failures}
@@ -0,0 +1,280 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from botocore.exceptions import ClientError
+
+import bedrock_cache
+import model_output
+import retry_policy
+
+# Model gateway used by the AI lambdas: response cache plus single-flight coalescing.
+# Identical requests (same cache key) that are in flight at the same time share one
+# Bedrock call:
+# - within a container, followers wait on the leader's in-process Future
+# - across containers, the leader holds a short-lived lease item in the Bedrock cache
+#   table and the others poll for the result record the leader writes to that table
+# The owner renews its lease every MODEL_LEASE_SECONDS / 3 while the model call runs, so a
+# generation slower than the lease (BEDROCK_READ_TIMEOUT, retries, continuations) keeps it;
+# a lease whose holder died expires after MODEL_LEASE_SECONDS and is taken over.
+LEASE_SECONDS = int(os.environ.get('MODEL_LEASE_SECONDS', '90'))
+LEASE_RENEW_SECONDS = max(1, LEASE_SECONDS // 3)
+POLL_INTERVAL_MS = int(os.environ.get('MODEL_POLL_INTERVAL_MS', '250'))
+MAX_POLL_INTERVAL_MS = 2000
+LEASE_PREFIX = 'lease#'
+
+class WaitTimeoutError(Exception):
+    pass
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+class Flight:
+    """
+    One caller's view of an in-flight model request.
+    owner is True when this caller must call the model and publish the result.
+    """
+    def __init__(self, cache_key, future, leader, fresh_after=None):
+        self.cache_key = cache_key
+        self.future = future
+        self.leader = leader
+        self.owner = False
+        self.lease_id = None
+        self.fresh_after = fresh_after
+        self.renewal = None
+
+def lease_key(cache_key):
+    """
+    Returns the cache table key of the lease item for a cache key
+    """
+    return LEASE_PREFIX + cache_key
+
+def acquire_lease(cache_key):
+    """
+    Tries to take the cross-container lease for a cache key with a conditional put.
+    Returns the lease id when acquired, otherwise None.
+    """
+    lease_id = str(uuid.uuid4())
+    now = int(time.time())
+    try:
+        bedrock_cache.cache_table.put_item(
+            Item={
+                'cache_key': lease_key(cache_key),
+                'lease_id': lease_id,
+                'lease_until': now + LEASE_SECONDS,
+                'expires_at': now + LEASE_SECONDS + 300
+            },
+            ConditionExpression='attribute_not_exists(cache_key) OR lease_until < :now',
+            ExpressionAttributeValues={':now': now}
+        )
+        return lease_id
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        # Coalescing is an optimization: without the lease table, call the model directly
+        print(f"Lease error for {cache_key[:16]}: {str(e)}")
+        return lease_id
+
+def renew_lease(cache_key, lease_id):
+    """
+    Extends the lease if this caller still holds it.
+    Returns False when the lease was lost or cannot be renewed.
+    """
+    now = int(time.time())
+    try:
+        bedrock_cache.cache_table.update_item(
+            Key={'cache_key': lease_key(cache_key)},
+            UpdateExpression='SET lease_until = :lease_until, expires_at = :expires_at',
+            ConditionExpression='lease_id = :lease_id',
+            ExpressionAttributeValues={
+                ':lease_id': lease_id,
+                ':lease_until': now + LEASE_SECONDS,
+                ':expires_at': now + LEASE_SECONDS + 300
+            }
+        )
+        return True
+    except Exception as e:
+        print(f"Lease renewal error for {cache_key[:16]}: {str(e)}")
+        return False
+
+def start_renewal(flight):
+    """
+    Renews the owner's lease in a background thread until stop_renewal is called
+    """
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(LEASE_RENEW_SECONDS):
+            if not renew_lease(flight.cache_key, flight.lease_id):
+                return
+
+    flight.renewal = stopped
+    threading.Thread(target=run, daemon=True).start()
+
+def stop_renewal(flight):
+    """
+    Stops renewing the flight's lease
+    """
+    if flight.renewal is not None:
+        flight.renewal.set()
+        flight.renewal = None
+
+def release_lease(cache_key, lease_id):
+    """
+    Deletes the lease if this caller still holds it (best effort)
+    """
+    try:
+        bedrock_cache.cache_table.delete_item(
+            Key={'cache_key': lease_key(cache_key)},
+            ConditionExpression='lease_id = :lease_id',
+            ExpressionAttributeValues={':lease_id': lease_id}
+        )
+    except Exception as e:
+        print(f"Lease release error for {cache_key[:16]}: {str(e)}")
+
+def is_lease_held(cache_key):
+    """
+    True while another container holds an unexpired lease for the cache key
+    """
+    try:
+        response = bedrock_cache.cache_table.get_item(Key={'cache_key': lease_key(cache_key)}, ConsistentRead=True)
+    except Exception as e:
+        print(f"Lease read error for {cache_key[:16]}: {str(e)}")
+        return False
+    item = response.get('Item')
+    return bool(item) and int(item.get('lease_until', 0)) >= time.time()
+
+def begin(cache_key, fresh_after=None):
+    """
+    Joins or starts the flight for a cache key.
+    The first caller in the container becomes the leader and tries to take the lease;
+    fresh_after (a unix time) makes waiters ignore results stored before it (cache bypass).
+    """
+    with _inflight_lock:
+        future = _inflight.get(cache_key)
+        if future is not None:
+            return Flight(cache_key, future, leader=False, fresh_after=fresh_after)
+        future = Future()
+        _inflight[cache_key] = future
+
+    flight = Flight(cache_key, future, leader=True, fresh_after=fresh_after)
+    flight.lease_id = acquire_lease(cache_key)
+    flight.owner = flight.lease_id is not None
+    return flight
+
+def wait(flight):
+    """
+    Waits for the owner of a flight to publish its result.
+    Returns (response_body, tier) - tier 'in-process' or 'dynamodb' - or None when
+    this caller has taken over as owner because the previous lease holder went away.
+    """
+    if not flight.leader:
+        remaining = retry_policy.remaining_seconds()
+        try:
+            return flight.future.result(timeout=max(remaining, 0) if remaining is not None else None), 'in-process'
+        except FutureTimeoutError:
+            raise WaitTimeoutError("Timed out waiting for an identical in-flight model request")
+
+    interval = POLL_INTERVAL_MS / 1000.0
+    while True:
+        cached = bedrock_cache.dynamodb_get(flight.cache_key, min_created_at=flight.fresh_after)
+        if cached:
+            response_body, expires_at = cached
+            bedrock_cache.memory_put(flight.cache_key, response_body, expires_at)
+            complete(flight, response_body)
+            return response_body, 'dynamodb'
+
+        if not is_lease_held(flight.cache_key):
+            flight.lease_id = acquire_lease(flight.cache_key)
+            if flight.lease_id:
+                flight.owner = True
+                return None
+
+        remaining = retry_policy.remaining_seconds()
+        if remaining is not None and remaining <= interval:
+            error = WaitTimeoutError("Timed out waiting for an identical in-flight model request")
+            fail(flight, error)
+            raise error
+
+        time.sleep(interval)
+        interval = min(interval * 2, MAX_POLL_INTERVAL_MS / 1000.0)
+
+def complete(flight, response_body):
+    """
+    Publishes the result to in-process waiters and releases the lease.
+    The owner stores the result record (the cache entry) before calling this.
+    """
+    with _inflight_lock:
+        if _inflight.get(flight.cache_key) is flight.future:
+            del _inflight[flight.cache_key]
+    if not flight.future.done():
+        flight.future.set_result(response_body)
+    stop_renewal(flight)
+    if flight.owner:
+        release_lease(flight.cache_key, flight.lease_id)
+
+def fail(flight, error):
+    """
+    Propagates the owner's error to in-process waiters and releases the lease
+    so another container can retry
+    """
+    with _inflight_lock:
+        if _inflight.get(flight.cache_key) is flight.future:
+            del _inflight[flight.cache_key]
+    if not flight.future.done():
+        flight.future.set_exception(error)
+    stop_renewal(flight)
+    if flight.owner:
+        release_lease(flight.cache_key, flight.lease_id)
+
+def invoke_model(bedrock, model_id, request_params, module, bypass=False, validate=None):
+    """
+    Calls bedrock.invoke_model through the two-tier cache, coalescing identical
+    in-flight requests. Returns (response_body, cache_info); cache_info status is
+    'hit', 'miss', 'bypass' or 'coalesced'.
+
+    bypass skips the cache lookup but still stores the fresh response.
+    validate, if given, is called with the response body before it is cached,
+    so unparseable model output is never cached.
+    """
+    cache_key = bedrock_cache.make_cache_key(model_id, request_params)
+    started = time.time()
+
+    if not bypass:
+        cached = bedrock_cache.cache_lookup(cache_key)
+        if cached:
+            response_body, tier = cached
+            return response_body, bedrock_cache.cache_result('hit', tier, cache_key, started)
+
+    flight = begin(cache_key, fresh_after=int(started) if bypass else None)
+    if not flight.owner:
+        coalesced = wait(flight)
+        if coalesced:
+            response_body, tier = coalesced
+            print(f"Coalesced {module} request with an in-flight call ({tier})")
+            return response_body, bedrock_cache.cache_result('coalesced', tier, cache_key, started)
+
+    start_renewal(flight)
+    try:
+        response = retry_policy.call(
+            'bedrock', 'invoke_model', bedrock.invoke_model,
+            modelId=model_id,
+            body=json.dumps(request_params)
+        )
+        response_body = json.loads(response['body'].read())
+        # Output cut off at max_tokens is completed with continuation calls, not regenerated
+        response_body = model_output.complete_response(bedrock, model_id, request_params, response_body, module)
+
+        if validate:
+            validate(response_body)
+
+        bedrock_cache.cache_store(cache_key, response_body, module, model_id)
+    except Exception as e:
+        fail(flight, e)
+        raise
+
+    complete(flight, response_body)
+    return response_body, bedrock_cache.cache_result('bypass' if bypass else 'miss', None, cache_key, started)
@@ -0,0 +1,219 @@
+import json
+import os
+import re
+
+import retry_policy
+
+# Shared extraction of the JSON result from model output.
+# Handles Qwen3 <think> reasoning blocks, markdown fences and prose around the JSON by
+# locating the outermost JSON object, validates it against the module's expected fields,
+# and completes output that was cut off at max_tokens by asking the model for just the
+# continuation instead of regenerating the whole answer.
+MAX_CONTINUATIONS = int(os.environ.get('MODEL_MAX_CONTINUATIONS', '2'))
+
+CONTINUATION_PROMPT = ("Your previous response was cut off. Continue it exactly from the last character, "
+                       "without repeating anything and without any other text.")
+
+# Expected result shape per module: required top-level fields with their types, and
+# the fields every entry of a list field must carry
+SCHEMAS = {
+    'alert-triage': {
+        'required': {'prioritized_alerts': list},
+        'item_fields': {'prioritized_alerts': ['alert_id']}
+    },
+    'patch-assessment': {
+        'required': {'patch_risks': list},
+        'item_fields': {'patch_risks': ['patch_id']}
+    },
+    'remediation-script': {
+        'required': {'script': str, 'rollback_script': str},
+        'item_fields': {}
+    }
+}
+
+THINK_BLOCK = re.compile(r'<think>.*?</think>', re.DOTALL)
+
+class ModelOutputError(ValueError):
+    pass
+
+class TruncatedOutputError(ModelOutputError):
+    def __init__(self, message, partial_text):
+        super().__init__(message)
+        self.partial_text = partial_text
+
+def response_text(response_body):
+    """
+    Returns the generated text from a Bedrock response body (Qwen, Titan or Anthropic format)
+    """
+    if 'choices' in response_body:
+        return response_body['choices'][0]['message']['content'] or ''
+    if 'output' in response_body:
+        return response_body['output']['text']
+    if 'content' in response_body:
+        return response_body['content'][0]['text']
+    return str(response_body)
+
+def strip_reasoning(text):
+    """
+    Removes <think> blocks; an unterminated block (output cut off while reasoning) is dropped to the end
+    """
+    text = THINK_BLOCK.sub('', text)
+    unterminated = text.find('<think>')
+    if unterminated != -1:
+        text = text[:unterminated]
+    return text
+
+def balanced_end(text, start):
+    """
+    Returns the index just past the object opened at text[start], or None if it never closes
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth == 0:
+                return index + 1
+    return None
+
+def find_json_object(text):
+    """
+    Locates the outermost JSON object in text, skipping braces in surrounding prose.
+    Returns (start, end, parsed) for a complete object, (start, None, None) when the
+    object never closes (truncated output), or None when there is no object.
+    """
+    start = text.find('{')
+    while start != -1:
+        end = balanced_end(text, start)
+        if end is None:
+            return start, None, None
+        try:
+            return start, end, json.loads(text[start:end])
+        except ValueError:
+            start = text.find('{', start + 1)
+    return None
+
+def validate_schema(result, module):
+    """
+    Checks a parsed result against the module's expected fields
+    """
+    schema = SCHEMAS.get(module)
+    if not schema:
+        return result
+    if not isinstance(result, dict):
+        raise ModelOutputError(f"{module}: model output is not a JSON object")
+
+    problems = []
+    for field, field_type in schema['required'].items():
+        if not isinstance(result.get(field), field_type):
+            problems.append(f"'{field}' missing or not a {field_type.__name__}")
+    for field, item_fields in schema['item_fields'].items():
+        for position, entry in enumerate(result.get(field) or []):
+            missing = [name for name in item_fields if not isinstance(entry, dict) or name not in entry]
+            if missing:
+                problems.append(f"{field}[{position}] missing {', '.join(missing)}")
+
+    if problems:
+        raise ModelOutputError(f"{module}: invalid model output ({'; '.join(problems)})")
+    return result
+
+def extract_text_json(text, module=None):
+    """
+    Extracts and validates the JSON object from generated text.
+    Raises TruncatedOutputError (with the partial JSON) when the object never closes.
+    """
+    text = strip_reasoning(text)
+    location = find_json_object(text)
+    if location is None:
+        raise ModelOutputError(f"{module or 'model'}: no valid JSON object in model output")
+
+    start, end, result = location
+    if end is None:
+        raise TruncatedOutputError(f"{module or 'model'}: model output was truncated", text[start:])
+    return validate_schema(result, module)
+
+def extract_json(response_body, module=None):
+    """
+    Extracts and validates the JSON result from a Bedrock response body
+    """
+    return extract_text_json(response_text(response_body), module)
+
+def clean_continuation(text):
+    """
+    Strips reasoning blocks and stray markdown fences from a continuation
+    """
+    text = strip_reasoning(text)
+    text = re.sub(r'^\s*```(?:json)?\s*', '', text)
+    return re.sub(r'\s*```\s*$', '', text)
+
+def request_continuation(bedrock, model_id, request_params, partial_text):
+    """
+    Asks the model to continue a truncated answer.
+    Returns (continuation_text, usage).
+    """
+    params = dict(request_params)
+    params['messages'] = list(request_params.get('messages', [])) + [
+        {'role': 'assistant', 'content': partial_text},
+        {'role': 'user', 'content': CONTINUATION_PROMPT}
+    ]
+    response = retry_policy.call(
+        'bedrock', 'invoke_model', bedrock.invoke_model,
+        modelId=model_id,
+        body=json.dumps(params)
+    )
+    response_body = json.loads(response['body'].read())
+    return clean_continuation(response_text(response_body)), response_body.get('usage', {})
+
+def add_usage(usage, extra):
+    """
+    Sums numeric token counters of two usage dicts
+    """
+    total = dict(usage or {})
+    for key, value in (extra or {}).items():
+        if isinstance(value, (int, float)):
+            total[key] = total.get(key, 0) + value
+    return total
+
+def complete_response(bedrock, model_id, request_params, response_body, module=None):
+    """
+    Returns the response body with truncated JSON completed through up to
+    MODEL_MAX_CONTINUATIONS continuation calls. The returned body holds only the
+    JSON text, with the usage of all calls summed and a 'continuations' count.
+    Output that is complete is returned unchanged.
+    """
+    try:
+        extract_json(response_body, module)
+        return response_body
+    except TruncatedOutputError as e:
+        partial_text = e.partial_text
+
+    usage = response_body.get('usage', {})
+    for attempt in range(1, MAX_CONTINUATIONS + 1):
+        print(f"{module or 'model'}: output truncated, requesting continuation {attempt}/{MAX_CONTINUATIONS}")
+        continuation, continuation_usage = request_continuation(bedrock, model_id, request_params, partial_text)
+        usage = add_usage(usage, continuation_usage)
+        partial_text += continuation
+        try:
+            extract_text_json(partial_text, module)
+        except TruncatedOutputError:
+            continue
+        return {
+            'choices': [{'message': {'content': partial_text}}],
+            'usage': usage,
+            'continuations': attempt
+        }
+
+    raise ModelOutputError(f"{module or 'model'}: model output still truncated after {MAX_CONTINUATIONS} continuations")
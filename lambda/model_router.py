@@ -0,0 +1,128 @@
+import json
+import os
+import time
+
+import prompt_builder
+
+# Size-aware model routing for the AI lambdas.
+# Small requests go to the faster model, large or production-critical ones to the
+# larger model; max_tokens is sized from the number of input items instead of a fixed
+# 2000. Every decision is logged with the call latency so thresholds can be tuned.
+#
+# Configuration (global, then per module with the module suffix, e.g. _ALERT_TRIAGE):
+#   MODEL_SMALL_ID / MODEL_SMALL_ID_<MODULE>          fast model
+#   MODEL_LARGE_ID / MODEL_LARGE_ID_<MODULE>          large model
+#   MODEL_ROUTE_THRESHOLD_<MODULE>                    input tokens above which the large model is used
+#   MODEL_TEMPERATURE / MODEL_TEMPERATURE_<MODULE>    sampling temperature (0 = deterministic)
+SMALL_MODEL_ID = 'qwen.qwen3-32b-v1:0'
+LARGE_MODEL_ID = 'qwen.qwen3-235b-a22b-2507-v1:0'
+
+METRICS_NAMESPACE = 'MSPAgents'
+
+# Per-module defaults: input-token threshold for the large model and the max_tokens
+# sizing (base + per_item for every input item, capped by the module's output budget)
+DEFAULT_ROUTES = {
+    'alert-triage': {'threshold': 1500, 'base_tokens': 300, 'tokens_per_item': 150},
+    'patch-assessment': {'threshold': 1500, 'base_tokens': 300, 'tokens_per_item': 150},
+    'remediation-script': {'threshold': 1000, 'base_tokens': 2000, 'tokens_per_item': 0}
+}
+
+MIN_MAX_TOKENS = 256
+
+def module_setting(name, module, default):
+    """
+    Reads NAME_<MODULE>, then NAME, then the default
+    """
+    suffix = module.upper().replace('-', '_')
+    return os.environ.get(f"{name}_{suffix}", os.environ.get(name, default))
+
+def route(module, input_tokens, items=1, critical=False):
+    """
+    Picks the model, max_tokens and temperature for one model call.
+    Returns the routing decision (also used as the request's routing report).
+    """
+    defaults = DEFAULT_ROUTES.get(module, DEFAULT_ROUTES['alert-triage'])
+    threshold = int(module_setting('MODEL_ROUTE_THRESHOLD', module, defaults['threshold']))
+
+    if critical:
+        tier, reason = 'large', 'critical request'
+    elif input_tokens > threshold:
+        tier, reason = 'large', f"input ~{input_tokens} tokens > {threshold}"
+    else:
+        tier, reason = 'small', f"input ~{input_tokens} tokens <= {threshold}"
+
+    model_id = module_setting('MODEL_SMALL_ID' if tier == 'small' else 'MODEL_LARGE_ID', module,
+                              SMALL_MODEL_ID if tier == 'small' else LARGE_MODEL_ID)
+    budget = prompt_builder.get_budget(module, 'output')
+    max_tokens = min(budget, max(MIN_MAX_TOKENS, defaults['base_tokens'] + defaults['tokens_per_item'] * items))
+
+    return {
+        'module': module,
+        'model_id': model_id,
+        'tier': tier,
+        'reason': reason,
+        'max_tokens': max_tokens,
+        'temperature': float(module_setting('MODEL_TEMPERATURE', module, '0')),
+        'input_tokens': input_tokens,
+        'items': items
+    }
+
+def configured_models(module):
+    """
+    Returns the model ids a module can be routed to (used to version cached results)
+    """
+    return sorted({module_setting('MODEL_SMALL_ID', module, SMALL_MODEL_ID),
+                   module_setting('MODEL_LARGE_ID', module, LARGE_MODEL_ID)})
+
+def request_params(decision, prompt):
+    """
+    Builds the Bedrock request body for a routing decision
+    """
+    return {
+        'max_tokens': decision['max_tokens'],
+        'temperature': decision['temperature'],
+        'messages': [{
+            'role': 'user',
+            'content': prompt
+        }]
+    }
+
+def record(decision, started, cache_info=None, usage=None):
+    """
+    Adds the call latency to the decision and logs it, with a CloudWatch
+    embedded-format ModelLatency metric per module and tier
+    """
+    decision = dict(decision)
+    decision['latency_ms'] = int((time.time() - started) * 1000)
+    decision['cache'] = (cache_info or {}).get('status')
+    decision['output_tokens'] = (usage or {}).get('output_tokens', 0)
+
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Module', 'Tier']],
+                'Metrics': [{'Name': 'ModelLatency', 'Unit': 'Milliseconds'}]
+            }]
+        },
+        'Module': decision['module'],
+        'Tier': decision['tier'],
+        'ModelLatency': decision['latency_ms'],
+        'routing': decision
+    }))
+    return decision
+
+def merge_decisions(decisions):
+    """
+    Summarizes the routing of several model calls (e.g. triage chunks)
+    """
+    models = {}
+    for decision in decisions:
+        models[decision['model_id']] = models.get(decision['model_id'], 0) + 1
+    return {
+        'calls': len(decisions),
+        'models': models,
+        'max_latency_ms': max([decision['latency_ms'] for decision in decisions] or [0]),
+        'decisions': decisions
+    }
@@ -1,10 +1,32 @@
 import json
-import boto3
-from boto3.dynamodb.conditions import Key
+import base64
+import os
+from boto3.dynamodb.conditions import Attr, Key
 from decimal import Decimal
+import time
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-table = dynamodb.Table('msp-agent-sessions')
+import aws_clients
+import session_metrics
+import session_payloads
+
+table = aws_clients.lazy_table('msp-agent-sessions', 'us-east-1')
+
+# GSI on msp-agent-sessions: partition key module, sort key timestamp
+SESSIONS_INDEX = os.environ.get('SESSIONS_INDEX', 'module-timestamp-index')
+DEFAULT_SESSION_LIMIT = 10
+MAX_SESSION_LIMIT = 100
+
+SESSION_PROJECTION = '#session_id, #timestamp, #module, #status, #processing_time'
+SESSION_ATTRIBUTE_NAMES = {
+    '#session_id': 'session_id',
+    '#timestamp': 'timestamp',
+    '#module': 'module',
+    '#status': 'status',
+    '#processing_time': 'processing_time'
+}
+
+class InvalidQueryError(Exception):
+    pass
 
 class DecimalEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -12,51 +34,255 @@ class DecimalEncoder(json.JSONEncoder):
             return int(obj)
         return super(DecimalEncoder, self).default(obj)
 
+def sum_buckets(counters, period, buckets):
+    """
+    Sums the per-module counters of each time bucket
+    """
+    entries = []
+    for bucket in buckets:
+        entry = {'bucket': bucket, 'total': 0, 'success': 0, 'error': 0}
+        for module in session_metrics.MODULES:
+            counter = counters.get(session_metrics.metric_key(module, period, bucket), {})
+            for field in ('total', 'success', 'error'):
+                entry[field] += int(counter.get(field, 0))
+        entries.append(entry)
+    return entries
+
+def encode_cursor(positions):
+    """
+    Encodes per-module query positions as an opaque, URL-safe cursor
+    """
+    if not positions:
+        return None
+    raw = json.dumps(positions, cls=DecimalEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor produced by encode_cursor into {module: exclusive_start_key}
+    """
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError):
+        raise InvalidQueryError('Invalid cursor')
+    if not isinstance(positions, dict):
+        raise InvalidQueryError('Invalid cursor')
+    return positions
+
+def parse_session_query(params):
+    """
+    Parses the recent-sessions query string: module, status, since, until, limit, cursor
+    """
+    try:
+        since = int(params['since']) if params.get('since') else 0
+        until = int(params['until']) if params.get('until') else int(time.time()) + 60
+        limit = int(params.get('limit') or DEFAULT_SESSION_LIMIT)
+    except ValueError:
+        raise InvalidQueryError('since, until and limit must be integers')
+    
+    module = params.get('module')
+    if module and module not in session_metrics.MODULES:
+        raise InvalidQueryError(f"Unknown module '{module}'")
+    
+    modules = [module] if module else session_metrics.MODULES
+    if params.get('cursor'):
+        positions = decode_cursor(params['cursor'])
+        modules = [m for m in modules if m in positions]
+    else:
+        positions = {}
+    
+    return {
+        'modules': modules,
+        'positions': positions,
+        'status': params.get('status'),
+        'since': since,
+        'until': until,
+        'limit': max(1, min(limit, MAX_SESSION_LIMIT))
+    }
+
+def session_position(item):
+    """
+    Returns the index key of a session item, used as a module's query position
+    """
+    return {
+        'session_id': item['session_id'],
+        'module': item['module'],
+        'timestamp': item['timestamp']
+    }
+
+def session_order(item):
+    """
+    Sort key of the recent-sessions merge: newest first, ties broken by session id
+    """
+    return (int(item.get('timestamp', 0)), item.get('session_id', ''))
+
+class ModuleSessionReader:
+    """
+    Reads one module's sessions newest-first from the module+timestamp index, a few
+    items per query as the merge consumes them
+    """
+    def __init__(self, module, query, start_key):
+        self.module = module
+        self.query = query
+        # Key of the last item handed to the page, and where the next query starts
+        self.position = start_key or {}
+        self.last_key = start_key or None
+        self.buffer = []
+        self.exhausted = False
+
+    def done(self):
+        return self.exhausted and not self.buffer
+
+    def fetch(self, chunk):
+        kwargs = {
+            'IndexName': SESSIONS_INDEX,
+            'KeyConditionExpression': Key('module').eq(self.module) & Key('timestamp').between(self.query['since'], self.query['until']),
+            'ScanIndexForward': False,
+            'ProjectionExpression': SESSION_PROJECTION,
+            'ExpressionAttributeNames': SESSION_ATTRIBUTE_NAMES,
+            'Limit': chunk
+        }
+        if self.query['status']:
+            kwargs['FilterExpression'] = Attr('status').eq(self.query['status'])
+        if self.last_key:
+            kwargs['ExclusiveStartKey'] = self.last_key
+        response = table.query(**kwargs)
+        self.buffer.extend(response.get('Items', []))
+        self.last_key = response.get('LastEvaluatedKey')
+        self.exhausted = not self.last_key
+
+    def peek(self, chunk):
+        """
+        Returns the module's newest unread session, querying up to `chunk` more items
+        when none is buffered, or None when the module has no more sessions
+        """
+        while not self.buffer and not self.exhausted:
+            self.fetch(chunk)
+        return self.buffer[0] if self.buffer else None
+
+    def pop(self):
+        item = self.buffer.pop(0)
+        self.position = session_position(item)
+        return item
+
+def query_recent_sessions(query):
+    """
+    Returns the newest sessions across the requested modules and the cursor for the next page.
+    The modules are merged lazily by timestamp: each module is read in chunks of its share
+    of the items still needed, so a page reads about `limit` items rather than `limit` per module.
+    """
+    readers = [ModuleSessionReader(module, query, query['positions'].get(module)) for module in query['modules']]
+    
+    page = []
+    while len(page) < query['limit']:
+        active = [reader for reader in readers if not reader.done()]
+        if not active:
+            break
+        chunk = max(1, -(-(query['limit'] - len(page)) // len(active)))
+        newest = None
+        for reader in active:
+            item = reader.peek(chunk)
+            if item is not None and (newest is None or session_order(item) > session_order(newest.buffer[0])):
+                newest = reader
+        if newest is None:
+            break
+        page.append(newest.pop())
+    
+    # A module's next position is the key of the last item it contributed to this page;
+    # modules with nothing left are dropped from the cursor
+    next_positions = {reader.module: reader.position for reader in readers if not reader.done()}
+    
+    return page, encode_cursor(next_positions)
+
+def get_session(session_id, include_payloads=False):
+    """
+    Reads one session by id. Payload attributes are only projected, fetched and
+    decompressed when include_payloads is set.
+    """
+    attribute_names = dict(SESSION_ATTRIBUTE_NAMES)
+    projection = SESSION_PROJECTION
+    if include_payloads:
+        for field in ('request', 'response'):
+            for index, name in enumerate(session_payloads.payload_attribute_names(field)):
+                placeholder = f"#{field}{index}"
+                attribute_names[placeholder] = name
+                projection += f", {placeholder}"
+    
+    response = table.query(
+        KeyConditionExpression=Key('session_id').eq(session_id),
+        ProjectionExpression=projection,
+        ExpressionAttributeNames=attribute_names,
+        Limit=1
+    )
+    items = response.get('Items', [])
+    if not items:
+        return None
+    
+    item = items[0]
+    session = {
+        'session_id': item.get('session_id'),
+        'timestamp': int(item.get('timestamp', 0)),
+        'module': item.get('module'),
+        'status': item.get('status'),
+        'processing_time': int(item.get('processing_time', 0))
+    }
+    if include_payloads:
+        session['request'] = session_payloads.load_payload(item, 'request')
+        session['response'] = session_payloads.load_payload(item, 'response')
+    return session
+
+@aws_clients.measure_init('monitoring')
 def lambda_handler(event, context):
     """
     Monitoring Lambda - Returns metrics and session data from DynamoDB
     """
     try:
-        # Scan all sessions (limit to last 100 for performance)
-        response = table.scan(Limit=100)
-        items = response.get('Items', [])
+        params = event.get('queryStringParameters') or {}
         
-        # Calculate metrics
-        total_sessions = len(items)
-        success_count = sum(1 for item in items if item.get('status') == 'success')
-        error_count = sum(1 for item in items if item.get('status') == 'error')
+        # Single session lookup; payloads are decoded only on request
+        if params.get('session_id'):
+            session = get_session(params['session_id'], params.get('include') == 'payloads')
+            return {
+                'statusCode': 200 if session else 404,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'session': session} if session else {'error': 'Session not found'}, cls=DecimalEncoder)
+            }
+        
+        # Read pre-aggregated counters (fixed number of items, exact totals)
+        now = int(time.time())
+        counters = session_metrics.read_counters(session_metrics.get_counter_keys(now))
         
         # Group by module
         module_stats = {}
-        for item in items:
-            module = item.get('module', 'unknown')
-            if module not in module_stats:
-                module_stats[module] = {
-                    'total': 0,
-                    'success': 0,
-                    'error': 0,
-                    'avg_processing_time': 0,
-                    'total_processing_time': 0
-                }
-            
-            module_stats[module]['total'] += 1
-            if item.get('status') == 'success':
-                module_stats[module]['success'] += 1
-            else:
-                module_stats[module]['error'] += 1
-            
-            processing_time = int(item.get('processing_time', 0))
-            module_stats[module]['total_processing_time'] += processing_time
+        for module in session_metrics.MODULES:
+            counter = counters.get(session_metrics.metric_key(module), {})
+            total = int(counter.get('total', 0))
+            total_processing_time = int(counter.get('total_processing_time', 0))
+            module_stats[module] = {
+                'total': total,
+                'success': int(counter.get('success', 0)),
+                'error': int(counter.get('error', 0)),
+                'avg_processing_time': round(total_processing_time / total) if total > 0 else 0,
+                'total_processing_time': total_processing_time
+            }
         
-        # Calculate averages
-        for module in module_stats:
-            if module_stats[module]['total'] > 0:
-                module_stats[module]['avg_processing_time'] = round(
-                    module_stats[module]['total_processing_time'] / module_stats[module]['total']
-                )
+        # Calculate metrics
+        total_sessions = sum(stats['total'] for stats in module_stats.values())
+        success_count = sum(stats['success'] for stats in module_stats.values())
+        error_count = sum(stats['error'] for stats in module_stats.values())
         
-        # Get recent sessions (last 10)
-        recent_sessions = sorted(items, key=lambda x: int(x.get('timestamp', 0)), reverse=True)[:10]
+        # Activity per hour (last 24h) and per day (last 7d), summed across modules
+        activity = {
+            'hourly': sum_buckets(counters, 'hour', [session_metrics.hour_bucket(now - i * 3600) for i in range(24)]),
+            'daily': sum_buckets(counters, 'day', [session_metrics.day_bucket(now - i * 86400) for i in range(7)])
+        }
+        
+        # Recent sessions: indexed query per module, newest first
+        query = parse_session_query(params)
+        recent_sessions, next_cursor = query_recent_sessions(query)
         
         # Format recent sessions
         formatted_sessions = []
@@ -83,10 +309,22 @@ def lambda_handler(event, context):
                     'success_rate': round((success_count / total_sessions * 100) if total_sessions > 0 else 0, 2)
                 },
                 'module_stats': module_stats,
-                'recent_sessions': formatted_sessions
+                'activity': activity,
+                'recent_sessions': formatted_sessions,
+                'next_cursor': next_cursor
             }, cls=DecimalEncoder)
         }
         
+    except InvalidQueryError as e:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': str(e)})
+        }
+        
     except Exception as e:
         print(f"Error: {str(e)}")
         return {
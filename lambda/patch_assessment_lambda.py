@@ -1,16 +1,141 @@
 import json
-import boto3
+import os
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 
-bedrock = boto3.client('bedrock-runtime', region_name='us-east-1')
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-table = dynamodb.Table('msp-agent-sessions')
+import aws_clients
+import bedrock_cache
+import model_gateway
+import model_output
+import model_router
+import patch_cache
+import patch_scheduler
+import prompt_builder
+import retry_policy
+import session_logger
 
+bedrock = aws_clients.lazy_client('bedrock-runtime', 'us-east-1')
+
+# Risk scoring batches: the model scores at most PATCH_BATCH_SIZE patches per call
+PATCH_BATCH_SIZE = int(os.environ.get('PATCH_BATCH_SIZE', '12'))
+PATCH_MAX_WORKERS = int(os.environ.get('PATCH_MAX_WORKERS', '4'))
+
+# Bump when the risk prompt or its output format changes: invalidates the per-patch cache
+RISK_PROMPT_VERSION = 'risk-v1'
+
+def parse_model_response(response_body):
+    """
+    Extracts and validates the JSON result from a Bedrock response body
+    (reasoning blocks, fences and surrounding prose are ignored)
+    """
+    return model_output.extract_json(response_body, 'patch-assessment')
+
+def summarize_overflow_patches(patches):
+    """
+    Summarizes patches that did not fit the prompt budget: counts per vendor and their ids
+    """
+    vendors = {}
+    for patch in patches:
+        vendor = str(patch.get('vendor', 'unknown'))
+        vendors[vendor] = vendors.get(vendor, 0) + 1
+    return {
+        'omitted_patches': len(patches),
+        'by_vendor': vendors,
+        'patch_ids': [str(patch.get('id') or patch.get('patch_id')) for patch in patches[:50]]
+    }
+
+def score_patches(patches, environment, bypass=False):
+    """
+    Sends one batch of patches to Bedrock for risk scoring.
+    Returns the parsed scores, token usage, cache report, prompt report and routing decision.
+    """
+    env_context = "CRITICAL: This is a production environment. Exercise maximum caution." if environment == 'production' else "Standard procedures apply."
+    
+    patches_text, prompt_stats = prompt_builder.compact_items('patch-assessment', patches, summarize=summarize_overflow_patches)
+    # Production assessments and large patch sets go to the larger model
+    decision = model_router.route('patch-assessment', prompt_stats['input_tokens'], len(patches), environment == 'production')
+    
+    prompt = f"""You are an expert patch management specialist. Score the deployment risk of each patch for a {environment} environment.
+{env_context}
+
+Patches:
+{patches_text}
+
+Respond ONLY with valid JSON in this format:
+{{"patch_risks":[{{"patch_id":"<id>","risk_level":"Critical|High|Medium|Low","risk_score":<1-10>,"estimated_downtime_minutes":<number>,"requires_reboot":<true|false>,"depends_on":["<ids of patches above that must be installed first>"],"rollback_strategy":"<strategy>","testing_requirements":["<list>"]}}],"overall_recommendation":"<summary>"}}"""
+    prompt_stats = prompt_builder.finish_stats(prompt_stats, prompt, decision['max_tokens'])
+
+    # Call Bedrock with the routed model (through the model gateway: response cache + request coalescing)
+    started = time.time()
+    response_body, cache_info = model_gateway.invoke_model(
+        bedrock,
+        decision['model_id'],
+        model_router.request_params(decision, prompt),
+        module='patch-assessment',
+        bypass=bypass,
+        validate=parse_model_response
+    )
+    decision = model_router.record(decision, started, cache_info, response_body.get('usage', {}))
+    
+    scores = parse_model_response(response_body)
+    
+    return scores, response_body.get('usage', {}), cache_info, prompt_stats, decision
+
+def score_in_batches(patches, environment, batch_size=None, max_workers=None, bypass=False):
+    """
+    Scores patches in batches on a bounded thread pool.
+    Returns (risks by patch id, overall recommendation, usage, cache report, prompt report, routing).
+    """
+    if not patches:
+        return {}, '', {}, {'status': 'skipped', 'hits': 0, 'misses': 0}, {}, model_router.merge_decisions([])
+    
+    batch_size = max(1, batch_size or PATCH_BATCH_SIZE)
+    # Batches are also split to the prompt budget, so every patch gets a risk entry
+    batches = []
+    for i in range(0, len(patches), batch_size):
+        batches.extend(prompt_builder.split_to_budget('patch-assessment', patches[i:i + batch_size]))
+    workers = max(1, min(max_workers or PATCH_MAX_WORKERS, len(batches)))
+    print(f"Patch scoring: {len(patches)} patches in {len(batches)} batches on {workers} workers")
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # map() returns results in batch order regardless of completion order
+        results = list(executor.map(lambda batch: score_patches(batch, environment, bypass), batches))
+    
+    risks = {}
+    recommendations = []
+    usage = {}
+    cache_hits = 0
+    for scores, batch_usage, cache_info, _, _ in results:
+        if cache_info['status'] == 'hit':
+            cache_hits += 1
+        for entry in scores.get('patch_risks', []):
+            risks.setdefault(str(entry['patch_id']), entry)
+        if scores.get('overall_recommendation'):
+            recommendations.append(scores['overall_recommendation'])
+        usage = model_output.add_usage(usage, batch_usage)
+    
+    if len(recommendations) > 1:
+        recommendation = ' '.join(f"[Batch {index + 1}/{len(recommendations)}] {text}" for index, text in enumerate(recommendations))
+    else:
+        recommendation = recommendations[0] if recommendations else ''
+    
+    cache_info = {
+        'status': 'hit' if cache_hits == len(results) else ('partial' if cache_hits else 'miss'),
+        'hits': cache_hits,
+        'misses': len(results) - cache_hits
+    }
+    return (risks, recommendation, usage, cache_info,
+            prompt_builder.merge_stats([result[3] for result in results]),
+            model_router.merge_decisions([result[4] for result in results]))
+
+@aws_clients.measure_init('patch-assessment')
+@session_logger.flush_after
 def lambda_handler(event, context):
     """
     Patch Assessment Lambda - Evaluates patches and creates deployment plans using Claude 3.5
     """
+    retry_policy.start_invocation(context)
     try:
         # Parse input
         body = json.loads(event.get('body', '{}'))
@@ -24,87 +149,72 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'No patches provided'})
             }
         
-        # Construct prompt for Claude
-        env_context = "CRITICAL: This is a production environment. Exercise maximum caution." if environment == 'production' else "Standard procedures apply."
+        # Patches without an id are sent to the model under their positional id
+        request_patches = patches
+        patches = patch_scheduler.with_ids(patches)
         
-        prompt = f"""You are an expert patch management specialist. Analyze these patches for a {environment} environment.
-
-{env_context}
-
-Patches to assess:
-{json.dumps(patches, indent=2)}
-
-Provide your assessment in the following JSON format:
-{{
-  "environment": "{environment}",
-  "total_patches": <number>,
-  "deployment_plan": [
-    {{
-      "patch_id": "<id>",
-      "risk_level": "Critical|High|Medium|Low",
-      "deployment_priority": <1-10>,
-      "deployment_window": "<recommended time>",
-      "prerequisites": ["<list>"],
-      "rollback_strategy": "<strategy>",
-      "testing_requirements": ["<list>"],
-      "estimated_downtime": "<time>"
-    }}
-  ],
-  "dependencies": [
-    {{
-      "patch_id": "<id>",
-      "depends_on": ["<patch_ids>"]
-    }}
-  ],
-  "overall_recommendation": "<summary>"
-}}
-
-Respond ONLY with valid JSON, no additional text."""
-
-        # Call Bedrock with Qwen
-        response = bedrock.invoke_model(
-            modelId='qwen.qwen3-32b-v1:0',
-            body=json.dumps({
-                'max_tokens': 2000,
-                'temperature': 0.7,
-                'top_p': 0.9,
-                'messages': [{
-                    'role': 'user',
-                    'content': prompt
-                }]
-            })
-        )
+        # Dependency cycles are an input error: reject them before any model call
+        try:
+            patch_scheduler.build_graph(patches)
+        except patch_scheduler.DependencyCycleError as e:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': str(e), 'cycles': e.cycles})
+            }
         
-        # Parse response (Qwen format)
-        response_body = json.loads(response['body'].read())
-        ai_response = response_body['choices'][0]['message']['content']
+        # Patches assessed before (same id, content, environment and prompt/model version) come from the per-patch cache
+        bypass = bedrock_cache.is_bypass_requested(body)
+        version = patch_cache.assessment_version(RISK_PROMPT_VERSION)
+        if bypass:
+            cached_risks, new_patches = {}, patches
+        else:
+            cached_risks, new_patches = patch_cache.lookup(patches, environment, version)
+        print(f"Patch cache: {len(cached_risks)} cached, {len(new_patches)} to assess")
         
-        # Strip markdown code blocks if present
-        if ai_response.startswith('```json'):
-            ai_response = ai_response.replace('```json', '').replace('```', '').strip()
-        elif ai_response.startswith('```'):
-            ai_response = ai_response.replace('```', '').strip()
+        # The model only scores the new patches' risk (in batches); waves, windows and downtime are computed locally
+        new_risks, recommendation, usage, cache_info, prompt_stats, routing = score_in_batches(
+            new_patches,
+            environment,
+            int(body.get('batch_size') or PATCH_BATCH_SIZE),
+            bypass=bypass
+        )
+        if new_risks:
+            patch_cache.store(new_patches, environment, version, new_risks, ','.join(sorted(routing['models'])))
         
-        # Extract JSON from response
-        assessment = json.loads(ai_response)
+        risks = dict(cached_risks)
+        risks.update(new_risks)
+        plan = patch_scheduler.schedule(patches, risks, environment, body.get('maintenance_window'))
+        for entry in plan['deployment_plan']:
+            entry['cached'] = entry['patch_id'] in cached_risks
+        if not new_patches:
+            recommendation = (f"All {len(patches)} patch assessments served from cache: {len(plan['waves'])} waves in "
+                              f"{plan['windows_required']} maintenance windows, ~{plan['total_estimated_downtime_minutes']} minutes estimated downtime.")
+        print(f"Patch schedule: {len(patches)} patches in {len(plan['waves'])} waves, "
+              f"{plan['windows_required']} windows, ~{plan['total_estimated_downtime_minutes']} minutes downtime")
         
-        # Log to DynamoDB
+        assessment = {
+            'environment': environment,
+            'total_patches': len(patches),
+            **plan,
+            'overall_recommendation': recommendation
+        }
+        
+        # Buffer the session log; it is handed to the session log queue when the handler returns
         session_id = str(uuid.uuid4())
         timestamp = int(time.time())
-        try:
-            table.put_item(
-                Item={
-                    'session_id': session_id,
-                    'timestamp': timestamp,
-                    'module': 'patch-assessment',
-                    'request': json.dumps({'environment': environment, 'patches': patches}),
-                    'response': json.dumps(assessment),
-                    'processing_time': response_body.get('usage', {}).get('output_tokens', 0),
-                    'status': 'success'
-                }
-            )
-        except Exception as db_error:
-            print(f"DynamoDB logging error: {str(db_error)}")
+        session_logger.log_session(
+            'patch-assessment',
+            'success',
+            session_id=session_id,
+            timestamp=timestamp,
+            payloads={'request': {'environment': environment, 'patches': request_patches}, 'response': assessment},
+            processing_time=usage.get('output_tokens', 0),
+            extra={'prompt_stats': prompt_stats, 'model_id': ','.join(sorted(routing['models']))}
+        )
         
         return {
             'statusCode': 200,
@@ -115,12 +225,21 @@ Respond ONLY with valid JSON, no additional text."""
             'body': json.dumps({
                 'session_id': session_id,
                 'assessment': assessment,
-                'processing_time': response_body.get('usage', {})
+                'cache': cache_info,
+                'patch_cache': {
+                    'cached': len(cached_risks),
+                    'assessed': len(new_patches),
+                    'cached_patch_ids': sorted(cached_risks)
+                },
+                'prompt': prompt_stats,
+                'routing': routing,
+                'processing_time': usage
             })
         }
         
     except Exception as e:
         print(f"Error: {str(e)}")
+        session_logger.log_session('patch-assessment', 'error', extra={'error_message': str(e)})
         return {
             'statusCode': 500,
             'headers': {
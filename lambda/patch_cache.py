@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import time
+
+import bedrock_cache
+import model_router
+import patch_scheduler
+import prompt_builder
+import retry_policy
+
+# Per-patch risk assessment cache for patch_assessment_lambda.
+# Tenants see the same vendor patches across many requests, so each patch's risk entry
+# is stored on its own in the Bedrock cache table (items prefixed 'patch#') and only
+# patches never seen before are sent to the model. An entry is keyed by:
+# - the patch id and the environment it was assessed for
+# - a hash of the patch fields the model sees, so a changed description or CVE list misses
+# - the assessment version: the risk prompt version and the configured model ids,
+#   so changing either invalidates every entry
+PATCH_CACHE_TTL_SECONDS = int(os.environ.get('PATCH_CACHE_TTL_SECONDS', str(35 * 24 * 3600)))
+KEY_PREFIX = 'patch#'
+MODULE = 'patch-assessment'
+
+def assessment_version(prompt_version):
+    """
+    Returns the short version tag of the risk assessment: prompt version plus the
+    models patch assessment can be routed to
+    """
+    source = json.dumps([prompt_version, model_router.configured_models(MODULE)])
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:12]
+
+def content_hash(patch):
+    """
+    Hashes the fields of a patch the model sees (after pruning)
+    """
+    content = prompt_builder.compact_json(prompt_builder.prune_value(prompt_builder.select_fields(MODULE, patch)))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+
+def entry_key(patch_id, patch, environment, version):
+    """
+    Returns the cache table key of a patch's risk entry
+    """
+    return f"{KEY_PREFIX}{environment}#{patch_id}#{content_hash(patch)}#{version}"
+
+def lookup(patches, environment, version):
+    """
+    Reads the cached risk entries for a list of patches with retry_policy.get_items.
+    Returns (cached, misses): cached maps patch_id to its risk entry, misses lists the
+    patches that must go to the model. Read errors turn into misses.
+    """
+    keys = {}
+    for index, patch in enumerate(patches):
+        # patch_assessment_lambda assigns positional ids (with_ids) first, so every patch is
+        # looked up; the content hash keeps a positional id from matching a different patch.
+        # Callers passing patches without ids skip the cache for them.
+        if patch.get('id') or patch.get('patch_id'):
+            patch_id = patch_scheduler.get_patch_id(patch, index)
+            keys.setdefault(entry_key(patch_id, patch, environment, version), patch_id)
+
+    cached = {}
+    now = time.time()
+    try:
+        items = retry_policy.get_items(bedrock_cache.cache_table, [{'cache_key': key} for key in keys],
+                                       projection='cache_key, risk, expires_at')
+    except Exception as e:
+        print(f"Patch cache read error: {str(e)}")
+        items = []
+    for item in items:
+        # DynamoDB deletes expired items lazily
+        if int(item.get('expires_at', 0)) > now:
+            cached[keys[item['cache_key']]] = json.loads(item['risk'])
+
+    misses = []
+    seen = set()
+    for index, patch in enumerate(patches):
+        patch_id = patch_scheduler.get_patch_id(patch, index)
+        if patch_id not in cached and patch_id not in seen:
+            misses.append(patch)
+        seen.add(patch_id)
+    return cached, misses
+
+def store(patches, environment, version, risks, model_id):
+    """
+    Writes the risk entries the model returned for these patches (best effort).
+    Patches the model left out are not cached.
+    """
+    now = int(time.time())
+    # Keyed by cache_key: a batch_write_item request may not hold the same key twice
+    items = {}
+    for index, patch in enumerate(patches):
+        patch_id = patch_scheduler.get_patch_id(patch, index)
+        if not (patch.get('id') or patch.get('patch_id')) or patch_id not in risks:
+            continue
+        key = entry_key(patch_id, patch, environment, version)
+        items[key] = {
+            'cache_key': key,
+            'module': MODULE,
+            'patch_id': patch_id,
+            'environment': environment,
+            'model_id': model_id,
+            'risk': json.dumps(risks[patch_id]),
+            'created_at': now,
+            'expires_at': now + PATCH_CACHE_TTL_SECONDS
+        }
+    written = 0
+    try:
+        retry_policy.put_items(bedrock_cache.cache_table, list(items.values()))
+        written = len(items)
+    except Exception as e:
+        print(f"Patch cache write error: {str(e)}")
+    return written
@@ -0,0 +1,195 @@
+import json
+import math
+import os
+
+# Compact, token-budgeted prompt inputs for the AI lambdas.
+# Inputs are serialized without indentation, reduced to the fields the model uses,
+# cleaned of empty values and long strings, and fitted into a per-module input
+# budget. Callers split item lists with split_to_budget so every item reaches the model;
+# compact_items still replaces anything that does not fit by a short summary. Token counts are
+# estimated (about 4 characters per token) so no tokenizer is needed at runtime.
+CHARS_PER_TOKEN = 4
+MAX_STRING_CHARS = int(os.environ.get('PROMPT_MAX_STRING_CHARS', '400'))
+MAX_LIST_ITEMS = int(os.environ.get('PROMPT_MAX_LIST_ITEMS', '20'))
+
+# Default budgets per module in tokens: 'input' for the serialized data,
+# 'output' for max_tokens. Overridable with PROMPT_INPUT_BUDGET_<MODULE> and
+# PROMPT_OUTPUT_BUDGET_<MODULE> (e.g. PROMPT_INPUT_BUDGET_ALERT_TRIAGE=4000)
+DEFAULT_BUDGETS = {
+    'alert-triage': {'input': 6000, 'output': 2000},
+    'patch-assessment': {'input': 6000, 'output': 2000},
+    'remediation-script': {'input': 3000, 'output': 2000}
+}
+
+# Fields the model actually uses, per module; anything else is dropped from the prompt.
+# 'parent.child' keeps a single field of a nested object.
+MODEL_FIELDS = {
+    'alert-triage': ['id', 'source', 'severity', 'message', 'timestamp', 'metadata.server',
+                     'occurrences', 'first_seen', 'last_seen'],
+    'patch-assessment': ['id', 'patch_id', 'name', 'vendor', 'severity', 'description', 'cve_ids',
+                         'affected_systems', 'depends_on', 'requires_reboot', 'release_date']
+}
+
+def get_budget(module, kind):
+    """
+    Returns the module's 'input' or 'output' token budget
+    """
+    env_name = f"PROMPT_{kind.upper()}_BUDGET_" + module.upper().replace('-', '_')
+    return int(os.environ.get(env_name, DEFAULT_BUDGETS.get(module, {}).get(kind, 2000)))
+
+def estimate_tokens(text):
+    """
+    Estimates the token count of a text
+    """
+    return int(math.ceil(len(text) / float(CHARS_PER_TOKEN)))
+
+def compact_json(value):
+    """
+    Serializes a value without indentation or spaces after separators
+    """
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=str)
+
+def prune_value(value):
+    """
+    Drops empty values, truncates long strings and caps long lists, recursively
+    """
+    if isinstance(value, dict):
+        pruned = {}
+        for key, item in value.items():
+            item = prune_value(item)
+            if item not in (None, '', [], {}):
+                pruned[key] = item
+        return pruned
+    if isinstance(value, list):
+        items = [prune_value(item) for item in value[:MAX_LIST_ITEMS]]
+        if len(value) > MAX_LIST_ITEMS:
+            items.append(f"(+{len(value) - MAX_LIST_ITEMS} more)")
+        return items
+    if isinstance(value, str):
+        value = ' '.join(value.split())
+        if len(value) > MAX_STRING_CHARS:
+            return value[:MAX_STRING_CHARS] + '...'
+    return value
+
+def select_fields(module, item):
+    """
+    Keeps only the fields the module's model uses
+    """
+    fields = MODEL_FIELDS.get(module)
+    if not fields or not isinstance(item, dict):
+        return item
+    selected = {}
+    for field in fields:
+        key, _, child = field.partition('.')
+        if key not in item:
+            continue
+        if not child:
+            selected[key] = item[key]
+        elif isinstance(item[key], dict) and child in item[key]:
+            selected.setdefault(key, {})[child] = item[key][child]
+    return selected
+
+def truncate_text(text, max_tokens):
+    """
+    Cuts text down to about max_tokens tokens
+    """
+    text = ' '.join(str(text or '').split())
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars] + '...'
+
+def split_to_budget(module, items):
+    """
+    Splits items into consecutive groups that each fit the module's input budget the way
+    compact_items packs them (at least one item per group), so no item is left to the
+    overflow summary
+    """
+    budget = get_budget(module, 'input')
+    groups = []
+    used = 0
+    for item in items:
+        tokens = estimate_tokens(compact_json(prune_value(select_fields(module, item)))) + 1
+        if not groups or used + tokens > budget:
+            groups.append([])
+            used = 2
+        groups[-1].append(item)
+        used += tokens
+    return groups
+
+def compact_items(module, items, summarize=None):
+    """
+    Serializes a list of input items compactly within the module's input budget.
+    Items are kept in order while they fit (at least one); the overflow is replaced by
+    summarize(overflow_items) (or a count) so the model still knows it exists.
+    Returns (serialized_text, stats).
+    """
+    budget = get_budget(module, 'input')
+    kept = []
+    used = 2
+    overflow = []
+
+    for item in items:
+        compact = prune_value(select_fields(module, item))
+        tokens = estimate_tokens(compact_json(compact)) + 1
+        # The first item is always kept so the model has something to work on
+        if overflow or (kept and used + tokens > budget):
+            overflow.append(item)
+            continue
+        kept.append(compact)
+        used += tokens
+
+    if overflow:
+        summary = summarize(overflow) if summarize else {'omitted_items': len(overflow)}
+        kept.append({'overflow_summary': summary})
+        print(f"Prompt budget: {module} kept {len(items) - len(overflow)} of {len(items)} items within {budget} tokens")
+
+    text = compact_json(kept)
+    return text, {
+        'items': len(items),
+        'items_omitted': len(overflow),
+        'baseline_input_tokens': estimate_tokens(json.dumps(items, indent=2, default=str)),
+        'input_tokens': estimate_tokens(text),
+        'input_budget': budget
+    }
+
+def compact_value(module, value):
+    """
+    Serializes a single input object compactly, truncated to the module's input budget.
+    Returns (serialized_text, stats).
+    """
+    budget = get_budget(module, 'input')
+    text = compact_json(prune_value(select_fields(module, value)))
+    if estimate_tokens(text) > budget:
+        text = truncate_text(text, budget)
+    return text, {
+        'items': 1,
+        'items_omitted': 0,
+        'baseline_input_tokens': estimate_tokens(json.dumps(value, indent=2, default=str)),
+        'input_tokens': estimate_tokens(text),
+        'input_budget': budget
+    }
+
+def finish_stats(stats, prompt, max_tokens):
+    """
+    Completes the prompt report with the whole prompt's estimated size and the savings
+    """
+    stats = dict(stats)
+    stats['prompt_tokens'] = estimate_tokens(prompt)
+    stats['saved_tokens'] = max(stats['baseline_input_tokens'] - stats['input_tokens'], 0)
+    stats['max_tokens'] = max_tokens
+    print(f"Prompt: ~{stats['prompt_tokens']} tokens, ~{stats['saved_tokens']} input tokens saved")
+    return stats
+
+def merge_stats(stats_list):
+    """
+    Sums the prompt reports of several model calls (e.g. triage chunks)
+    """
+    merged = {}
+    for stats in stats_list:
+        for key, value in stats.items():
+            if key in ('input_budget', 'max_tokens'):
+                merged[key] = value
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
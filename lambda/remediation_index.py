@@ -0,0 +1,377 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from boto3.dynamodb.conditions import Attr, Key
+
+import aws_clients
+import session_payloads
+
+# Similarity index over past successful remediation sessions.
+# Most tickets repeat a handful of issues (disk full, stuck service, exhausted pool), so a
+# request whose issue is close enough to one already solved for the same platform and
+# system context gets that script back without a model call.
+#
+# Issues are normalized (lowercase, numbers/paths/hex masked, stopwords dropped) into
+# word and bigram terms and compared with TF-IDF cosine similarity. Candidates are found
+# through an inverted index, so a lookup only scores entries that share a term.
+#
+# msp-agent-sessions is the store: every generated script is already one session item, so
+# the request path writes nothing extra. Each container keeps the index in memory and
+# catches up with sessions other containers logged through the module+timestamp index
+# (at most every REMEDIATION_INDEX_REFRESH_SECONDS), loading at most
+# REMEDIATION_INDEX_REQUEST_SYNC_MAX new sessions per catch-up so the request path stays bounded.
+# A zlib-compressed snapshot in the payload store (REMEDIATION_INDEX_KEY) keeps cold starts
+# short; remediation_snapshot_lambda rewrites it on a schedule (setup-remediation-index.ps1),
+# so a container only has to catch up with the sessions since the last run.
+REUSE_THRESHOLD = float(os.environ.get('REMEDIATION_REUSE_THRESHOLD', '0.85'))
+INDEX_KEY = os.environ.get('REMEDIATION_INDEX_KEY', 'remediation-index/index.json.z')
+REFRESH_SECONDS = float(os.environ.get('REMEDIATION_INDEX_REFRESH_SECONDS', '60'))
+# Sessions are logged at the end of their invocation, so catch-up queries look back this far
+REFRESH_LAG_SECONDS = 300
+# Session payloads a request may load while catching up; the rest waits for later refreshes
+REQUEST_SYNC_MAX_SESSIONS = int(os.environ.get('REMEDIATION_INDEX_REQUEST_SYNC_MAX', '20'))
+MAX_ENTRIES = int(os.environ.get('REMEDIATION_INDEX_MAX_ENTRIES', '5000'))
+# system_context fields an entry must match exactly (besides the platform)
+CONTEXT_KEYS = [key.strip() for key in os.environ.get('REMEDIATION_INDEX_CONTEXT_KEYS', 'os_version,environment').split(',') if key.strip()]
+INDEX_FORMAT = 1
+
+SESSIONS_TABLE = os.environ.get('SESSIONS_TABLE', 'msp-agent-sessions')
+SESSIONS_INDEX = os.environ.get('SESSIONS_INDEX', 'module-timestamp-index')
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'been', 'but', 'by', 'can', 'for', 'from', 'has',
+    'have', 'i', 'in', 'is', 'it', 'its', 'of', 'on', 'or', 'our', 'please', 'that', 'the', 'this',
+    'to', 'was', 'we', 'were', 'when', 'with', 'after', 'again', 'keeps', 'getting'
+}
+
+sessions_table = aws_clients.lazy_table(SESSIONS_TABLE, 'us-east-1')
+
+class RemediationIndex:
+    """
+    In-memory TF-IDF index: entries by id, document frequencies and term postings
+    """
+    def __init__(self):
+        self.entries = {}
+        self.doc_freq = {}
+        self.postings = {}
+        self.synced_until = 0
+        # Sessions within the catch-up window that are not entries (e.g. reused scripts)
+        self.skipped = set()
+
+    def add(self, entry_id, terms, platform, context, remediation, created_at=None):
+        """
+        Adds (or replaces) one entry; the oldest entries are evicted beyond MAX_ENTRIES
+        """
+        if entry_id in self.entries:
+            self.remove(entry_id)
+        self.entries[entry_id] = {
+            'terms': terms,
+            'platform': platform,
+            'context': context,
+            'remediation': remediation,
+            'created_at': int(created_at or time.time())
+        }
+        for term in terms:
+            self.doc_freq[term] = self.doc_freq.get(term, 0) + 1
+            self.postings.setdefault(term, set()).add(entry_id)
+
+        if len(self.entries) > MAX_ENTRIES:
+            oldest = sorted(self.entries, key=lambda key: self.entries[key]['created_at'])
+            for stale_id in oldest[:len(self.entries) - MAX_ENTRIES]:
+                self.remove(stale_id)
+
+    def remove(self, entry_id):
+        """
+        Removes an entry and its term statistics
+        """
+        entry = self.entries.pop(entry_id)
+        for term in entry['terms']:
+            self.doc_freq[term] -= 1
+            self.postings[term].discard(entry_id)
+            if not self.doc_freq[term]:
+                del self.doc_freq[term]
+                del self.postings[term]
+
+    def weights(self, terms):
+        """
+        Returns the TF-IDF vector of a term-count dict and its norm
+        """
+        total = len(self.entries) + 1
+        vector = {}
+        for term, count in terms.items():
+            idf = math.log((total + 1) / (self.doc_freq.get(term, 0) + 1)) + 1
+            vector[term] = (1 + math.log(count)) * idf
+        return vector, math.sqrt(sum(weight * weight for weight in vector.values()))
+
+    def search(self, terms, platform, context):
+        """
+        Returns (entry_id, similarity) of the most similar entry with the same platform
+        and context, or None
+        """
+        candidates = set()
+        for term in terms:
+            candidates.update(self.postings.get(term, ()))
+
+        query, query_norm = self.weights(terms)
+        best = None
+        for entry_id in candidates:
+            entry = self.entries[entry_id]
+            if entry['platform'] != platform or entry['context'] != context:
+                continue
+            vector, norm = self.weights(entry['terms'])
+            if not norm or not query_norm:
+                continue
+            dot = sum(weight * vector.get(term, 0) for term, weight in query.items())
+            similarity = dot / (norm * query_norm)
+            # Ties go to the newest entry
+            if best is None or (similarity, entry['created_at']) > (best[1], self.entries[best[0]]['created_at']):
+                best = (entry_id, similarity)
+        return best
+
+    def to_bytes(self):
+        """
+        Serializes the index to its compact compressed form
+        """
+        rows = [[entry_id, entry['platform'], entry['context'], entry['created_at'], entry['terms'], entry['remediation']]
+                for entry_id, entry in self.entries.items()]
+        raw = json.dumps({'format': INDEX_FORMAT, 'synced_until': self.synced_until, 'entries': rows},
+                         separators=(',', ':')).encode('utf-8')
+        return zlib.compress(raw, 6)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Loads an index saved with to_bytes
+        """
+        index = cls()
+        document = json.loads(zlib.decompress(data))
+        if document.get('format') != INDEX_FORMAT:
+            raise ValueError(f"Unsupported remediation index format: {document.get('format')}")
+        for entry_id, platform, context, created_at, terms, remediation in document['entries']:
+            index.add(entry_id, terms, platform, context, remediation, created_at)
+        index.synced_until = int(document.get('synced_until', 0))
+        return index
+
+_index = None
+_index_lock = threading.Lock()
+# Serializes catch-up queries; _last_refresh is the time of the last one
+_refresh_lock = threading.Lock()
+_last_refresh = 0
+
+def normalize_issue(text):
+    """
+    Normalizes issue text into term counts: words and bigrams, with numbers, paths,
+    hex ids and GUIDs masked so "C: at 98%" and "C: at 95%" look the same
+    """
+    text = str(text or '').lower()
+    text = re.sub(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', ' guid ', text)
+    text = re.sub(r'(?:[a-z]:)?[\\/][\w.\-\\/]+', ' path ', text)
+    text = re.sub(r'\b0x[0-9a-f]+\b', ' hex ', text)
+    text = re.sub(r'\d+(?:\.\d+)?', ' num ', text)
+    words = [word for word in re.findall(r'[a-z][a-z_\-]*', text) if word not in STOPWORDS]
+
+    terms = {}
+    for word in words:
+        terms[word] = terms.get(word, 0) + 1
+    for first, second in zip(words, words[1:]):
+        bigram = f"{first} {second}"
+        terms[bigram] = terms.get(bigram, 0) + 1
+    return terms
+
+def context_signature(system_context):
+    """
+    Returns the normalized CONTEXT_KEYS values of a system context, e.g. "os_version=ubuntu 22.04"
+    """
+    if not isinstance(system_context, dict):
+        return ''
+    parts = []
+    for key in CONTEXT_KEYS:
+        value = system_context.get(key)
+        if value not in (None, ''):
+            parts.append(f"{key}={' '.join(str(value).lower().split())}")
+    return ';'.join(parts)
+
+def load_index():
+    """
+    Returns the container's index, loading it on first use from the snapshot in the payload
+    store (starting empty without one) and catching up with the sessions logged since
+    """
+    global _index
+    if _index is not None:
+        return _index
+
+    with _index_lock:
+        if _index is not None:
+            return _index
+        started = time.time()
+        index = RemediationIndex()
+        try:
+            index = RemediationIndex.from_bytes(session_payloads.get_blob(session_payloads.blob_location(INDEX_KEY)))
+        except Exception as e:
+            print(f"Remediation index snapshot not loaded: {str(e)}")
+        print(f"Remediation index: {len(index.entries)} entries loaded from the snapshot in {int((time.time() - started) * 1000)}ms")
+        _index = index
+    refresh(force=True)
+    return _index
+
+def session_entry(session_id):
+    """
+    Reads one remediation session and returns (request, remediation), or None for
+    sessions that are not model-generated scripts (reused ones point at their source)
+    """
+    items = sessions_table.query(
+        KeyConditionExpression=Key('session_id').eq(session_id),
+        Limit=1
+    ).get('Items', [])
+    if not items or items[0].get('reused_from'):
+        return None
+    request = session_payloads.load_payload(items[0], 'request') or {}
+    remediation = session_payloads.load_payload(items[0], 'response')
+    if not isinstance(remediation, dict) or not remediation.get('script'):
+        return None
+    return request, remediation
+
+def sync_sessions(index, since, max_sessions=None):
+    """
+    Adds the successful remediation-script sessions logged since a unix time (module+timestamp
+    index, oldest first, then each new session's payloads) to an index. Returns the number added.
+    With max_sessions, stops after loading that many sessions; synced_until then only moves
+    up to the last session loaded, so the next sync continues from there.
+    """
+    synced_at = int(time.time())
+    loaded = 0
+    kwargs = {
+        'IndexName': SESSIONS_INDEX,
+        'KeyConditionExpression': Key('module').eq('remediation-script') & Key('timestamp').gte(int(since)),
+        'FilterExpression': Attr('status').eq('success')
+    }
+    added = 0
+    skipped = set()
+    capped = False
+    while not capped:
+        response = sessions_table.query(**kwargs)
+        for summary in response.get('Items', []):
+            with _index_lock:
+                known = summary['session_id'] in index.entries
+            if known:
+                continue
+            if summary['session_id'] in index.skipped:
+                skipped.add(summary['session_id'])
+                continue
+            if max_sessions is not None and loaded >= max_sessions:
+                # The remaining sessions are picked up by the next sync
+                synced_at = int(summary['timestamp'])
+                capped = True
+                print(f"Remediation index: catch-up capped at {max_sessions} sessions, resuming from {synced_at}")
+                break
+            loaded += 1
+            entry = session_entry(summary['session_id'])
+            terms = normalize_issue(entry[0].get('issue', '')) if entry else None
+            if not terms:
+                skipped.add(summary['session_id'])
+                continue
+            request, remediation = entry
+            with _index_lock:
+                index.add(summary['session_id'], terms, str(request.get('platform', 'windows')).lower(),
+                          context_signature(request.get('system_context', {})), remediation, int(summary['timestamp']))
+            added += 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    with _index_lock:
+        index.synced_until = max(index.synced_until, synced_at)
+        index.skipped = index.skipped | skipped if capped else skipped
+    return added
+
+def refresh(force=False):
+    """
+    Catches the container's index up with sessions other containers logged, at most every
+    REMEDIATION_INDEX_REFRESH_SECONDS and at most REQUEST_SYNC_MAX_SESSIONS sessions at a time.
+    Errors leave the index as it is.
+    """
+    global _last_refresh
+    if not force and time.time() - _last_refresh < REFRESH_SECONDS:
+        return 0
+    with _refresh_lock:
+        if not force and time.time() - _last_refresh < REFRESH_SECONDS:
+            return 0
+        _last_refresh = time.time()
+        try:
+            added = sync_sessions(_index, max(_index.synced_until - REFRESH_LAG_SECONDS, 0), REQUEST_SYNC_MAX_SESSIONS)
+        except Exception as e:
+            print(f"Remediation index refresh error: {str(e)}")
+            return 0
+        if added:
+            print(f"Remediation index: {added} sessions added from msp-agent-sessions")
+        return added
+
+def find_reusable(issue_description, platform, system_context, threshold=None):
+    """
+    Looks up a stored remediation for a similar issue on the same platform and context.
+    Returns {'session_id', 'similarity', 'remediation'} when the similarity reaches the
+    threshold, otherwise None.
+    """
+    terms = normalize_issue(issue_description)
+    if not terms:
+        return None
+    index = load_index()
+    refresh()
+    with _index_lock:
+        best = index.search(terms, str(platform).lower(), context_signature(system_context))
+        if not best:
+            return None
+        entry_id, similarity = best
+        if similarity < (REUSE_THRESHOLD if threshold is None else threshold):
+            print(f"Remediation index: best match {entry_id} at {similarity:.3f} is below the threshold")
+            return None
+        return {
+            'session_id': entry_id,
+            'similarity': round(similarity, 4),
+            'remediation': index.entries[entry_id]['remediation']
+        }
+
+def add_remediation(session_id, issue_description, platform, system_context, remediation, created_at=None):
+    """
+    Adds a generated remediation to the container's index. Nothing is written: the
+    session log is the stored entry other containers pick up.
+    """
+    terms = normalize_issue(issue_description)
+    if not terms:
+        return
+    index = load_index()
+    with _index_lock:
+        index.add(session_id, terms, str(platform).lower(), context_signature(system_context), remediation, created_at)
+
+def sync_snapshot():
+    """
+    Catches the snapshot in the payload store up with msp-agent-sessions and rewrites it
+    (remediation_snapshot_lambda, on a schedule). Without a snapshot it is built from every
+    session. Concurrent runs are harmless, since any snapshot is rebuilt from the sessions it missed.
+    """
+    try:
+        index = RemediationIndex.from_bytes(session_payloads.get_blob(session_payloads.blob_location(INDEX_KEY)))
+    except Exception as e:
+        print(f"Remediation index: starting a new snapshot ({str(e)})")
+        index = RemediationIndex()
+    added = sync_sessions(index, max(index.synced_until - REFRESH_LAG_SECONDS, 0))
+    data = index.to_bytes()
+    session_payloads.put_blob(INDEX_KEY, data)
+    print(f"Remediation index snapshot saved: {len(index.entries)} entries ({added} new), {len(data)} bytes")
+    return added
+
+def build_from_sessions(since=0):
+    """
+    One-off seeding: builds the snapshot from every remediation-script session since a
+    unix time. Later runs of sync_snapshot only read the sessions logged since.
+    """
+    index = RemediationIndex()
+    added = sync_sessions(index, since)
+    data = index.to_bytes()
+    session_payloads.put_blob(INDEX_KEY, data)
+    print(f"Remediation index: {added} sessions added, snapshot saved ({len(data)} bytes)")
+    return added
@@ -1,108 +1,487 @@
 import json
-import boto3
 import time
 import uuid
 
-bedrock = boto3.client('bedrock-runtime', region_name='us-east-1')
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-table = dynamodb.Table('msp-agent-sessions')
+import aws_clients
+import bedrock_cache
+import model_gateway
+import model_output
+import model_router
+import prompt_builder
+import remediation_index
+import retry_policy
+import session_logger
 
+bedrock = aws_clients.lazy_client('bedrock-runtime', 'us-east-1')
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+def parse_model_response(response_body):
+    """
+    Extracts and validates the JSON result from a Bedrock response body
+    (reasoning blocks, fences and surrounding prose are ignored)
+    """
+    return model_output.extract_json(response_body, 'remediation-script')
+
+class IncrementalJsonParser:
+    """
+    Parses a JSON object as it streams in and reports each top-level field
+    as soon as its value is complete. Text before the opening brace
+    (markdown fences, <think> blocks) is skipped.
+    """
+    
+    def __init__(self):
+        self.buffer = ''
+        self.position = 0
+        self.started = False
+        self.complete = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.field_start = None
+        self.fields = {}
+    
+    def feed(self, text):
+        """
+        Adds streamed text and returns the (key, value) pairs completed by it
+        """
+        self.buffer += text
+        completed = []
+        
+        while self.position < len(self.buffer) and not self.complete:
+            if not self.started and not self._skip_preamble():
+                break
+            
+            char = self.buffer[self.position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    self._finish_field(self.position, completed)
+                    self.complete = True
+            elif char == ',' and self.depth == 1:
+                self._finish_field(self.position, completed)
+                self.field_start = self.position + 1
+            
+            self.position += 1
+        
+        return completed
+    
+    def _skip_preamble(self):
+        """
+        Advances to the opening brace of the object, waiting out unfinished <think> blocks
+        """
+        remaining = self.buffer[self.position:]
+        think_start = remaining.find('<think>')
+        brace = remaining.find('{')
+        
+        if think_start != -1 and (brace == -1 or think_start < brace):
+            think_end = remaining.find('</think>', think_start)
+            if think_end == -1:
+                return False
+            self.position += think_end + len('</think>')
+            return self._skip_preamble()
+        
+        if brace == -1:
+            # Keep a trailing partial '<think>' so the tag is recognized once the rest arrives
+            partial = next((size for size in range(len('<think>') - 1, 0, -1) if remaining.endswith('<think>'[:size])), 0)
+            self.position = len(self.buffer) - partial
+            return False
+        
+        self.position += brace + 1
+        self.started = True
+        self.depth = 1
+        self.field_start = self.position
+        return self.position < len(self.buffer)
+    
+    def _finish_field(self, end, completed):
+        """
+        Decodes one '"key": value' segment of the top-level object
+        """
+        segment = self.buffer[self.field_start:end].strip()
+        if not segment:
+            return
+        
+        decoder = json.JSONDecoder()
+        try:
+            key, index = decoder.raw_decode(segment)
+            value_text = segment[index:].strip()
+            if not value_text.startswith(':'):
+                return
+            value = json.loads(value_text[1:])
+        except ValueError as e:
+            print(f"Incremental parse error: {str(e)}")
+            return
+        
+        self.fields[key] = value
+        completed.append((key, value))
+
+def extract_stream_text(chunk):
+    """
+    Returns the generated text carried by one streamed Bedrock chunk
+    """
+    if 'choices' in chunk:
+        choice = chunk['choices'][0] if chunk['choices'] else {}
+        delta = choice.get('delta') or choice.get('message') or {}
+        return delta.get('content') or ''
+    if 'outputText' in chunk:
+        return chunk['outputText']
+    if chunk.get('type') == 'content_block_delta':
+        return chunk.get('delta', {}).get('text', '')
+    return ''
+
+def extract_stream_usage(chunk):
+    """
+    Returns token usage from a streamed Bedrock chunk, if it carries any
+    """
+    if chunk.get('usage'):
+        return chunk['usage']
+    metrics = chunk.get('amazon-bedrock-invocationMetrics')
+    if metrics:
+        return {
+            'input_tokens': metrics.get('inputTokenCount', 0),
+            'output_tokens': metrics.get('outputTokenCount', 0)
+        }
+    return None
+
+def stream_remediation(model_id, request_params, bypass, started):
+    """
+    Generates the remediation through invoke_model_with_response_stream and yields
+    a 'field' event for every top-level field as soon as it is complete.
+    The last event is 'result', carrying the full remediation, usage and cache report.
+    A request identical to one already in flight replays that request's result.
+    """
+    cache_key = bedrock_cache.make_cache_key(model_id, request_params)
+    cached = None if bypass else bedrock_cache.cache_lookup(cache_key)
+    status = 'hit'
+    
+    if not cached:
+        # Identical in-flight request: wait for its result instead of streaming a second generation
+        flight = model_gateway.begin(cache_key, fresh_after=int(started) if bypass else None)
+        if not flight.owner:
+            cached = model_gateway.wait(flight)
+            status = 'coalesced'
+    
+    if cached:
+        response_body, tier = cached
+        remediation = parse_model_response(response_body)
+        for key, value in remediation.items():
+            yield {'event': 'field', 'field': key, 'value': value, 'elapsed_ms': int((time.time() - started) * 1000)}
+        yield {
+            'event': 'result',
+            'remediation': remediation,
+            'usage': response_body.get('usage', {}),
+            'cache': bedrock_cache.cache_result(status, tier, cache_key, started)
+        }
+        return
+    
+    # The lease is renewed while the generation streams, however long it takes
+    model_gateway.start_renewal(flight)
+    try:
+        response_body, remediation = None, None
+        for stream_event in generate_stream(model_id, request_params, started):
+            if stream_event['event'] == 'result':
+                response_body = stream_event['response_body']
+                remediation = stream_event['remediation']
+            else:
+                yield stream_event
+        
+        bedrock_cache.cache_store(cache_key, response_body, 'remediation-script', model_id)
+    except BaseException as e:
+        model_gateway.fail(flight, e)
+        raise
+    
+    model_gateway.complete(flight, response_body)
+    yield {
+        'event': 'result',
+        'remediation': remediation,
+        'usage': response_body.get('usage', {}),
+        'cache': bedrock_cache.cache_result('bypass' if bypass else 'miss', None, cache_key, started)
+    }
+
+def generate_stream(model_id, request_params, started):
+    """
+    Runs invoke_model_with_response_stream, yielding 'field' events as fields complete
+    and finally a 'result' event with the assembled response body and remediation
+    """
+    response = retry_policy.call(
+        'bedrock', 'invoke_model_with_response_stream', bedrock.invoke_model_with_response_stream,
+        modelId=model_id,
+        body=json.dumps(request_params)
+    )
+    
+    parser = IncrementalJsonParser()
+    text_parts = []
+    usage = {}
+    
+    for event in response['body']:
+        if 'chunk' not in event:
+            continue
+        chunk = json.loads(event['chunk']['bytes'])
+        text = extract_stream_text(chunk)
+        usage = extract_stream_usage(chunk) or usage
+        if not text:
+            continue
+        
+        text_parts.append(text)
+        for key, value in parser.feed(text):
+            yield {'event': 'field', 'field': key, 'value': value, 'elapsed_ms': int((time.time() - started) * 1000)}
+    
+    response_body = {
+        'choices': [{'message': {'content': ''.join(text_parts).strip()}}],
+        'usage': usage
+    }
+    # Output cut off at max_tokens: stream in continuations and keep emitting fields
+    continuations = 0
+    while not parser.complete and continuations < model_output.MAX_CONTINUATIONS:
+        try:
+            parse_model_response(response_body)
+            break
+        except model_output.TruncatedOutputError as e:
+            partial_text = e.partial_text
+        continuations += 1
+        print(f"remediation-script: stream truncated, requesting continuation {continuations}/{model_output.MAX_CONTINUATIONS}")
+        text, continuation_usage = model_output.request_continuation(bedrock, model_id, request_params, partial_text)
+        usage = model_output.add_usage(usage, continuation_usage)
+        response_body = {
+            'choices': [{'message': {'content': partial_text + text}}],
+            'usage': usage
+        }
+        for key, value in parser.feed(text):
+            yield {'event': 'field', 'field': key, 'value': value, 'elapsed_ms': int((time.time() - started) * 1000)}
+    
+    try:
+        remediation = parse_model_response(response_body)
+    except ValueError:
+        # Fall back to the incrementally parsed fields when the object itself completed
+        if not parser.complete:
+            raise
+        remediation = model_output.validate_schema(parser.fields, 'remediation-script')
+        response_body['choices'][0]['message']['content'] = json.dumps(remediation)
+    
+    yield {'event': 'result', 'response_body': response_body, 'remediation': remediation}
+
+def is_stream_requested(event, body):
+    """
+    Returns True when the client asked for an NDJSON streamed response
+    """
+    headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+    return body.get('response_mode') == 'ndjson' or NDJSON_CONTENT_TYPE in str(headers.get('accept', ''))
+
+def validate_request(body):
+    """
+    Returns the error message for an invalid remediation request, or None
+    """
+    if not body.get('issue_description', ''):
+        return 'No issue description provided'
+    return None
+
+def read_request(body):
+    """
+    Returns the platform, issue description, system context and cache bypass flag of a request
+    """
+    return (body.get('platform', 'windows'), body.get('issue_description', ''),
+            body.get('system_context', {}), bedrock_cache.is_bypass_requested(body))
+
+def build_model_request(platform, issue_description, system_context):
+    """
+    Builds the prompt (compact inputs within the module's token budget) and routes it.
+    Returns (routing decision, Bedrock request parameters, prompt report).
+    """
+    # Determine script type
+    script_type = 'PowerShell' if platform.lower() == 'windows' else 'Bash'
+    
+    context_text, prompt_stats = prompt_builder.compact_value('remediation-script', system_context)
+    issue_text = prompt_builder.truncate_text(issue_description, prompt_builder.get_budget('remediation-script', 'input'))
+    input_tokens = prompt_stats['input_tokens'] + prompt_builder.estimate_tokens(issue_text)
+    critical = str(system_context.get('environment', '')).lower() == 'production' if isinstance(system_context, dict) else False
+    decision = model_router.route('remediation-script', input_tokens, 1, critical)
+    
+    prompt = f"""You are an expert systems administrator. Generate a production-ready {script_type} script to resolve this issue.
+Platform: {platform}
+Issue: {issue_text}
+System Context: {context_text}
+
+Include error handling, a complete rollback script, validation checks before and after changes, execution instructions, prerequisites, safety warnings and an execution time estimate.
+
+Respond ONLY with valid JSON with the fields in this order:
+{{"platform":"{platform}","script_type":"{script_type}","prerequisites":["<list>"],"warnings":["<safety warnings>"],"estimated_execution_time":"<time>","execution_instructions":["<step by step>"],"script":"<complete script with comments>","rollback_script":"<complete rollback script>","validation_steps":["<how to verify success>"]}}"""
+    prompt_stats = prompt_builder.finish_stats(prompt_stats, prompt, decision['max_tokens'])
+    return decision, model_router.request_params(decision, prompt), prompt_stats
+
+def record_remediation(platform, issue_description, system_context, remediation, usage, prompt_stats, routing):
+    """
+    Logs the session of a generated remediation and makes the script reusable for
+    similar issues. Returns the session id.
+    """
+    session_id = str(uuid.uuid4())
+    timestamp = int(time.time())
+    session_logger.log_session(
+        'remediation-script',
+        'success',
+        session_id=session_id,
+        timestamp=timestamp,
+        payloads={'request': {'platform': platform, 'issue': issue_description, 'system_context': system_context}, 'response': remediation},
+        processing_time=usage.get('output_tokens', 0),
+        extra={'prompt_stats': prompt_stats, 'model_id': routing['model_id']}
+    )
+    remediation_index.add_remediation(session_id, issue_description, platform, system_context, remediation, timestamp)
+    return session_id
+
+def record_reuse(reuse, platform, issue_description, system_context, started):
+    """
+    Logs the session of a remediation served from the similarity index.
+    Returns (session id, reuse report, cache report).
+    """
+    reuse_info = {'session_id': reuse['session_id'], 'similarity': reuse['similarity']}
+    cache_info = {
+        'status': 'reused',
+        'tier': 'similarity-index',
+        'key': reuse['session_id'],
+        'lookup_ms': int((time.time() - started) * 1000)
+    }
+    
+    session_id = str(uuid.uuid4())
+    session_logger.log_session(
+        'remediation-script',
+        'success',
+        session_id=session_id,
+        timestamp=int(time.time()),
+        payloads={'request': {'platform': platform, 'issue': issue_description, 'system_context': system_context}, 'response': reuse['remediation']},
+        extra={'reused_from': reuse['session_id'], 'similarity': str(reuse['similarity'])}
+    )
+    return session_id, reuse_info, cache_info
+
+def remediation_events(body, started):
+    """
+    Yields the NDJSON events of a remediation request: a 'field' event for every
+    top-level field as soon as it is complete, then a 'complete' event with the
+    session id and reports. The request must have passed validate_request.
+    """
+    platform, issue_description, system_context, bypass = read_request(body)
+    
+    # A script already generated for a similar issue on the same platform and context is returned without a model call
+    reuse = None if bypass else remediation_index.find_reusable(issue_description, platform, system_context)
+    if reuse:
+        print(f"Reusing remediation from session {reuse['session_id']} (similarity {reuse['similarity']})")
+        for key, value in reuse['remediation'].items():
+            yield {'event': 'field', 'field': key, 'value': value, 'elapsed_ms': int((time.time() - started) * 1000)}
+        session_id, reuse_info, cache_info = record_reuse(reuse, platform, issue_description, system_context, started)
+        yield {
+            'event': 'complete',
+            'session_id': session_id,
+            'cache': cache_info,
+            'reuse': reuse_info,
+            'processing_time': {},
+            'elapsed_ms': int((time.time() - started) * 1000)
+        }
+        return
+    
+    decision, request_params, prompt_stats = build_model_request(platform, issue_description, system_context)
+    model_started = time.time()
+    for stream_event in stream_remediation(decision['model_id'], request_params, bypass, started):
+        if stream_event['event'] == 'result':
+            remediation = stream_event['remediation']
+            usage = stream_event['usage']
+            cache_info = stream_event['cache']
+        else:
+            yield stream_event
+    routing = model_router.record(decision, model_started, cache_info, usage)
+    
+    session_id = record_remediation(platform, issue_description, system_context, remediation, usage, prompt_stats, routing)
+    yield {
+        'event': 'complete',
+        'session_id': session_id,
+        'cache': cache_info,
+        'prompt': prompt_stats,
+        'routing': routing,
+        'processing_time': usage,
+        'elapsed_ms': int((time.time() - started) * 1000)
+    }
+
+@aws_clients.measure_init('remediation-script')
+@session_logger.flush_after
 def lambda_handler(event, context):
     """
     Remediation Script Lambda - Generates PowerShell/Bash scripts with rollback using Claude 3.5
     """
+    retry_policy.start_invocation(context)
+    started = time.time()
     try:
         # Parse input
         body = json.loads(event.get('body', '{}'))
-        platform = body.get('platform', 'windows')
-        issue_description = body.get('issue_description', '')
-        system_context = body.get('system_context', {})
+        error = validate_request(body)
         
-        if not issue_description:
+        if error:
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'error': 'No issue description provided'})
+                'body': json.dumps({'error': error})
             }
         
-        # Determine script type
-        script_type = 'PowerShell' if platform.lower() == 'windows' else 'Bash'
+        if is_stream_requested(event, body):
+            # API Gateway REST buffers proxy responses, so the NDJSON events are returned in one
+            # body here; remediation_stream_server sends them as they are generated
+            lines = [json.dumps(stream_event) for stream_event in remediation_events(body, started)]
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': NDJSON_CONTENT_TYPE,
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': '\n'.join(lines) + '\n'
+            }
         
-        # Construct prompt for Claude
-        prompt = f"""You are an expert systems administrator. Generate a production-ready {script_type} script to resolve this issue.
-
-Platform: {platform}
-Issue: {issue_description}
-System Context: {json.dumps(system_context, indent=2)}
-
-Requirements:
-1. Include comprehensive error handling
-2. Provide a complete rollback script
-3. Add validation checks before and after changes
-4. Include clear execution instructions
-5. List all prerequisites
-6. Add safety warnings
-7. Estimate execution time
-
-Provide your response in the following JSON format:
-{{
-  "platform": "{platform}",
-  "script_type": "{script_type}",
-  "script": "<complete script with comments>",
-  "rollback_script": "<complete rollback script>",
-  "prerequisites": ["<list>"],
-  "execution_instructions": ["<step by step>"],
-  "warnings": ["<safety warnings>"],
-  "estimated_execution_time": "<time>",
-  "validation_steps": ["<how to verify success>"]
-}}
-
-Respond ONLY with valid JSON, no additional text."""
-
-        # Call Bedrock with Qwen
-        response = bedrock.invoke_model(
-            modelId='qwen.qwen3-32b-v1:0',
-            body=json.dumps({
-                'max_tokens': 2000,
-                'temperature': 0.7,
-                'top_p': 0.9,
-                'messages': [{
-                    'role': 'user',
-                    'content': prompt
-                }]
-            })
-        )
+        platform, issue_description, system_context, bypass = read_request(body)
         
-        # Parse response (Qwen format)
-        response_body = json.loads(response['body'].read())
-        ai_response = response_body['choices'][0]['message']['content']
+        # A script already generated for a similar issue on the same platform and context is returned without a model call
+        reuse = None if bypass else remediation_index.find_reusable(issue_description, platform, system_context)
+        if reuse:
+            print(f"Reusing remediation from session {reuse['session_id']} (similarity {reuse['similarity']})")
+            session_id, reuse_info, cache_info = record_reuse(reuse, platform, issue_description, system_context, started)
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({
+                    'session_id': session_id,
+                    'remediation': reuse['remediation'],
+                    'cache': cache_info,
+                    'reuse': reuse_info,
+                    'processing_time': {}
+                })
+            }
         
-        # Strip markdown code blocks if present
-        if ai_response.startswith('```json'):
-            ai_response = ai_response.replace('```json', '').replace('```', '').strip()
-        elif ai_response.startswith('```'):
-            ai_response = ai_response.replace('```', '').strip()
+        decision, request_params, prompt_stats = build_model_request(platform, issue_description, system_context)
+        model_started = time.time()
         
-        # Extract JSON from response
-        remediation = json.loads(ai_response)
+        # Call Bedrock with the routed model (through the model gateway: response cache + request coalescing)
+        response_body, cache_info = model_gateway.invoke_model(
+            bedrock,
+            decision['model_id'],
+            request_params,
+            module='remediation-script',
+            bypass=bypass,
+            validate=parse_model_response
+        )
+        remediation = parse_model_response(response_body)
+        usage = response_body.get('usage', {})
+        routing = model_router.record(decision, model_started, cache_info, usage)
         
-        # Log to DynamoDB
-        session_id = str(uuid.uuid4())
-        timestamp = int(time.time())
-        try:
-            table.put_item(
-                Item={
-                    'session_id': session_id,
-                    'timestamp': timestamp,
-                    'module': 'remediation-script',
-                    'request': json.dumps({'platform': platform, 'issue': issue_description}),
-                    'response': json.dumps(remediation),
-                    'processing_time': response_body.get('usage', {}).get('output_tokens', 0),
-                    'status': 'success'
-                }
-            )
-        except Exception as db_error:
-            print(f"DynamoDB logging error: {str(db_error)}")
+        # Log the session and make the new script reusable for similar issues
+        session_id = record_remediation(platform, issue_description, system_context, remediation, usage, prompt_stats, routing)
         
         return {
             'statusCode': 200,
@@ -113,12 +492,16 @@ Respond ONLY with valid JSON, no additional text."""
             'body': json.dumps({
                 'session_id': session_id,
                 'remediation': remediation,
-                'processing_time': response_body.get('usage', {})
+                'cache': cache_info,
+                'prompt': prompt_stats,
+                'routing': routing,
+                'processing_time': usage
             })
         }
         
     except Exception as e:
         print(f"Error: {str(e)}")
+        session_logger.log_session('remediation-script', 'error', extra={'error_message': str(e)})
         return {
             'statusCode': 500,
             'headers': {
@@ -0,0 +1,12 @@
+import aws_clients
+import remediation_index
+
+@aws_clients.measure_init('remediation-snapshot')
+def lambda_handler(event, context):
+    """
+    Remediation Snapshot Lambda - Catches the remediation index snapshot up with the
+    remediation-script sessions and rewrites it. Runs on an EventBridge schedule, so cold
+    containers only catch up with the sessions logged since the last run.
+    """
+    added = remediation_index.sync_snapshot()
+    return {'added': added}
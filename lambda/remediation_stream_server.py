@@ -0,0 +1,148 @@
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import alert_batcher
+import alert_triage_lambda
+import remediation_script_lambda
+import retry_policy
+import session_logger
+
+# Streaming entry point for remediation NDJSON and NDJSON alert ingest.
+# API Gateway REST buffers Lambda proxy responses, so the remediation-stream function runs
+# this server under the Lambda Web Adapter (AWS_LWA_INVOKE_MODE=response_stream) behind a
+# Function URL with InvokeMode=RESPONSE_STREAM. Each event is written as its own HTTP chunk,
+# so the short fields reach the client while the script is still being generated.
+# POST /alerts takes an NDJSON alert stream (the alert-triage ingest, same query parameters)
+# and writes each batch's line as soon as that batch is triaged, so urgent batches are not
+# held back by the slowest routine batch.
+# Run it locally with `python remediation_stream_server.py` and POST to http://localhost:8080/.
+PORT = int(os.environ.get('AWS_LWA_PORT', os.environ.get('PORT', '8080')))
+HEALTH_PATH = '/health'
+ALERTS_PATH = '/alerts'
+
+class InvocationContext:
+    """
+    Lambda context rebuilt from the x-amzn-lambda-context header the web adapter adds
+    to each request, so retries and the session log flush still respect the invocation deadline
+    """
+    def __init__(self, deadline_ms, request_id=None):
+        self.deadline_ms = deadline_ms
+        self.aws_request_id = request_id
+
+    def get_remaining_time_in_millis(self):
+        return max(int(self.deadline_ms - time.time() * 1000), 0)
+
+def invocation_context(header):
+    """
+    Returns the InvocationContext of a request, or None when not running under the adapter
+    """
+    try:
+        data = json.loads(header) if header else {}
+    except ValueError:
+        return None
+    if not data.get('deadline'):
+        return None
+    return InvocationContext(int(data['deadline']), data.get('request_id'))
+
+class RemediationStreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def send_json(self, status_code, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def write_chunk(self, text):
+        """
+        Writes one chunk of the chunked response body and flushes it to the client
+        """
+        data = text.encode('utf-8')
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        # Readiness check of the web adapter
+        if self.path == HEALTH_PATH:
+            self.send_json(200, {'status': 'ok'})
+        else:
+            self.send_json(404, {'error': 'Not found'})
+
+    def start_stream(self):
+        """
+        Sends the status line and headers of a chunked NDJSON response
+        """
+        self.send_response(200)
+        self.send_header('Content-Type', remediation_script_lambda.NDJSON_CONTENT_TYPE)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def stream_events(self, events, module):
+        """
+        Writes each event as its own chunk, then ends the response
+        """
+        self.start_stream()
+        try:
+            for stream_event in events:
+                self.write_chunk(json.dumps(stream_event) + '\n')
+        except Exception as e:
+            # The status line is already sent: report the failure as the last event
+            print(f"Error: {str(e)}")
+            session_logger.log_session(module, 'error', extra={'error_message': str(e)})
+            self.write_chunk(json.dumps({'event': 'error', 'error': str(e)}) + '\n')
+        self.write_chunk('')
+
+    def do_POST(self):
+        context = invocation_context(self.headers.get('x-amzn-lambda-context'))
+        retry_policy.start_invocation(context)
+        started = time.time()
+        try:
+            raw = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            url = urlparse(self.path)
+            if url.path.rstrip('/') == ALERTS_PATH:
+                self.post_alerts(raw, dict(parse_qsl(url.query)), started)
+            else:
+                self.post_remediation(raw, started)
+        finally:
+            # The session log is handed off after the streamed body has ended
+            session_logger.flush(context)
+
+    def post_alerts(self, raw, params, started):
+        try:
+            alerts, window, max_size, bypass = alert_triage_lambda.read_ingest_request(
+                {'body': raw.decode('utf-8'), 'queryStringParameters': params})
+        except (alert_batcher.InvalidStreamError, UnicodeDecodeError) as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        self.stream_events(alert_triage_lambda.ingest_events(alerts, window, max_size, bypass, started), 'alert-triage')
+
+    def post_remediation(self, raw, started):
+        try:
+            body = json.loads(raw or b'{}')
+        except ValueError:
+            self.send_json(400, {'error': 'Invalid JSON body'})
+            return
+        error = remediation_script_lambda.validate_request(body)
+        if error:
+            self.send_json(400, {'error': error})
+            return
+        self.stream_events(remediation_script_lambda.remediation_events(body, started), 'remediation-script')
+
+def main():
+    print(f"Remediation stream server listening on port {PORT}")
+    # Threaded so an idle keep-alive connection (e.g. the adapter's readiness check)
+    # never blocks the invocation; Lambda sends one invocation at a time
+    server = ThreadingHTTPServer(('0.0.0.0', PORT), RemediationStreamHandler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+import json
+import os
+import random
+import threading
+import time
+from botocore.exceptions import BotoCoreError, ClientError
+
+# Shared retry/backoff policy for AWS calls (IAM, DynamoDB, Bedrock).
+# - errors are classified as retryable or not; only transient ones are retried
+# - backoff uses decorrelated jitter: sleep = min(cap, uniform(base, previous_sleep * 3))
+# - a retry is only started when its backoff plus the expected duration of the attempt
+#   (per dependency, or the failed attempt's own duration when longer) fits before the
+#   invocation deadline; an attempt that runs longer than expected can still overrun it
+# - a circuit breaker per dependency fails fast while the service keeps throttling
+# - every retry is emitted as a CloudWatch embedded metric
+MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', '4'))
+BASE_DELAY = float(os.environ.get('RETRY_BASE_DELAY', '0.2'))
+MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', '5'))
+# Time kept free for the handler to respond after the last attempt
+DEADLINE_RESERVE_MS = int(os.environ.get('RETRY_DEADLINE_RESERVE_MS', '1500'))
+# Expected duration of one attempt per dependency, in seconds (RETRY_ATTEMPT_COST_<DEPENDENCY>)
+ATTEMPT_COSTS = {'bedrock': 15.0, 'iam': 1.0, 'dynamodb': 0.5, 'sqs': 0.5}
+DEFAULT_ATTEMPT_COST = 1.0
+
+BREAKER_THRESHOLD = int(os.environ.get('CIRCUIT_BREAKER_THRESHOLD', '5'))
+BREAKER_COOLDOWN_SECONDS = float(os.environ.get('CIRCUIT_BREAKER_COOLDOWN', '30'))
+
+METRICS_NAMESPACE = 'MSPAgents'
+
+THROTTLING_CODES = {
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+    'ProvisionedThroughputExceededException',
+    'RequestThrottled',
+    'SlowDown'
+}
+
+TRANSIENT_CODES = {
+    'InternalFailure',
+    'InternalError',
+    'InternalServerError',
+    'InternalServerException',
+    'ServiceUnavailable',
+    'ServiceUnavailableException',
+    'ServiceFailure',
+    'ModelNotReadyException',
+    'ModelTimeoutException',
+    'ConcurrentModification',
+    'TransactionInProgressException',
+    'RequestTimeout',
+    'RequestTimeoutException'
+}
+
+class CircuitOpenError(Exception):
+    pass
+
+class UnprocessedItemsError(Exception):
+    pass
+
+_deadline = None
+_breakers = {}
+_breaker_lock = threading.Lock()
+
+def start_invocation(context):
+    """
+    Records the invocation deadline from the Lambda context. Call at the top of each handler.
+    """
+    global _deadline
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        _deadline = time.time() + context.get_remaining_time_in_millis() / 1000.0
+    else:
+        _deadline = None
+
+def remaining_seconds():
+    """
+    Seconds left before the invocation deadline (minus the reserve), or None when unknown
+    """
+    if _deadline is None:
+        return None
+    return _deadline - time.time() - DEADLINE_RESERVE_MS / 1000.0
+
+def attempt_cost(dependency):
+    """
+    Returns the expected duration in seconds of one attempt against a dependency
+    """
+    default = ATTEMPT_COSTS.get(dependency, DEFAULT_ATTEMPT_COST)
+    return float(os.environ.get(f"RETRY_ATTEMPT_COST_{dependency.upper()}", default))
+
+def error_code(error):
+    """
+    Returns the AWS error code of a ClientError, or None
+    """
+    if isinstance(error, ClientError):
+        return error.response.get('Error', {}).get('Code')
+    return None
+
+def is_throttle(error):
+    """
+    True for throttling / rate-limit errors (DynamoDB leaving batch items unprocessed included)
+    """
+    return isinstance(error, UnprocessedItemsError) or error_code(error) in THROTTLING_CODES
+
+def is_retryable(error):
+    """
+    True for errors worth retrying: throttling, transient service errors,
+    5xx responses and connection/timeout errors
+    """
+    if isinstance(error, UnprocessedItemsError):
+        return True
+    if isinstance(error, ClientError):
+        code = error_code(error)
+        if code in THROTTLING_CODES or code in TRANSIENT_CODES:
+            return True
+        status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        return status >= 500 or status == 429
+    return isinstance(error, BotoCoreError)
+
+def get_breaker(dependency):
+    """
+    Returns the circuit breaker state for a dependency
+    """
+    with _breaker_lock:
+        return _breakers.setdefault(dependency, {'failures': 0, 'opened_at': None, 'trial_in_flight': False})
+
+def before_call(dependency):
+    """
+    Fails fast while the dependency's breaker is open; after the cooldown,
+    lets a single trial call through (half-open)
+    """
+    breaker = get_breaker(dependency)
+    with _breaker_lock:
+        if breaker['opened_at'] is None:
+            return
+        if time.time() - breaker['opened_at'] < BREAKER_COOLDOWN_SECONDS or breaker['trial_in_flight']:
+            raise CircuitOpenError(f"{dependency} circuit is open after repeated throttling; failing fast")
+        breaker['trial_in_flight'] = True
+
+def record_success(dependency):
+    """
+    Closes the dependency's breaker
+    """
+    breaker = get_breaker(dependency)
+    with _breaker_lock:
+        breaker['failures'] = 0
+        breaker['opened_at'] = None
+        breaker['trial_in_flight'] = False
+
+def record_failure(dependency, error):
+    """
+    Counts consecutive throttling failures and opens the breaker at the threshold
+    """
+    breaker = get_breaker(dependency)
+    with _breaker_lock:
+        breaker['trial_in_flight'] = False
+        if not is_throttle(error):
+            return
+        breaker['failures'] += 1
+        if breaker['failures'] >= BREAKER_THRESHOLD or breaker['opened_at'] is not None:
+            breaker['opened_at'] = time.time()
+            print(f"Circuit opened for {dependency} after {breaker['failures']} throttled calls")
+
+def emit_metric(name, dependency, operation, value=1):
+    """
+    Emits a CloudWatch embedded-format metric through the function log
+    """
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Dependency', 'Operation']],
+                'Metrics': [{'Name': name, 'Unit': 'Count'}]
+            }]
+        },
+        'Dependency': dependency,
+        'Operation': operation,
+        name: value
+    }))
+
+def call(dependency, operation, fn, *args, **kwargs):
+    """
+    Calls fn(*args, **kwargs) under the retry policy for `dependency` ('iam', 'dynamodb', 'bedrock').
+    Non-retryable errors are raised immediately; retryable ones are retried with
+    decorrelated jitter until MAX_ATTEMPTS, or until the backoff plus the expected
+    duration of the next attempt no longer fits before the invocation deadline.
+    """
+    delay = BASE_DELAY
+    attempt = 1
+
+    while True:
+        before_call(dependency)
+        started = time.time()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            record_failure(dependency, e)
+            if not is_retryable(e) or attempt >= MAX_ATTEMPTS:
+                raise
+
+            delay = min(MAX_DELAY, random.uniform(BASE_DELAY, delay * 3))
+            # A timed-out attempt is likely to take as long again
+            cost = max(attempt_cost(dependency), time.time() - started)
+            remaining = remaining_seconds()
+            if remaining is not None and delay + cost >= remaining:
+                print(f"{dependency}.{operation}: not retrying, {remaining:.2f}s left before deadline "
+                      f"(backoff {delay:.2f}s + attempt ~{cost:.1f}s)")
+                emit_metric('RetryDeadlineExceeded', dependency, operation)
+                raise
+
+            print(f"{dependency}.{operation}: retry {attempt}/{MAX_ATTEMPTS - 1} in {delay:.2f}s ({error_code(e) or type(e).__name__})")
+            emit_metric('Retries', dependency, operation)
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        record_success(dependency)
+        return result
+
+def put_items(table, items):
+    """
+    Writes items to a DynamoDB table with batch_write_item (25 per call) under the retry
+    policy. Unprocessed items are resent with the same backoff, breaker and deadline checks;
+    raises when they still cannot be written.
+    """
+    for start in range(0, len(items), 25):
+        pending = [{'PutRequest': {'Item': item}} for item in items[start:start + 25]]
+
+        def write():
+            nonlocal pending
+            response = table.meta.client.batch_write_item(RequestItems={table.name: pending})
+            unprocessed = response.get('UnprocessedItems', {}).get(table.name)
+            if unprocessed:
+                pending = unprocessed
+                raise UnprocessedItemsError(f"{len(unprocessed)} items unprocessed by {table.name}")
+
+        call('dynamodb', 'batch_write_item', write)
+
+def get_items(table, keys, projection=None):
+    """
+    Reads items from a DynamoDB table with batch_get_item (100 distinct keys per call) under
+    the retry policy. Unprocessed keys are requested again with the same backoff, breaker and
+    deadline checks; raises when they still cannot be read. Returns the items found.
+    """
+    items = []
+    for start in range(0, len(keys), 100):
+        pending = {'Keys': keys[start:start + 100]}
+        if projection:
+            pending['ProjectionExpression'] = projection
+
+        def read():
+            nonlocal pending
+            response = table.meta.client.batch_get_item(RequestItems={table.name: pending})
+            items.extend(response.get('Responses', {}).get(table.name, []))
+            unprocessed = response.get('UnprocessedKeys', {}).get(table.name)
+            if unprocessed:
+                pending = unprocessed
+                raise UnprocessedItemsError(f"{len(unprocessed['Keys'])} keys unprocessed by {table.name}")
+
+        call('dynamodb', 'batch_get_item', read)
+    return items
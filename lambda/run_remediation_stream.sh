@@ -0,0 +1,3 @@
+#!/bin/sh
+# Startup script of the remediation-stream function (Lambda Web Adapter)
+exec python3 remediation_stream_server.py
@@ -0,0 +1,203 @@
+import base64
+import json
+import functools
+import os
+import threading
+import time
+import uuid
+
+import aws_clients
+import retry_policy
+import session_metrics
+import session_payloads
+
+# Session logger for the AI lambdas.
+# Handlers add session records to a per-container buffer; flush(context) hands them to the
+# msp-agent-session-log SQS queue (SESSION_LOG_QUEUE_URL, up to 10 per send_message_batch).
+# session_writer_lambda writes them to msp-agent-sessions off the request path, and
+# session_metrics_stream_lambda maintains the rollup counters from the table's stream.
+# Payloads are compressed (and offloaded when large) before sending, as they are stored.
+# Records that cannot be handed off are printed in full to CloudWatch and counted.
+#
+# Without SESSION_LOG_QUEUE_URL (local testing) records are written to the table directly
+# and the counters are updated inline.
+SESSIONS_TABLE = os.environ.get('SESSIONS_TABLE', 'msp-agent-sessions')
+SESSION_LOG_QUEUE_URL = os.environ.get('SESSION_LOG_QUEUE_URL', '')
+# The queue lives in the lambdas' region, next to session_writer_lambda
+SESSION_LOG_QUEUE_REGION = os.environ.get('SESSION_LOG_QUEUE_REGION', 'us-east-2')
+# SQS limits: 10 messages and 256 KB per send_message_batch
+BATCH_SIZE = 10
+MAX_BATCH_BYTES = 256 * 1024
+BINARY_MARKER = '__binary__'
+
+sessions_table = aws_clients.lazy_table(SESSIONS_TABLE, 'us-east-1')
+sqs = aws_clients.lazy_client('sqs', SESSION_LOG_QUEUE_REGION)
+
+_buffer = []
+_buffer_lock = threading.Lock()
+_stats_lock = threading.Lock()
+stats = {
+    'logged': 0,
+    'sent': 0,
+    'written': 0,
+    'failed': 0
+}
+
+def count(name, amount=1):
+    """
+    Increments a logger statistic
+    """
+    with _stats_lock:
+        stats[name] += amount
+
+def get_stats():
+    """
+    Returns a snapshot of the logger statistics for this container
+    """
+    with _stats_lock:
+        return dict(stats, buffered=len(_buffer))
+
+def log_session(module, status, session_id=None, timestamp=None, payloads=None, processing_time=0, extra=None):
+    """
+    Buffers a session record until the next flush and returns its session id.
+    A full batch is sent right away, so the buffer never holds more than BATCH_SIZE records.
+    """
+    record = {
+        'module': module,
+        'status': status,
+        'session_id': session_id or str(uuid.uuid4()),
+        'timestamp': int(timestamp or time.time()),
+        'payloads': payloads or {},
+        'processing_time': int(processing_time or 0),
+        'extra': extra or {}
+    }
+    count('logged')
+
+    batch = None
+    with _buffer_lock:
+        _buffer.append(record)
+        if len(_buffer) >= BATCH_SIZE:
+            batch = _buffer[:]
+            del _buffer[:]
+    if batch:
+        write_batch(batch)
+    return record['session_id']
+
+def build_item(record):
+    """
+    Builds the msp-agent-sessions item for a buffered record
+    """
+    item = {
+        'session_id': record['session_id'],
+        'timestamp': record['timestamp'],
+        'module': record['module'],
+        'processing_time': record['processing_time'],
+        'status': record['status']
+    }
+    item.update(record['extra'])
+    item.update(session_payloads.encode_payloads(record['session_id'], record['payloads']))
+    return item
+
+def encode_message(item):
+    """
+    Serializes a sessions item as an SQS message body; Binary attributes are base64-encoded
+    """
+    def default(value):
+        if isinstance(value, (bytes, bytearray)):
+            return {BINARY_MARKER: base64.b64encode(bytes(value)).decode('ascii')}
+        raise TypeError(f"Cannot encode {type(value).__name__} in a session message")
+    return json.dumps(item, default=default, separators=(',', ':'))
+
+def decode_message(body):
+    """
+    Rebuilds the sessions item of a message produced by encode_message
+    """
+    def hook(value):
+        if len(value) == 1 and BINARY_MARKER in value:
+            return base64.b64decode(value[BINARY_MARKER])
+        return value
+    return json.loads(body, object_hook=hook)
+
+class MessageGroup(list):
+    """
+    Message bodies sent in one send_message_batch call, with their total size
+    """
+    size = 0
+
+def send_messages(bodies):
+    """
+    Sends message bodies with send_message_batch under the retry policy, grouped by the
+    SQS count and size limits. Entries SQS reports as failed are resent.
+    """
+    groups = []
+    for body in bodies:
+        size = len(body.encode('utf-8'))
+        if not groups or len(groups[-1]) >= BATCH_SIZE or groups[-1].size + size > MAX_BATCH_BYTES:
+            groups.append(MessageGroup())
+        groups[-1].append(body)
+        groups[-1].size += size
+
+    for group in groups:
+        pending = [{'Id': str(index), 'MessageBody': body} for index, body in enumerate(group)]
+
+        def send():
+            nonlocal pending
+            response = sqs.send_message_batch(QueueUrl=SESSION_LOG_QUEUE_URL, Entries=pending)
+            failed = {entry['Id'] for entry in response.get('Failed', [])}
+            if failed:
+                pending = [entry for entry in pending if entry['Id'] in failed]
+                raise retry_policy.UnprocessedItemsError(f"{len(failed)} session messages not sent")
+
+        retry_policy.call('sqs', 'send_message_batch', send)
+
+def write_batch(records):
+    """
+    Hands a batch of records to the session log queue (or, without a queue, writes them
+    and updates the rollup counters). Records that cannot be handed off are logged in
+    full and counted as failed. Returns True when the batch was handed off.
+    """
+    try:
+        items = [build_item(record) for record in records]
+        if SESSION_LOG_QUEUE_URL:
+            send_messages([encode_message(item) for item in items])
+            count('sent', len(records))
+        else:
+            retry_policy.put_items(sessions_table, items)
+            count('written', len(records))
+            session_metrics.record_sessions(records)
+        return True
+    except Exception as e:
+        count('failed', len(records))
+        print(f"Session log write error: {str(e)}")
+        for record in records:
+            print(f"Unwritten session: {json.dumps(record, default=str)}")
+        session_metrics.record_counter('session-logger#all', 'failed', len(records))
+        return False
+
+def flush(context=None):
+    """
+    Hands off every buffered record. Retries stop before the invocation deadline the
+    handler passed to retry_policy.start_invocation; records still unsent then are printed
+    in full by write_batch. Returns True when every record was handed off.
+    """
+    with _buffer_lock:
+        records = _buffer[:]
+        del _buffer[:]
+
+    written = True
+    for start in range(0, len(records), BATCH_SIZE):
+        written = write_batch(records[start:start + BATCH_SIZE]) and written
+    return written
+
+def flush_after(handler):
+    """
+    Decorates a lambda_handler so buffered session logs are handed off before it returns
+    """
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        try:
+            return handler(event, context)
+        finally:
+            flush(context)
+            print(f"Session logger stats: {json.dumps(get_stats())}")
+    return wrapper
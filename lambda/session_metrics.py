@@ -0,0 +1,154 @@
+import os
+import time
+from datetime import datetime
+
+import aws_clients
+import retry_policy
+
+# Pre-aggregated session counters maintained with atomic UpdateItem ADD by
+# session_metrics_stream_lambda (from the msp-agent-sessions stream), so the monitoring
+# endpoint reads a fixed set of items instead of scanning msp-agent-sessions.
+METRICS_TABLE = os.environ.get('SESSION_METRICS_TABLE', 'msp-agent-metrics')
+
+MODULES = ['alert-triage', 'patch-assessment', 'remediation-script']
+
+# Hour buckets are only needed for the recent-activity view
+HOUR_BUCKET_TTL_SECONDS = 8 * 24 * 3600
+DAY_BUCKET_TTL_SECONDS = 400 * 24 * 3600
+
+metrics_table = aws_clients.lazy_table(METRICS_TABLE, 'us-east-1')
+
+def hour_bucket(timestamp):
+    """
+    Returns the hour bucket id (UTC, YYYYMMDDHH) for a unix timestamp
+    """
+    return datetime.utcfromtimestamp(timestamp).strftime('%Y%m%d%H')
+
+def day_bucket(timestamp):
+    """
+    Returns the day bucket id (UTC, YYYYMMDD) for a unix timestamp
+    """
+    return datetime.utcfromtimestamp(timestamp).strftime('%Y%m%d')
+
+def metric_key(module, period='all', bucket=None):
+    """
+    Builds the counter item key, e.g. "alert-triage#all" or "alert-triage#hour#2025110118"
+    """
+    if period == 'all':
+        return f"{module}#all"
+    return f"{module}#{period}#{bucket}"
+
+def record_session(module, status, processing_time=0, timestamp=None):
+    """
+    Adds one session to the module's all-time, hour and day counters (best effort)
+    """
+    record_sessions([{'module': module, 'status': status, 'processing_time': processing_time, 'timestamp': timestamp}])
+
+def record_sessions(sessions):
+    """
+    Adds sessions ({module, status, processing_time, timestamp}) to their modules'
+    all-time, hour and day counters with one update per counter item (best effort)
+    """
+    totals = {}
+    for session in sessions:
+        module = session.get('module') or 'unknown'
+        timestamp = int(session.get('timestamp') or time.time())
+        success = 1 if session.get('status') == 'success' else 0
+        counters = [
+            (metric_key(module), None),
+            (metric_key(module, 'hour', hour_bucket(timestamp)), timestamp + HOUR_BUCKET_TTL_SECONDS),
+            (metric_key(module, 'day', day_bucket(timestamp)), timestamp + DAY_BUCKET_TTL_SECONDS)
+        ]
+        for key, expires_at in counters:
+            total = totals.setdefault(key, {'module': module, 'expires_at': expires_at, 'total': 0,
+                                            'success': 0, 'error': 0, 'processing_time': 0})
+            total['total'] += 1
+            total['success'] += success
+            total['error'] += 1 - success
+            total['processing_time'] += int(session.get('processing_time') or 0)
+
+    for key, total in totals.items():
+        update_expression = 'ADD #total :total, #success :success, #error :error, total_processing_time :processing_time SET #module = :module'
+        values = {
+            ':total': total['total'],
+            ':success': total['success'],
+            ':error': total['error'],
+            ':processing_time': total['processing_time'],
+            ':module': total['module']
+        }
+        if total['expires_at']:
+            update_expression += ', expires_at = if_not_exists(expires_at, :expires_at)'
+            values[':expires_at'] = total['expires_at']
+
+        try:
+            metrics_table.update_item(
+                Key={'metric_key': key},
+                UpdateExpression=update_expression,
+                ExpressionAttributeNames={
+                    '#total': 'total',
+                    '#success': 'success',
+                    '#error': 'error',
+                    '#module': 'module'
+                },
+                ExpressionAttributeValues=values
+            )
+        except Exception as e:
+            print(f"Metrics update error ({key}): {str(e)}")
+
+def record_counter(key, field, amount=1):
+    """
+    Adds to a single named counter, e.g. session logger drops and failures (best effort)
+    """
+    try:
+        metrics_table.update_item(
+            Key={'metric_key': key},
+            UpdateExpression='ADD #field :amount',
+            ExpressionAttributeNames={'#field': field},
+            ExpressionAttributeValues={':amount': int(amount)}
+        )
+    except Exception as e:
+        print(f"Metrics update error ({key}): {str(e)}")
+
+def get_counter_keys(now=None, hours=24, days=7):
+    """
+    Returns the counter keys read by the monitoring endpoint:
+    all-time totals plus the last `hours` hour buckets and `days` day buckets per module
+    """
+    now = int(now or time.time())
+    hour_ids = [hour_bucket(now - i * 3600) for i in range(hours)]
+    day_ids = [day_bucket(now - i * 86400) for i in range(days)]
+
+    keys = []
+    for module in MODULES:
+        keys.append(metric_key(module))
+        keys.extend(metric_key(module, 'hour', bucket) for bucket in hour_ids)
+        keys.extend(metric_key(module, 'day', bucket) for bucket in day_ids)
+    return keys
+
+def read_counters(keys):
+    """
+    Reads counter items with retry_policy.get_items.
+    Returns a dict of metric_key -> item.
+    """
+    items = retry_policy.get_items(metrics_table, [{'metric_key': key} for key in keys])
+    return {item['metric_key']: item for item in items}
+
+def backfill_from_sessions(sessions_table):
+    """
+    One-off backfill: scans msp-agent-sessions page by page and adds every
+    existing session to the counters. Run once, before the counters go live.
+    """
+    count = 0
+    scan_kwargs = {'ProjectionExpression': '#module, #status, processing_time, #ts',
+                   'ExpressionAttributeNames': {'#module': 'module', '#status': 'status', '#ts': 'timestamp'}}
+    while True:
+        response = sessions_table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            record_session(item.get('module', 'unknown'), item.get('status', 'error'),
+                           item.get('processing_time', 0), int(item.get('timestamp', 0)) or None)
+            count += 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    print(f"Backfilled {count} sessions into {METRICS_TABLE}")
+    return count
@@ -0,0 +1,28 @@
+from boto3.dynamodb.types import TypeDeserializer
+
+import aws_clients
+import session_metrics
+
+deserializer = TypeDeserializer()
+
+# Session attributes the counters need; payload attributes in the stream image are skipped
+COUNTER_FIELDS = ('module', 'status', 'processing_time', 'timestamp')
+
+@aws_clients.measure_init('session-metrics-stream')
+def lambda_handler(event, context):
+    """
+    Session Metrics Stream Lambda - Maintains the msp-agent-metrics counters from the
+    msp-agent-sessions stream (NEW_IMAGE). Only INSERT events count: a session rewritten
+    by a redelivered message arrives as MODIFY and is not counted twice.
+    """
+    sessions = []
+    for record in event.get('Records', []):
+        if record.get('eventName') != 'INSERT':
+            continue
+        image = record.get('dynamodb', {}).get('NewImage', {})
+        sessions.append({field: deserializer.deserialize(image[field]) for field in COUNTER_FIELDS if field in image})
+
+    if sessions:
+        session_metrics.record_sessions(sessions)
+        print(f"Counted {len(sessions)} sessions")
+    return {'counted': len(sessions)}
@@ -0,0 +1,123 @@
+import json
+import hashlib
+import os
+import zlib
+from urllib.parse import urlparse
+
+import aws_clients
+
+# Storage layer for the request/response payloads in msp-agent-sessions.
+# Payloads are zlib-compressed into a Binary attribute (<field>_z); anything
+# whose compressed size exceeds PAYLOAD_OFFLOAD_BYTES is moved to the blob store
+# and the item keeps only a pointer (<field>_ref) plus the digest.
+#
+# PAYLOAD_STORE selects the blob store:
+#   s3://bucket/prefix      - Amazon S3
+#   file:///tmp/payloads    - local filesystem (testing)
+PAYLOAD_STORE = os.environ.get('PAYLOAD_STORE', 's3://msp-agent-session-payloads/sessions')
+PAYLOAD_OFFLOAD_BYTES = int(os.environ.get('PAYLOAD_OFFLOAD_BYTES', str(64 * 1024)))
+COMPRESSION_LEVEL = 6
+
+s3 = aws_clients.lazy_client('s3', 'us-east-1')
+
+def blob_location(key):
+    """
+    Returns the location URL a blob key has in the configured store
+    """
+    store = urlparse(PAYLOAD_STORE)
+    if store.scheme not in ('file', 's3'):
+        raise ValueError(f"Unsupported payload store: {PAYLOAD_STORE}")
+    path = '/'.join(part for part in [store.path.strip('/'), key] if part)
+    if store.scheme == 'file':
+        return f"file:///{path}"
+    return f"s3://{store.netloc}/{path}"
+
+def put_blob(key, data):
+    """
+    Writes a blob to the configured store and returns its location URL
+    """
+    location = blob_location(key)
+    parsed = urlparse(location)
+
+    if parsed.scheme == 'file':
+        os.makedirs(os.path.dirname(parsed.path), exist_ok=True)
+        with open(parsed.path, 'wb') as blob_file:
+            blob_file.write(data)
+        return location
+
+    s3.put_object(Bucket=parsed.netloc, Key=parsed.path.lstrip('/'), Body=data)
+    return location
+
+def get_blob(location):
+    """
+    Reads a blob from the location returned by put_blob
+    """
+    parsed = urlparse(location)
+
+    if parsed.scheme == 'file':
+        with open(parsed.path, 'rb') as blob_file:
+            return blob_file.read()
+
+    if parsed.scheme == 's3':
+        response = s3.get_object(Bucket=parsed.netloc, Key=parsed.path.lstrip('/'))
+        return response['Body'].read()
+
+    raise ValueError(f"Unsupported payload location: {location}")
+
+def encode_payload(session_id, field, value):
+    """
+    Compresses one payload and returns the item attributes that store it
+    """
+    raw = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    compressed = zlib.compress(raw, COMPRESSION_LEVEL)
+    attributes = {
+        f"{field}_digest": hashlib.sha256(raw).hexdigest(),
+        f"{field}_size": len(raw)
+    }
+
+    if len(compressed) > PAYLOAD_OFFLOAD_BYTES:
+        location = put_blob(f"{session_id}/{field}.json.z", compressed)
+        attributes[f"{field}_ref"] = location
+        print(f"Offloaded {field} payload ({len(compressed)} bytes compressed) to {location}")
+    else:
+        attributes[f"{field}_z"] = compressed
+
+    return attributes
+
+def encode_payloads(session_id, payloads):
+    """
+    Encodes several payloads, e.g. {'request': ..., 'response': ...}, into item attributes
+    """
+    attributes = {}
+    for field, value in payloads.items():
+        attributes.update(encode_payload(session_id, field, value))
+    return attributes
+
+def load_payload(item, field):
+    """
+    Decodes a payload from a session item, fetching and decompressing it only now.
+    Supports legacy items that hold the payload as a plain JSON string.
+    """
+    if f"{field}_z" in item:
+        data = item[f"{field}_z"]
+        # boto3 returns Binary attributes wrapped in boto3.dynamodb.types.Binary
+        data = getattr(data, 'value', data)
+        raw = zlib.decompress(bytes(data))
+    elif f"{field}_ref" in item:
+        raw = zlib.decompress(get_blob(item[f"{field}_ref"]))
+    elif field in item:
+        return json.loads(item[field])
+    else:
+        return None
+
+    digest = item.get(f"{field}_digest")
+    if digest and hashlib.sha256(raw).hexdigest() != digest:
+        raise ValueError(f"Digest mismatch for {field} payload")
+
+    return json.loads(raw)
+
+def payload_attribute_names(field):
+    """
+    Returns every attribute name a payload field may be stored under
+    """
+    return [field, f"{field}_z", f"{field}_ref", f"{field}_digest"]
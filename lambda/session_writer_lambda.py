@@ -0,0 +1,39 @@
+import json
+
+import aws_clients
+import retry_policy
+import session_logger
+import session_metrics
+
+@aws_clients.measure_init('session-writer')
+def lambda_handler(event, context):
+    """
+    Session Writer Lambda - Writes the session records the AI lambdas queue on the
+    msp-agent-session-log SQS queue to msp-agent-sessions, off their request path.
+    Returns the SQS partial batch response: messages that could not be written are
+    redelivered and end up in the dead-letter queue after the queue's maxReceiveCount.
+    """
+    retry_policy.start_invocation(context)
+    items = []
+    failures = []
+    for record in event.get('Records', []):
+        try:
+            items.append((record['messageId'], session_logger.decode_message(record['body'])))
+        except ValueError as e:
+            # Malformed messages are logged in full and left to the dead-letter queue
+            print(f"Invalid session message {record.get('messageId')}: {str(e)} {record.get('body')}")
+            failures.append({'itemIdentifier': record.get('messageId')})
+
+    if items:
+        try:
+            # Puts are keyed by session_id + timestamp, so a redelivered message rewrites the same item
+            retry_policy.put_items(session_logger.sessions_table, [item for _, item in items])
+            print(f"Wrote {len(items)} sessions")
+        except Exception as e:
+            print(f"Session write error: {str(e)}")
+            for message_id, item in items:
+                print(f"Unwritten session {message_id}: {item['module']} {item['session_id']} {item['status']}")
+                failures.append({'itemIdentifier': message_id})
+            session_metrics.record_counter('session-logger#all', 'failed', len(items))
+
+    return {'batchItemFailures': failures}
@@ -0,0 +1,39 @@
+# Package the AI agent lambdas together with their shared modules
+
+$sharedModules = @(
+  "lambda/aws_clients.py",
+  "lambda/bedrock_cache.py",
+  "lambda/model_gateway.py",
+  "lambda/model_output.py",
+  "lambda/model_router.py",
+  "lambda/job_queue.py",
+  "lambda/prompt_builder.py",
+  "lambda/session_metrics.py",
+  "lambda/session_payloads.py",
+  "lambda/session_logger.py",
+  "lambda/retry_policy.py"
+)
+
+$handlers = @{
+  "alert_triage"       = @("lambda/alert_triage_lambda.py", "lambda/alert_batcher.py", "lambda/alert_state.py")
+  "patch_assessment"   = @("lambda/patch_assessment_lambda.py", "lambda/patch_scheduler.py", "lambda/patch_cache.py")
+  "remediation_script" = @("lambda/remediation_script_lambda.py", "lambda/remediation_index.py")
+  "monitoring"         = "lambda/monitoring_lambda.py"
+  "job_api"            = "lambda/job_api_lambda.py"
+  "session_writer"     = "lambda/session_writer_lambda.py"
+  "remediation_snapshot" = @("lambda/remediation_snapshot_lambda.py", "lambda/remediation_index.py")
+  "session_metrics_stream" = "lambda/session_metrics_stream_lambda.py"
+  # The worker runs every module's lambda_handler
+  "job_worker"         = @("lambda/job_worker_lambda.py", "lambda/alert_triage_lambda.py", "lambda/alert_batcher.py",
+                           "lambda/alert_state.py",
+                           "lambda/patch_assessment_lambda.py", "lambda/patch_scheduler.py", "lambda/patch_cache.py",
+                           "lambda/remediation_script_lambda.py", "lambda/remediation_index.py")
+}
+
+foreach ($name in $handlers.Keys) {
+    Write-Host "Packaging $name..." -ForegroundColor Cyan
+    Compress-Archive -Path (@($handlers[$name]) + $sharedModules) -DestinationPath "lambda/$name.zip" -Force
+    Write-Host "Lambda package created: lambda/$name.zip" -ForegroundColor Green
+}
+
+Write-Host "`n✅ All AI lambda packages created!" -ForegroundColor Green
@@ -25,6 +25,18 @@ aws dynamodb create-table `
 
 Write-Host "AuditLog table creation initiated..." -ForegroundColor Green
 
+Write-Host "`nCreating IdempotencyKeys table..." -ForegroundColor Cyan
+
+aws dynamodb create-table `
+  --table-name IdempotencyKeys `
+  --attribute-definitions AttributeName=idempotency_key,AttributeType=S `
+  --key-schema AttributeName=idempotency_key,KeyType=HASH `
+  --billing-mode PAY_PER_REQUEST `
+  --sse-specification Enabled=true `
+  --region us-east-2
+
+Write-Host "IdempotencyKeys table creation initiated..." -ForegroundColor Green
+
 Write-Host "`nWaiting for tables to become active..." -ForegroundColor Yellow
 Start-Sleep -Seconds 10
 
@@ -34,7 +46,12 @@ aws dynamodb describe-table --table-name Employees --region us-east-2 --query "T
 Write-Host "`nChecking AuditLog table status..." -ForegroundColor Cyan
 aws dynamodb describe-table --table-name AuditLog --region us-east-2 --query "Table.TableStatus"
 
+Write-Host "`nEnabling TTL on IdempotencyKeys (expires_at)..." -ForegroundColor Cyan
+aws dynamodb wait table-exists --table-name IdempotencyKeys --region us-east-2
+aws dynamodb update-time-to-live --table-name IdempotencyKeys --time-to-live-specification "Enabled=true,AttributeName=expires_at" --region us-east-2
+
 Write-Host "`n✅ DynamoDB tables setup complete!" -ForegroundColor Green
 Write-Host "Tables created:" -ForegroundColor White
 Write-Host "  - Employees (with manager_id-index GSI)" -ForegroundColor White
 Write-Host "  - AuditLog" -ForegroundColor White
+Write-Host "  - IdempotencyKeys (TTL on expires_at)" -ForegroundColor White
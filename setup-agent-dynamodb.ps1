@@ -0,0 +1,58 @@
+# Setup DynamoDB tables used by the AI agent lambdas
+
+Write-Host "Creating Bedrock response cache table..." -ForegroundColor Cyan
+
+aws dynamodb create-table `
+  --table-name msp-bedrock-cache `
+  --attribute-definitions AttributeName=cache_key,AttributeType=S `
+  --key-schema AttributeName=cache_key,KeyType=HASH `
+  --billing-mode PAY_PER_REQUEST `
+  --sse-specification Enabled=true `
+  --region us-east-1
+
+Write-Host "msp-bedrock-cache table creation initiated..." -ForegroundColor Green
+
+Write-Host "`nCreating session metrics table..." -ForegroundColor Cyan
+
+aws dynamodb create-table `
+  --table-name msp-agent-metrics `
+  --attribute-definitions AttributeName=metric_key,AttributeType=S `
+  --key-schema AttributeName=metric_key,KeyType=HASH `
+  --billing-mode PAY_PER_REQUEST `
+  --sse-specification Enabled=true `
+  --region us-east-1
+
+Write-Host "msp-agent-metrics table creation initiated..." -ForegroundColor Green
+
+Write-Host "`nAdding module+timestamp index to msp-agent-sessions..." -ForegroundColor Cyan
+
+aws dynamodb update-table `
+  --table-name msp-agent-sessions `
+  --attribute-definitions AttributeName=module,AttributeType=S AttributeName=timestamp,AttributeType=N `
+  --global-secondary-index-updates "Create={IndexName=module-timestamp-index,KeySchema=[{AttributeName=module,KeyType=HASH},{AttributeName=timestamp,KeyType=RANGE}],Projection={ProjectionType=INCLUDE,NonKeyAttributes=[status,processing_time]}}" `
+  --region us-east-1
+
+Write-Host "module-timestamp-index creation initiated..." -ForegroundColor Green
+
+Write-Host "`nWaiting for tables to become active..." -ForegroundColor Yellow
+aws dynamodb wait table-exists --table-name msp-bedrock-cache --region us-east-1
+aws dynamodb wait table-exists --table-name msp-agent-metrics --region us-east-1
+
+Write-Host "`nEnabling TTL on msp-bedrock-cache..." -ForegroundColor Cyan
+aws dynamodb update-time-to-live `
+  --table-name msp-bedrock-cache `
+  --time-to-live-specification "Enabled=true,AttributeName=expires_at" `
+  --region us-east-1
+
+Write-Host "`nEnabling TTL on msp-agent-metrics (hour/day buckets)..." -ForegroundColor Cyan
+aws dynamodb update-time-to-live `
+  --table-name msp-agent-metrics `
+  --time-to-live-specification "Enabled=true,AttributeName=expires_at" `
+  --region us-east-1
+
+Write-Host "`n✅ Agent DynamoDB tables setup complete!" -ForegroundColor Green
+Write-Host "Tables created:" -ForegroundColor White
+Write-Host "  - msp-bedrock-cache (TTL on expires_at)" -ForegroundColor White
+Write-Host "  - msp-agent-metrics (session counters, TTL on expires_at)" -ForegroundColor White
+Write-Host "Indexes created:" -ForegroundColor White
+Write-Host "  - msp-agent-sessions/module-timestamp-index" -ForegroundColor White
@@ -0,0 +1,21 @@
+# Setup S3 storage for offloaded session payloads
+
+$BUCKET = "msp-agent-session-payloads"
+
+Write-Host "Creating session payload bucket..." -ForegroundColor Cyan
+
+aws s3api create-bucket `
+  --bucket $BUCKET `
+  --region us-east-1
+
+aws s3api put-bucket-encryption `
+  --bucket $BUCKET `
+  --server-side-encryption-configuration '{\"Rules\":[{\"ApplyServerSideEncryptionByDefault\":{\"SSEAlgorithm\":\"AES256\"}}]}'
+
+aws s3api put-public-access-block `
+  --bucket $BUCKET `
+  --public-access-block-configuration "BlockPublicAcls=true,IgnorePublicAcls=true,BlockPublicPolicy=true,RestrictPublicBuckets=true"
+
+Write-Host "`n✅ Session payload storage setup complete!" -ForegroundColor Green
+Write-Host "Bucket created: $BUCKET" -ForegroundColor White
+Write-Host "Lambdas read the location from PAYLOAD_STORE (default s3://$BUCKET/sessions)" -ForegroundColor White
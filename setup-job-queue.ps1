@@ -0,0 +1,149 @@
+# Setup the asynchronous job API: jobs table, SQS queue, worker trigger and /jobs routes
+$API_ID = "riwjcf68nb"
+$ROOT_ID = "adypg6dnsj"
+$REGION = "us-east-1"
+$LAMBDA_REGION = "us-east-2"
+$ACCOUNT_ID = "063088900393"
+
+Write-Host "Creating jobs table..." -ForegroundColor Cyan
+
+aws dynamodb create-table `
+  --table-name msp-agent-jobs `
+  --attribute-definitions AttributeName=job_id,AttributeType=S `
+  --key-schema AttributeName=job_id,KeyType=HASH `
+  --billing-mode PAY_PER_REQUEST `
+  --sse-specification Enabled=true `
+  --region $REGION
+
+aws dynamodb wait table-exists --table-name msp-agent-jobs --region $REGION
+
+aws dynamodb update-time-to-live `
+  --table-name msp-agent-jobs `
+  --time-to-live-specification "Enabled=true,AttributeName=expires_at" `
+  --region $REGION
+
+Write-Host "msp-agent-jobs table created (TTL on expires_at)" -ForegroundColor Green
+
+# Visibility timeout above the worker's 900 s timeout so a running job is not redelivered
+Write-Host "`nCreating job queue..." -ForegroundColor Cyan
+$queue = aws sqs create-queue `
+  --queue-name msp-agent-jobs `
+  --attributes "VisibilityTimeout=960,MessageRetentionPeriod=86400,SqsManagedSseEnabled=true" `
+  --region $LAMBDA_REGION --output json | ConvertFrom-Json
+$QUEUE_URL = $queue.QueueUrl
+Write-Host "Queue URL: $QUEUE_URL" -ForegroundColor Green
+
+$QUEUE_ARN = "arn:aws:sqs:${LAMBDA_REGION}:${ACCOUNT_ID}:msp-agent-jobs"
+
+# Returns a function's environment variables as a hashtable (empty if it has none)
+function Get-FunctionEnvironment($functionName) {
+    $variables = @{}
+    $config = aws lambda get-function-configuration --function-name $functionName --region $LAMBDA_REGION --output json | ConvertFrom-Json
+    if ($config.Environment -and $config.Environment.Variables) {
+        foreach ($property in $config.Environment.Variables.PSObject.Properties) {
+            $variables[$property.Name] = $property.Value
+        }
+    }
+    return $variables
+}
+
+# Writes an environment as a file:// argument; --environment replaces every variable,
+# so callers always pass the merged set
+function Write-EnvironmentFile($variables) {
+    $envFile = [System.IO.Path]::GetTempFileName()
+    @{ Variables = $variables } | ConvertTo-Json -Compress | Set-Content -Path $envFile -Encoding ascii
+    return $envFile
+}
+
+# Creates the function if it does not exist yet (environment and role copied from
+# alert-triage, since the worker runs every module handler), otherwise adds the queue
+# URL to its existing environment
+function Set-JobFunction($functionName, $package, $handler, $timeout) {
+    aws lambda get-function --function-name $functionName --region $LAMBDA_REGION --output json 2>&1 | Out-Null
+    if ($LASTEXITCODE -ne 0) {
+        Write-Host "Creating $functionName function..." -ForegroundColor Cyan
+        $variables = Get-FunctionEnvironment "alert-triage"
+        $variables["JOB_QUEUE_URL"] = $QUEUE_URL
+        $envFile = Write-EnvironmentFile $variables
+        $roleArn = aws lambda get-function-configuration --function-name alert-triage --region $LAMBDA_REGION --query "Role" --output text
+        aws lambda create-function `
+          --function-name $functionName `
+          --runtime python3.11 `
+          --role $roleArn `
+          --handler $handler `
+          --zip-file "fileb://lambda/$package.zip" `
+          --timeout $timeout `
+          --memory-size 512 `
+          --environment "file://$envFile" `
+          --region $LAMBDA_REGION --output json | Out-Null
+        aws lambda wait function-active-v2 --function-name $functionName --region $LAMBDA_REGION
+    } else {
+        Write-Host "Updating $functionName configuration..." -ForegroundColor Cyan
+        $variables = Get-FunctionEnvironment $functionName
+        $variables["JOB_QUEUE_URL"] = $QUEUE_URL
+        $envFile = Write-EnvironmentFile $variables
+        aws lambda update-function-configuration `
+          --function-name $functionName `
+          --timeout $timeout `
+          --environment "file://$envFile" `
+          --region $LAMBDA_REGION --output json | Out-Null
+        aws lambda wait function-updated-v2 --function-name $functionName --region $LAMBDA_REGION
+    }
+    Remove-Item $envFile
+}
+
+if (-not (Test-Path "lambda/job_worker.zip") -or -not (Test-Path "lambda/job_api.zip")) {
+    Write-Host "`nPackaging the AI lambdas..." -ForegroundColor Cyan
+    & "$PSScriptRoot/package-ai-lambdas.ps1"
+}
+
+Write-Host "`nConnecting the queue to the job lambdas..." -ForegroundColor Cyan
+Set-JobFunction "job-worker" "job_worker" "job_worker_lambda.lambda_handler" 900
+Set-JobFunction "job-api" "job_api" "job_api_lambda.lambda_handler" 30
+
+$mappings = aws lambda list-event-source-mappings --function-name job-worker --event-source-arn $QUEUE_ARN --region $LAMBDA_REGION --query "EventSourceMappings" --output json | ConvertFrom-Json
+if (-not $mappings) {
+    aws lambda create-event-source-mapping `
+      --function-name job-worker `
+      --event-source-arn $QUEUE_ARN `
+      --batch-size 1 `
+      --function-response-types ReportBatchItemFailures `
+      --region $LAMBDA_REGION --output json | Out-Null
+    Write-Host "Event source mapping created: msp-agent-jobs -> job-worker" -ForegroundColor Green
+} else {
+    Write-Host "Event source mapping already exists" -ForegroundColor Yellow
+}
+
+Write-Host "`nCreating /jobs routes..." -ForegroundColor Cyan
+$jobsResource = aws apigateway create-resource --rest-api-id $API_ID --parent-id $ROOT_ID --path-part jobs --region $REGION --output json | ConvertFrom-Json
+$JOBS_ID = $jobsResource.id
+$jobResource = aws apigateway create-resource --rest-api-id $API_ID --parent-id $JOBS_ID --path-part "{job_id}" --region $REGION --output json | ConvertFrom-Json
+$JOB_ID = $jobResource.id
+
+$LAMBDA_ARN = "arn:aws:lambda:${LAMBDA_REGION}:${ACCOUNT_ID}:function:job-api"
+$URI = "arn:aws:apigateway:${LAMBDA_REGION}:lambda:path/2015-03-31/functions/${LAMBDA_ARN}/invocations"
+
+# POST /jobs submits, GET /jobs/{job_id} polls
+aws apigateway put-method --rest-api-id $API_ID --resource-id $JOBS_ID --http-method POST --authorization-type NONE --region $REGION --output json | Out-Null
+aws apigateway put-integration --rest-api-id $API_ID --resource-id $JOBS_ID --http-method POST --type AWS_PROXY --integration-http-method POST --uri $URI --region $REGION --output json | Out-Null
+aws apigateway put-method --rest-api-id $API_ID --resource-id $JOB_ID --http-method GET --authorization-type NONE --request-parameters "method.request.path.job_id=true" --region $REGION --output json | Out-Null
+aws apigateway put-integration --rest-api-id $API_ID --resource-id $JOB_ID --http-method GET --type AWS_PROXY --integration-http-method POST --uri $URI --region $REGION --output json | Out-Null
+
+aws lambda add-permission --function-name job-api --statement-id apigateway-jobs --action lambda:InvokeFunction --principal apigateway.amazonaws.com --source-arn "arn:aws:execute-api:${REGION}:${ACCOUNT_ID}:${API_ID}/*/*" --region $LAMBDA_REGION 2>&1 | Out-Null
+
+# CORS preflight for both routes
+foreach ($resourceId in @($JOBS_ID, $JOB_ID)) {
+    aws apigateway put-method --rest-api-id $API_ID --resource-id $resourceId --http-method OPTIONS --authorization-type NONE --region $REGION --output json | Out-Null
+    aws apigateway put-method-response --rest-api-id $API_ID --resource-id $resourceId --http-method OPTIONS --status-code 200 --response-parameters "method.response.header.Access-Control-Allow-Headers=true,method.response.header.Access-Control-Allow-Methods=true,method.response.header.Access-Control-Allow-Origin=true" --region $REGION --output json | Out-Null
+    aws apigateway put-integration --rest-api-id $API_ID --resource-id $resourceId --http-method OPTIONS --type MOCK --request-templates '{\"application/json\":\"{\\\"statusCode\\\": 200}\"}' --region $REGION --output json | Out-Null
+    aws apigateway put-integration-response --rest-api-id $API_ID --resource-id $resourceId --http-method OPTIONS --status-code 200 --response-parameters '{\"method.response.header.Access-Control-Allow-Headers\":\"'"'"'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token'"'"'\",\"method.response.header.Access-Control-Allow-Methods\":\"'"'"'GET,POST,OPTIONS'"'"'\",\"method.response.header.Access-Control-Allow-Origin\":\"'"'"'*'"'"'\"}' --region $REGION --output json | Out-Null
+}
+
+aws apigateway create-deployment --rest-api-id $API_ID --stage-name prod --region $REGION --output json | Out-Null
+
+Write-Host "`n✅ Job API setup complete!" -ForegroundColor Green
+Write-Host "  - msp-agent-jobs table (TTL on expires_at)" -ForegroundColor White
+Write-Host "  - msp-agent-jobs queue -> job-worker lambda" -ForegroundColor White
+Write-Host "  - POST /jobs, GET /jobs/{job_id} -> job-api lambda" -ForegroundColor White
+Write-Host "Attach iam-job-queue-policy.json to the AI lambda role" -ForegroundColor Yellow
+Write-Host "Local check without AWS: python test-job-queue-local.py" -ForegroundColor Yellow
@@ -0,0 +1,59 @@
+# Setup the scheduled remediation index snapshot: the remediation-snapshot function rewrites
+# the snapshot in the payload store every few minutes, so cold remediation containers only
+# catch up with the sessions logged since the last run
+$LAMBDA_REGION = "us-east-2"
+$ACCOUNT_ID = "063088900393"
+$FUNCTION_NAME = "remediation-snapshot"
+$RULE_NAME = "remediation-index-snapshot"
+$SCHEDULE = "rate(5 minutes)"
+
+if (-not (Test-Path "lambda/remediation_snapshot.zip")) {
+    Write-Host "Packaging the AI lambdas..." -ForegroundColor Cyan
+    & "$PSScriptRoot/package-ai-lambdas.ps1"
+}
+
+aws lambda get-function --function-name $FUNCTION_NAME --region $LAMBDA_REGION --output json 2>&1 | Out-Null
+if ($LASTEXITCODE -ne 0) {
+    Write-Host "Creating $FUNCTION_NAME function..." -ForegroundColor Cyan
+    # Same role and environment (PAYLOAD_STORE, REMEDIATION_INDEX_*) as remediation-script
+    $config = aws lambda get-function-configuration --function-name remediation-script --region $LAMBDA_REGION --output json | ConvertFrom-Json
+    $variables = @{}
+    if ($config.Environment -and $config.Environment.Variables) {
+        foreach ($property in $config.Environment.Variables.PSObject.Properties) {
+            $variables[$property.Name] = $property.Value
+        }
+    }
+    $envFile = [System.IO.Path]::GetTempFileName()
+    @{ Variables = $variables } | ConvertTo-Json -Compress | Set-Content -Path $envFile -Encoding ascii
+    # The first run builds the snapshot from every remediation session
+    aws lambda create-function `
+      --function-name $FUNCTION_NAME `
+      --runtime python3.11 `
+      --role $config.Role `
+      --handler remediation_snapshot_lambda.lambda_handler `
+      --zip-file fileb://lambda/remediation_snapshot.zip `
+      --timeout 900 `
+      --memory-size 512 `
+      --environment "file://$envFile" `
+      --region $LAMBDA_REGION --output json | Out-Null
+    Remove-Item $envFile
+    aws lambda wait function-active-v2 --function-name $FUNCTION_NAME --region $LAMBDA_REGION
+} else {
+    Write-Host "Updating $FUNCTION_NAME code..." -ForegroundColor Cyan
+    aws lambda update-function-code --function-name $FUNCTION_NAME --zip-file fileb://lambda/remediation_snapshot.zip --region $LAMBDA_REGION --output json | Out-Null
+    aws lambda wait function-updated-v2 --function-name $FUNCTION_NAME --region $LAMBDA_REGION
+}
+
+# One run at a time: overlapping runs are harmless but wasted work
+aws lambda put-function-concurrency --function-name $FUNCTION_NAME --reserved-concurrent-executions 1 --region $LAMBDA_REGION --output json | Out-Null
+
+Write-Host "`nScheduling $FUNCTION_NAME ($SCHEDULE)..." -ForegroundColor Cyan
+$RULE_ARN = aws events put-rule --name $RULE_NAME --schedule-expression $SCHEDULE --region $LAMBDA_REGION --query "RuleArn" --output text
+aws lambda add-permission --function-name $FUNCTION_NAME --statement-id events-snapshot --action lambda:InvokeFunction --principal events.amazonaws.com --source-arn $RULE_ARN --region $LAMBDA_REGION 2>&1 | Out-Null
+aws events put-targets --rule $RULE_NAME --targets "Id=1,Arn=arn:aws:lambda:${LAMBDA_REGION}:${ACCOUNT_ID}:function:${FUNCTION_NAME}" --region $LAMBDA_REGION --output json | Out-Null
+
+Write-Host "`nBuilding the first snapshot..." -ForegroundColor Cyan
+aws lambda invoke --function-name $FUNCTION_NAME --invocation-type Event --region $LAMBDA_REGION "$env:TEMP/remediation-snapshot.json" | Out-Null
+
+Write-Host "`n✅ Remediation index snapshot setup complete!" -ForegroundColor Green
+Write-Host "  - $FUNCTION_NAME lambda, every $SCHEDULE (rule $RULE_NAME)" -ForegroundColor White
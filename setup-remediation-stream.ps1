@@ -0,0 +1,86 @@
+# Setup the remediation-stream function: NDJSON remediation output and NDJSON alert ingest
+# (POST /alerts) streamed through a Function URL
+# API Gateway REST buffers Lambda responses, so streaming goes through the Lambda Web Adapter
+# (response_stream mode) and a Function URL with InvokeMode=RESPONSE_STREAM instead.
+$LAMBDA_REGION = "us-east-2"
+$ACCOUNT_ID = "063088900393"
+$FUNCTION_NAME = "remediation-stream"
+$ADAPTER_LAYER = "arn:aws:lambda:${LAMBDA_REGION}:753240598075:layer:LambdaAdapterLayerX86:25"
+
+Write-Host "Packaging $FUNCTION_NAME..." -ForegroundColor Cyan
+
+# Compress-Archive drops the executable bit the adapter needs on the startup script, so the
+# package is built with Python's zipfile instead
+$files = @(
+  "lambda/run_remediation_stream.sh",
+  "lambda/remediation_stream_server.py",
+  "lambda/remediation_script_lambda.py",
+  "lambda/remediation_index.py",
+  "lambda/alert_triage_lambda.py",
+  "lambda/alert_batcher.py",
+  "lambda/alert_state.py",
+  "lambda/aws_clients.py",
+  "lambda/bedrock_cache.py",
+  "lambda/model_gateway.py",
+  "lambda/model_output.py",
+  "lambda/model_router.py",
+  "lambda/prompt_builder.py",
+  "lambda/session_metrics.py",
+  "lambda/session_payloads.py",
+  "lambda/session_logger.py",
+  "lambda/retry_policy.py"
+)
+$zipScript = @"
+import os, sys, zipfile
+with zipfile.ZipFile('lambda/remediation_stream.zip', 'w', zipfile.ZIP_DEFLATED) as archive:
+    for path in sys.argv[1:]:
+        info = zipfile.ZipInfo(os.path.basename(path))
+        info.external_attr = (0o755 if path.endswith('.sh') else 0o644) << 16
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with open(path, 'rb') as source:
+            archive.writestr(info, source.read())
+"@
+python -c $zipScript @files
+Write-Host "Lambda package created: lambda/remediation_stream.zip" -ForegroundColor Green
+
+# Same execution role as the buffered remediation-script function
+$ROLE_ARN = aws lambda get-function-configuration --function-name remediation-script --region $LAMBDA_REGION --query "Role" --output text
+$ENVIRONMENT = "Variables={AWS_LAMBDA_EXEC_WRAPPER=/opt/bootstrap,AWS_LWA_INVOKE_MODE=response_stream,AWS_LWA_PORT=8080,AWS_LWA_READINESS_CHECK_PATH=/health}"
+
+aws lambda get-function --function-name $FUNCTION_NAME --region $LAMBDA_REGION --output json 2>&1 | Out-Null
+if ($LASTEXITCODE -ne 0) {
+    Write-Host "`nCreating $FUNCTION_NAME function..." -ForegroundColor Cyan
+    aws lambda create-function `
+      --function-name $FUNCTION_NAME `
+      --runtime python3.11 `
+      --role $ROLE_ARN `
+      --handler run_remediation_stream.sh `
+      --zip-file fileb://lambda/remediation_stream.zip `
+      --layers $ADAPTER_LAYER `
+      --timeout 120 `
+      --memory-size 512 `
+      --environment $ENVIRONMENT `
+      --region $LAMBDA_REGION --output json | Out-Null
+    aws lambda wait function-active-v2 --function-name $FUNCTION_NAME --region $LAMBDA_REGION
+} else {
+    Write-Host "`nUpdating $FUNCTION_NAME code..." -ForegroundColor Cyan
+    aws lambda update-function-code --function-name $FUNCTION_NAME --zip-file fileb://lambda/remediation_stream.zip --region $LAMBDA_REGION --output json | Out-Null
+}
+
+Write-Host "`nCreating the streaming Function URL..." -ForegroundColor Cyan
+aws lambda get-function-url-config --function-name $FUNCTION_NAME --region $LAMBDA_REGION --output json 2>&1 | Out-Null
+if ($LASTEXITCODE -ne 0) {
+    aws lambda create-function-url-config `
+      --function-name $FUNCTION_NAME `
+      --auth-type NONE `
+      --invoke-mode RESPONSE_STREAM `
+      --cors "AllowOrigins=*,AllowMethods=POST,AllowHeaders=content-type,accept" `
+      --region $LAMBDA_REGION --output json | Out-Null
+    aws lambda add-permission --function-name $FUNCTION_NAME --statement-id function-url-public --action lambda:InvokeFunctionUrl --principal "*" --function-url-auth-type NONE --region $LAMBDA_REGION 2>&1 | Out-Null
+}
+$URL = aws lambda get-function-url-config --function-name $FUNCTION_NAME --region $LAMBDA_REGION --query "FunctionUrl" --output text
+
+Write-Host "`n✅ Remediation streaming setup complete!" -ForegroundColor Green
+Write-Host "  - $FUNCTION_NAME lambda (Lambda Web Adapter, response_stream)" -ForegroundColor White
+Write-Host "  - Streaming URL: $URL (remediation), ${URL}alerts (NDJSON alert ingest)" -ForegroundColor White
+Write-Host "Set REMEDIATION_STREAM_URL in dashboard/index.html to this URL" -ForegroundColor Yellow
@@ -0,0 +1,150 @@
+# Setup asynchronous session logging: the AI lambdas hand session records to an SQS queue,
+# session-writer writes them to msp-agent-sessions and session-metrics-stream maintains the
+# msp-agent-metrics counters from the table's stream
+$REGION = "us-east-1"
+$LAMBDA_REGION = "us-east-2"
+$ACCOUNT_ID = "063088900393"
+$AI_FUNCTIONS = @("alert-triage", "patch-assessment", "remediation-script", "remediation-stream", "job-worker")
+
+Write-Host "Creating session log queues..." -ForegroundColor Cyan
+aws sqs create-queue `
+  --queue-name msp-agent-session-log-dlq `
+  --attributes "MessageRetentionPeriod=1209600,SqsManagedSseEnabled=true" `
+  --region $LAMBDA_REGION --output json | Out-Null
+$DLQ_ARN = "arn:aws:sqs:${LAMBDA_REGION}:${ACCOUNT_ID}:msp-agent-session-log-dlq"
+
+# Messages that fail 5 writes stay in the dead-letter queue for 14 days
+$queueAttributes = @{
+    VisibilityTimeout = "120"
+    MessageRetentionPeriod = "345600"
+    SqsManagedSseEnabled = "true"
+    RedrivePolicy = (@{ deadLetterTargetArn = $DLQ_ARN; maxReceiveCount = "5" } | ConvertTo-Json -Compress)
+}
+$attributesFile = [System.IO.Path]::GetTempFileName()
+$queueAttributes | ConvertTo-Json -Compress | Set-Content -Path $attributesFile -Encoding ascii
+$queue = aws sqs create-queue `
+  --queue-name msp-agent-session-log `
+  --attributes "file://$attributesFile" `
+  --region $LAMBDA_REGION --output json | ConvertFrom-Json
+Remove-Item $attributesFile
+$QUEUE_URL = $queue.QueueUrl
+$QUEUE_ARN = "arn:aws:sqs:${LAMBDA_REGION}:${ACCOUNT_ID}:msp-agent-session-log"
+Write-Host "Queue URL: $QUEUE_URL" -ForegroundColor Green
+
+Write-Host "`nEnabling the msp-agent-sessions stream..." -ForegroundColor Cyan
+aws dynamodb update-table `
+  --table-name msp-agent-sessions `
+  --stream-specification StreamEnabled=true,StreamViewType=NEW_IMAGE `
+  --region $REGION --output json 2>&1 | Out-Null
+$STREAM_ARN = aws dynamodb describe-table --table-name msp-agent-sessions --region $REGION --query "Table.LatestStreamArn" --output text
+Write-Host "Stream: $STREAM_ARN" -ForegroundColor Green
+
+# Returns a function's environment variables as a hashtable (empty if it has none)
+function Get-FunctionEnvironment($functionName, $region) {
+    $variables = @{}
+    $config = aws lambda get-function-configuration --function-name $functionName --region $region --output json | ConvertFrom-Json
+    if ($config.Environment -and $config.Environment.Variables) {
+        foreach ($property in $config.Environment.Variables.PSObject.Properties) {
+            $variables[$property.Name] = $property.Value
+        }
+    }
+    return $variables
+}
+
+# Writes an environment as a file:// argument; --environment replaces every variable,
+# so callers always pass the merged set
+function Write-EnvironmentFile($variables) {
+    $envFile = [System.IO.Path]::GetTempFileName()
+    @{ Variables = $variables } | ConvertTo-Json -Compress | Set-Content -Path $envFile -Encoding ascii
+    return $envFile
+}
+
+# Creates a function from its package if it does not exist yet (role and environment copied
+# from alert-triage), otherwise updates its code
+function Set-LogFunction($functionName, $package, $handler, $region) {
+    aws lambda get-function --function-name $functionName --region $region --output json 2>&1 | Out-Null
+    if ($LASTEXITCODE -ne 0) {
+        Write-Host "Creating $functionName function..." -ForegroundColor Cyan
+        $envFile = Write-EnvironmentFile (Get-FunctionEnvironment "alert-triage" $LAMBDA_REGION)
+        $roleArn = aws lambda get-function-configuration --function-name alert-triage --region $LAMBDA_REGION --query "Role" --output text
+        aws lambda create-function `
+          --function-name $functionName `
+          --runtime python3.11 `
+          --role $roleArn `
+          --handler $handler `
+          --zip-file "fileb://lambda/$package.zip" `
+          --timeout 60 `
+          --memory-size 256 `
+          --environment "file://$envFile" `
+          --region $region --output json | Out-Null
+        Remove-Item $envFile
+        aws lambda wait function-active-v2 --function-name $functionName --region $region
+    } else {
+        Write-Host "Updating $functionName code..." -ForegroundColor Cyan
+        aws lambda update-function-code --function-name $functionName --zip-file "fileb://lambda/$package.zip" --region $region --output json | Out-Null
+        aws lambda wait function-updated-v2 --function-name $functionName --region $region
+    }
+}
+
+if (-not (Test-Path "lambda/session_writer.zip") -or -not (Test-Path "lambda/session_metrics_stream.zip")) {
+    Write-Host "`nPackaging the AI lambdas..." -ForegroundColor Cyan
+    & "$PSScriptRoot/package-ai-lambdas.ps1"
+}
+
+Write-Host "`nDeploying the session log consumers..." -ForegroundColor Cyan
+Set-LogFunction "session-writer" "session_writer" "session_writer_lambda.lambda_handler" $LAMBDA_REGION
+# Stream event sources must be in the table's region
+Set-LogFunction "session-metrics-stream" "session_metrics_stream" "session_metrics_stream_lambda.lambda_handler" $REGION
+
+$mappings = aws lambda list-event-source-mappings --function-name session-writer --event-source-arn $QUEUE_ARN --region $LAMBDA_REGION --query "EventSourceMappings" --output json | ConvertFrom-Json
+if (-not $mappings) {
+    aws lambda create-event-source-mapping `
+      --function-name session-writer `
+      --event-source-arn $QUEUE_ARN `
+      --batch-size 25 `
+      --maximum-batching-window-in-seconds 5 `
+      --function-response-types ReportBatchItemFailures `
+      --region $LAMBDA_REGION --output json | Out-Null
+    Write-Host "Event source mapping created: msp-agent-session-log -> session-writer" -ForegroundColor Green
+}
+
+$mappings = aws lambda list-event-source-mappings --function-name session-metrics-stream --event-source-arn $STREAM_ARN --region $REGION --query "EventSourceMappings" --output json | ConvertFrom-Json
+if (-not $mappings) {
+    $filterFile = [System.IO.Path]::GetTempFileName()
+    @{ Filters = @(@{ Pattern = '{"eventName":["INSERT"]}' }) } | ConvertTo-Json -Compress -Depth 4 | Set-Content -Path $filterFile -Encoding ascii
+    aws lambda create-event-source-mapping `
+      --function-name session-metrics-stream `
+      --event-source-arn $STREAM_ARN `
+      --starting-position LATEST `
+      --batch-size 100 `
+      --maximum-batching-window-in-seconds 10 `
+      --maximum-retry-attempts 3 `
+      --filter-criteria "file://$filterFile" `
+      --region $REGION --output json | Out-Null
+    Remove-Item $filterFile
+    Write-Host "Event source mapping created: msp-agent-sessions stream -> session-metrics-stream" -ForegroundColor Green
+}
+
+Write-Host "`nPointing the AI lambdas at the queue..." -ForegroundColor Cyan
+foreach ($functionName in $AI_FUNCTIONS) {
+    aws lambda get-function --function-name $functionName --region $LAMBDA_REGION --output json 2>&1 | Out-Null
+    if ($LASTEXITCODE -ne 0) {
+        Write-Host "  - $functionName not deployed, skipped" -ForegroundColor Yellow
+        continue
+    }
+    $variables = Get-FunctionEnvironment $functionName $LAMBDA_REGION
+    $variables["SESSION_LOG_QUEUE_URL"] = $QUEUE_URL
+    $envFile = Write-EnvironmentFile $variables
+    aws lambda update-function-configuration `
+      --function-name $functionName `
+      --environment "file://$envFile" `
+      --region $LAMBDA_REGION --output json | Out-Null
+    Remove-Item $envFile
+    aws lambda wait function-updated-v2 --function-name $functionName --region $LAMBDA_REGION
+    Write-Host "  - $functionName" -ForegroundColor White
+}
+
+Write-Host "`n✅ Session log setup complete!" -ForegroundColor Green
+Write-Host "  - msp-agent-session-log queue (dead letters: msp-agent-session-log-dlq) -> session-writer" -ForegroundColor White
+Write-Host "  - msp-agent-sessions stream (INSERT) -> session-metrics-stream -> msp-agent-metrics" -ForegroundColor White
+Write-Host "Attach iam-session-log-policy.json to the AI lambda role" -ForegroundColor Yellow
@@ -0,0 +1,78 @@
+# Local smoke test of the asynchronous job flow: submit -> poll -> result
+# Runs job_api_lambda with JOB_BACKEND=memory, so the worker runs in process with a
+# deadline context like the job-worker lambda. The jobs use requests the module handlers
+# reject before any model call, so no Bedrock access is needed.
+#
+#   python test-job-queue-local.py
+import json
+import os
+import sys
+import time
+
+os.environ['JOB_BACKEND'] = 'memory'
+os.environ.setdefault('JOB_LOCAL_TIMEOUT_SECONDS', '60')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambda'))
+
+import job_api_lambda
+import job_queue
+import job_worker_lambda
+import retry_policy
+
+# Records the deadline each job's handler saw
+deadlines = []
+get_handler = job_worker_lambda.get_handler
+
+def recording_handler(module):
+    handler = get_handler(module)
+    def run(event, context):
+        response = handler(event, context)
+        deadlines.append((context.get_remaining_time_in_millis() if context else None, retry_policy.remaining_seconds()))
+        return response
+    return run
+
+job_worker_lambda.get_handler = recording_handler
+
+def submit(module, payload):
+    response = job_api_lambda.lambda_handler({'httpMethod': 'POST', 'body': json.dumps({'module': module, 'payload': payload})}, None)
+    assert response['statusCode'] == 202, response
+    return json.loads(response['body'])['job_id']
+
+def poll(job_id, timeout_seconds=30):
+    started = time.time()
+    while time.time() - started < timeout_seconds:
+        response = job_api_lambda.lambda_handler({'httpMethod': 'GET', 'pathParameters': {'job_id': job_id}}, None)
+        assert response['statusCode'] == 200, response
+        job = json.loads(response['body'])
+        print(f"  {job_id}: {job['status']} ({job['stage']})")
+        if job['status'] in (job_queue.SUCCEEDED, job_queue.FAILED):
+            return job
+        time.sleep(0.2)
+    raise AssertionError(f"Job {job_id} did not finish within {timeout_seconds}s")
+
+print("Submitting jobs...")
+jobs = {
+    'remediation-script': submit('remediation-script', {'platform': 'linux'}),
+    'alert-triage': submit('alert-triage', {'alerts': []})
+}
+
+print("Polling...")
+for module, job_id in jobs.items():
+    job = poll(job_id)
+    assert job['status'] == job_queue.FAILED and job['status_code'] == 400, job
+    assert job['attempts'] == 1, job
+    assert 'error' in job['result'], job
+    print(f"✓ {module}: {job['status_code']} {job['result']['error']}")
+
+response = job_api_lambda.lambda_handler({'httpMethod': 'GET', 'pathParameters': {'job_id': 'missing'}}, None)
+assert response['statusCode'] == 404, response
+print("✓ unknown job: 404")
+
+# Every job ran with a deadline, and retry_policy picked it up
+assert len(deadlines) == len(jobs), deadlines
+limit = int(os.environ['JOB_LOCAL_TIMEOUT_SECONDS'])
+for remaining_ms, retry_remaining in deadlines:
+    assert remaining_ms is not None and 0 < remaining_ms <= limit * 1000, deadlines
+    assert retry_remaining is not None and 0 < retry_remaining < limit, deadlines
+print(f"✓ worker deadlines: {[remaining_ms for remaining_ms, _ in deadlines]} ms remaining")
+
+print("\n✅ Job queue smoke test passed")
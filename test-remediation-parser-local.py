@@ -0,0 +1,43 @@
+# Local check of the streaming remediation parser: feeds model output one character at a
+# time, so every tag, string and brace is split across chunks, and checks that each
+# top-level field is reported once, with the value parsed from the whole document.
+# No AWS access is needed.
+#
+#   python test-remediation-parser-local.py
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lambda'))
+
+from remediation_script_lambda import IncrementalJsonParser
+
+document = {
+    'script': 'Get-Service -Name "Spooler" | Restart-Service\nWrite-Output "done {ok}"',
+    'explanation': 'Restarts the print spooler, then reports {status}, [state] and "quotes".',
+    'risk_level': 'low',
+    'steps': [{'order': 1, 'action': 'restart'}, {'order': 2, 'action': 'verify'}],
+    'requires_reboot': False
+}
+body = json.dumps(document, indent=2)
+
+cases = {
+    'plain': body,
+    'fenced': f"```json\n{body}\n```",
+    # The reasoning contains braces that must not be taken for the object
+    'think': f"<think>The fix needs {{\"script\": \"wrong\"}} and a restart.</think>\n{body}",
+    'two think blocks': f"<think>first {{a}}</think><think>second {{b}}</think>{body}"
+}
+
+for name, text in cases.items():
+    for chunk_size in (1, 2, 3, 7, len(text)):
+        parser = IncrementalJsonParser()
+        fields = []
+        for start in range(0, len(text), chunk_size):
+            fields.extend(parser.feed(text[start:start + chunk_size]))
+        assert parser.complete, (name, chunk_size)
+        assert [key for key, _ in fields] == list(document), (name, chunk_size, fields)
+        assert dict(fields) == document, (name, chunk_size, fields)
+    print(f"✓ {name}: every field reported once at chunk sizes 1, 2, 3, 7 and whole")
+
+print("\n✅ Remediation parser check passed")